@@ -0,0 +1,41 @@
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from BuildCatalog import build_catalog
+from Catalog import load_stations, stations_file_path, stations_states_file_path
+
+# Startup cost of reading the Excel workbooks versus the compiled SQLite catalog
+
+def timed(function, repeat):
+    """Best-of-`repeat` wall time in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark read_excel against the catalog.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "catalog.sqlite")
+        build_catalog(path)
+
+        cases = [
+            ("all stations, 1 column",
+             lambda: pd.read_excel(stations_file_path),
+             lambda: load_stations(['stationIdentifier'], path=path)),
+            ("one state's stations",
+             lambda: pd.read_excel(stations_states_file_path, sheet_name='Florida'),
+             lambda: load_stations(state='Florida', path=path)),
+        ]
+        print(f"{'':>24} {'read_excel ms':>14} {'catalog ms':>11}")
+        for name, excel, catalog in cases:
+            print(f"{name:>24} {timed(excel, args.repeat):>14.1f} {timed(catalog, args.repeat):>11.1f}")
@@ -0,0 +1,92 @@
+import argparse
+import re
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from ChartData import hourly_frame_from_rows, hourly_pipeline, split_by_city
+
+# Compare the original per-row chart data loop with the aggregation/vectorized loader
+
+def populate(db, city_count, days, issuances_per_day, hours=156):
+    """Fill Hourlyforecasts with `days` of history for `city_count` cities."""
+    start = datetime(2025, 1, 1)
+    collection = db['Hourlyforecasts']
+    for issuance in range(days * issuances_per_day):
+        issued = start + timedelta(hours=issuance * 24 / issuances_per_day)
+        documents = []
+        for c in range(city_count):
+            forecasts = [{
+                'startTime': (issued + timedelta(hours=h)).isoformat() + '-05:00',
+                'temperature': 30 + h % 12,
+                'probOfPrecipitationValue': h % 40,
+                'windSpeed': f"{5 + h % 10} to {10 + h % 10} mph",
+                'forecast': 'Partly Cloudy',
+            } for h in range(hours)]
+            documents.append({'city': f"City {c}", 'updateTime': issued.isoformat(), 'forecasts': forecasts})
+        collection.insert_many(documents)
+
+def parse_wind_speed(wind_speed_str):
+    """Original per-row wind speed parser from WeatherCharts.py."""
+    if isinstance(wind_speed_str, str):
+        match = re.search(r'\d+', wind_speed_str)
+        return int(match.group()) if match else None
+    return None
+
+def legacy_transform(documents, cities):
+    """The original WeatherCharts.py loop: per-row parsing into four frames, then per-plot city filters."""
+    temp_data, precip_data, wind_data, forecasttext = [], [], [], []
+    for entry in documents:
+        city = entry.get('city', 'Unknown')
+        for forecast in entry['forecasts']:
+            timestamp = datetime.fromisoformat(forecast['startTime'])
+            temp_data.append({'time': timestamp, 'city': city, 'temperature': forecast.get('temperature')})
+            precip_data.append({'time': timestamp, 'city': city, 'precipitation': forecast.get('probOfPrecipitationValue')})
+            wind_data.append({'time': timestamp, 'city': city, 'windSpeed': parse_wind_speed(forecast.get('windSpeed', ''))})
+            forecasttext.append({'time': timestamp, 'city': city, 'Forecast': forecast.get('forecast', '')})
+    frames = [pd.DataFrame(data) for data in (temp_data, precip_data, wind_data, forecasttext)]
+    for frame in frames:
+        for city in cities:
+            frame[frame['city'] == city]
+
+def vectorized_transform(rows, cities):
+    """The ChartData path: one typed frame from the flattened rows, grouped by city once."""
+    split_by_city(hourly_frame_from_rows(rows), cities)
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chart data loading.")
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--issuances-per-day", type=int, default=1)
+    parser.add_argument("--uri", help="Benchmark a real mongod (e.g. mongodb://localhost:27017/) instead of mongomock")
+    args = parser.parse_args()
+
+    if args.uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.uri)['weather_benchmark']
+    else:
+        import mongomock
+        db = mongomock.MongoClient()['weather_benchmark']
+    db['Hourlyforecasts'].drop()
+    populate(db, args.cities, args.days, args.issuances_per_day)
+    cities = [f"City {c}" for c in range(args.cities)]
+    rows_count = db['Hourlyforecasts'].count_documents({}) * 156
+    print(f"{args.cities} cities, {args.days} days, {rows_count} forecast periods")
+
+    # Fetch and transform are timed separately: mongomock runs $unwind/$project in Python, so its
+    # fetch numbers say nothing about a real server. Pass --uri to measure fetch against mongod.
+    documents, legacy_fetch = timed(lambda: list(db['Hourlyforecasts'].find({"city": {"$in": cities}})))
+    _, legacy_seconds = timed(legacy_transform, documents, cities)
+    rows, vectorized_fetch = timed(lambda: list(db['Hourlyforecasts'].aggregate(hourly_pipeline(cities))))
+    _, vectorized_seconds = timed(vectorized_transform, rows, cities)
+
+    print(f"{'':>25} {'fetch s':>8} {'transform s':>12} {'periods/s (transform)':>22}")
+    print(f"{'legacy loop':>25} {legacy_fetch:>8.2f} {legacy_seconds:>12.2f} {rows_count / legacy_seconds:>22,.0f}")
+    print(f"{'aggregation + vectorized':>25} {vectorized_fetch:>8.2f} {vectorized_seconds:>12.2f} "
+          f"{rows_count / vectorized_seconds:>22,.0f}")
@@ -0,0 +1,46 @@
+import argparse
+import os
+import tempfile
+import time
+
+from NoaaClient import NoaaClient
+from StubServer import StubServer
+
+# Compare a cold run with a repeated run against a local stub that supports ETags
+
+def run_pass(client, urls):
+    """Fetch every URL once and return (elapsed seconds, responses parsed)."""
+    started = time.perf_counter()
+    parsed = 0
+    for url in urls:
+        response = client.get(url)
+        if response.status_code == 200:
+            response.json()
+            parsed += 1
+    return time.perf_counter() - started, parsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled connections and conditional requests.")
+    parser.add_argument("--gridpoints", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub response latency in seconds")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        urls = [f"{server.base_url}/gridpoints/OKX/{x},{37}/forecast/hourly" for x in range(args.gridpoints)]
+        validators_path = os.path.join(tmp_dir, "validators.json")
+
+        # First scheduled run: nothing cached, every payload is downloaded
+        client = NoaaClient(validators_path=validators_path)
+        cold_seconds, cold_parsed = run_pass(client, urls)
+        client.save_validators()
+        cold_bytes = client.stats["bytes"]
+
+        # Next scheduled run in a fresh process: validators come from disk
+        client = NoaaClient(validators_path=validators_path)
+        warm_seconds, warm_parsed = run_pass(client, urls)
+
+        print(f"requests served:      {server.request_count}")
+        print(f"connections opened:   {server.connection_count}")
+        print(f"304 responses:        {server.not_modified_count}")
+        print(f"cold run: {cold_seconds:.2f}s, {cold_parsed} parsed, {cold_bytes} bytes")
+        print(f"warm run: {warm_seconds:.2f}s, {warm_parsed} parsed, {client.stats['bytes']} bytes")
@@ -0,0 +1,34 @@
+import argparse
+import time
+
+from LatestObservationbyUSStationALL import fetch_observations
+from StubServer import StubServer
+
+# Benchmark the concurrent observation sweep against a local stub of api.weather.gov
+
+def run_benchmark(stations, concurrency_levels, latency, rate):
+    """Sweep the same station list at each concurrency level and report stations/second."""
+    station_ids = [f"{i:04d}W" for i in range(stations)]
+    results = []
+    with StubServer(latency=latency) as server:
+        base_url = f"{server.base_url}/stations"
+        for workers in concurrency_levels:
+            started = time.perf_counter()
+            rows = fetch_observations(station_ids, max_workers=workers, requests_per_second=rate,
+                                      base_url=base_url)
+            elapsed = time.perf_counter() - started
+            results.append((workers, len(rows), elapsed, len(rows) / elapsed))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the observation fetch engine.")
+    parser.add_argument("--stations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub response latency in seconds")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Per-host rate limit (requests/second)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32, 64])
+    args = parser.parse_args()
+
+    results = run_benchmark(args.stations, args.concurrency, args.latency, args.rate)
+    print(f"{'workers':>8} {'stations':>9} {'seconds':>8} {'stations/s':>11}")
+    for workers, count, elapsed, throughput in results:
+        print(f"{workers:>8} {count:>9} {elapsed:>8.2f} {throughput:>11.1f}")
@@ -0,0 +1,101 @@
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+import bson
+import pytz
+
+from ChartData import hourly_frame_from_rows
+from ForecastRecords import UNITS, HourlyRecords
+from StubServer import sample_hourly_forecast
+
+# Compare the original hourly document shape (wind as text, units on every period) with the
+# normalized records: structuring cost, stored size, memory held per batch and chart parsing cost
+
+TIME_ZONE = 'America/New_York'
+
+def sample_properties(hours):
+    """An hourly forecast response whose wind speeds are ranges, as NOAA sends them for gusty hours."""
+    properties = sample_hourly_forecast('OKX', 33, 37, hours)['properties']
+    for hour, period in enumerate(properties['periods']):
+        period['windSpeed'] = f"{5 + hour % 10} to {10 + hour % 10} mph" if hour % 3 else f"{5 + hour % 10} mph"
+    return properties
+
+def legacy_structure(properties, tz_name):
+    """The original structure_hourly_forecast from GetRequestHourlyForecast.py."""
+    structured_forecasts = []
+    tz = pytz.timezone(tz_name)
+    for period in properties.get('periods', []):
+        start_time = datetime.fromisoformat(period['startTime'].replace('Z', '+00:00'))
+        end_time = datetime.fromisoformat(period['endTime'].replace('Z', '+00:00'))
+        structured_forecasts.append({
+            'startTime': start_time.astimezone(tz).isoformat(),
+            'endTime': end_time.astimezone(tz).isoformat(),
+            "isDaytime": period['isDaytime'],
+            'temperature': period['temperature'],
+            'temperatureUnit': period['temperatureUnit'],
+            'probOfPrecipitationValue': period['probabilityOfPrecipitation']['value'],
+            'probOfPrecipitationUnit': period['probabilityOfPrecipitation']['unitCode'],
+            'dewpointValue': period['dewpoint']['value'],
+            'dewpointUnit': period['dewpoint']['unitCode'],
+            'relativeHumidityValue': period['relativeHumidity']['value'],
+            'relativeHumidityUnit': period['relativeHumidity']['unitCode'],
+            'windSpeed': period['windSpeed'],
+            'windDirection': period['windDirection'],
+            'forecast': period['shortForecast']
+        })
+    return {'updateTime': properties.get('updateTime', ''), 'generatedAt': properties.get('generatedAt', ''),
+            'forecasts': structured_forecasts}
+
+def normalized_structure(properties, tz_name):
+    """The ingest path of GetRequestHourlyForecast.py: records once per gridpoint, then the document."""
+    records = HourlyRecords.from_periods(properties['periods'])
+    return {'updateTime': properties.get('updateTime', ''), 'generatedAt': properties.get('generatedAt', ''),
+            'units': UNITS, 'forecasts': records.forecasts(pytz.timezone(tz_name))}
+
+def flatten(documents):
+    """The rows ChartData.hourly_pipeline returns for `documents`."""
+    return [{'city': f"City {index}", 'time': forecast['startTime'], 'temperature': forecast['temperature'],
+             'precipitation': forecast['probOfPrecipitationValue'], 'windSpeed': forecast.get('windSpeed'),
+             'windSpeedMin': forecast.get('windSpeedMin'), 'windSpeedMax': forecast.get('windSpeedMax'),
+             'Forecast': forecast['forecast']}
+            for index, document in enumerate(documents) for forecast in document['forecasts']]
+
+def held_bytes(build):
+    """Bytes still allocated by the objects `build` returns."""
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current
+
+def time_it(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark normalized hourly forecast records against the original documents.")
+    parser.add_argument("--gridpoints", type=int, default=200)
+    parser.add_argument("--hours", type=int, default=156, help="Periods per forecast")
+    args = parser.parse_args()
+
+    responses = [sample_properties(args.hours) for _ in range(args.gridpoints)]
+    periods = args.gridpoints * args.hours
+    print(f"{args.gridpoints} gridpoints x {args.hours} hourly periods")
+    print(f"{'':>12} {'structure s':>12} {'periods/s':>11} {'bytes/doc':>10} {'batch MB':>9} {'chart parse s':>14}")
+    for name, structure in (('original', legacy_structure), ('normalized', normalized_structure)):
+        seconds, documents = time_it(lambda: [structure(properties, TIME_ZONE) for properties in responses])
+        size = sum(len(bson.encode(document)) for document in documents) / len(documents)
+        batch = held_bytes(lambda: [structure(properties, TIME_ZONE) for properties in responses])
+        rows = flatten(documents)
+        parse_seconds, _ = time_it(lambda: hourly_frame_from_rows(rows))
+        print(f"{name:>12} {seconds:>12.2f} {periods / seconds:>11,.0f} {size:>10,.0f} {batch / 1e6:>9.1f} "
+              f"{parse_seconds:>14.3f}")
+
+    record_bytes = held_bytes(lambda: [HourlyRecords.from_periods(properties['periods']) for properties in responses])
+    response_bytes = held_bytes(lambda: [sample_properties(args.hours) for _ in range(args.gridpoints)])
+    print(f"Held per gridpoint during ingest: {record_bytes / args.gridpoints / 1e3:.1f} kB as records, "
+          f"{response_bytes / args.gridpoints / 1e3:.1f} kB as decoded response periods")
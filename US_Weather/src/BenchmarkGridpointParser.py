@@ -0,0 +1,63 @@
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from GridpointParser import QUANTITATIVE_ELEMENTS, hourly_frame, parse_gridpoint
+from StubServer import sample_gridpoint
+
+# Decode a /gridpoints payload and put its quantitative elements on an hourly grid, before and after
+
+def legacy_parse(body):
+    """json.loads plus the per-value dicts of GetQuantitativeForecasts.parse_weather_element."""
+    data = json.loads(body).get('properties', {})
+    parsed = {}
+    for name in QUANTITATIVE_ELEMENTS:
+        element = data.get(name, {'values': []})
+        parsed[name] = [{'validTime': value['validTime'], 'value': value['value'], 'uom': element.get('uom', '')}
+                        for value in element['values']]
+    return parsed
+
+def legacy_hourly(parsed):
+    """What a caller had to do with the dicts: split validTime on '/' and expand each interval in Python."""
+    columns = {}
+    for name, values in parsed.items():
+        times, numbers = [], []
+        for value in values:
+            start, duration = value['validTime'].split('/')
+            hours = int(duration[2:-1]) if duration.startswith('PT') else 24 * int(duration[1:-1])
+            first = pd.Timestamp(start)
+            for hour in range(hours):
+                times.append(first + pd.Timedelta(hours=hour))
+                numbers.append(value['value'] / hours if name != 'skyCover' else value['value'])
+        columns[name] = pd.Series(numbers, index=pd.DatetimeIndex(times))
+    return pd.DataFrame(columns)
+
+def time_it(function, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark gridpoint payload parsing.")
+    parser.add_argument("--days", type=int, default=7, help="Forecast days in the synthetic payload")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    body = json.dumps(sample_gridpoint("OKX", 33, 37, args.days)).encode("utf-8")
+    print(f"Payload: {len(body) / 1024:.0f} KiB")
+
+    legacy_decode_ms, parsed = time_it(lambda: legacy_parse(body), args.repeat)
+    legacy_hourly_ms, legacy_frame = time_it(lambda: legacy_hourly(parsed), args.repeat)
+    decode_ms, series = time_it(lambda: parse_gridpoint(body, QUANTITATIVE_ELEMENTS), args.repeat)
+    hourly_ms, frame = time_it(lambda: hourly_frame(series), args.repeat)
+    all_ms, all_series = time_it(lambda: parse_gridpoint(body), args.repeat)
+
+    print(f"{'':>36} {'parse ms':>9} {'hourly ms':>10}")
+    print(f"{'json + dicts (4 elements)':>36} {legacy_decode_ms:>9.2f} {legacy_hourly_ms:>10.2f}")
+    print(f"{'GridpointParser (4 elements)':>36} {decode_ms:>9.2f} {hourly_ms:>10.2f}")
+    print(f"{f'GridpointParser (all {len(all_series)} numeric)':>36} {all_ms:>9.2f}")
+    same = (legacy_frame.sort_index().to_numpy().round(6) == frame.sort_index().to_numpy().round(6)).all()
+    print(f"Hourly grids match: {same} ({len(frame)} hours)")
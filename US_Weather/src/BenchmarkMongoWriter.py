@@ -0,0 +1,64 @@
+import argparse
+import time
+from datetime import datetime
+
+from MongoWriter import MongoWriter
+
+# Compare the old per-document MongoClient + insert_one path with the batched MongoWriter
+
+def sample_document(i):
+    """Build a forecast document roughly the size of one hourly forecast."""
+    return {
+        'updateTime': '2025-02-20T20:11:52+00:00',
+        'generatedAt': '2025-02-20T21:00:00+00:00',
+        'forecasts': [{'startTime': f'2025-02-20T{h % 24:02d}:00:00-05:00', 'temperature': 30 + h % 12,
+                       'temperatureUnit': 'F', 'windSpeed': '10 mph', 'windDirection': 'NW',
+                       'forecast': 'Partly Cloudy'} for h in range(156)],
+        'city': f'City {i}',
+        'insertedAt': datetime.now(),
+    }
+
+def per_row(client_factory, documents):
+    """Replicates the original save_forecasts_to_mongo: new client and insert_one per document."""
+    for document in documents:
+        client = client_factory()
+        client['weather_benchmark']['per_row'].insert_one(document)
+        client.close()
+
+def batched(client_factory, documents, batch_size):
+    client = client_factory()
+    writer = MongoWriter(client['weather_benchmark']['batched'], batch_size=batch_size)
+    for document in documents:
+        writer.add(document)
+    writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-row inserts against MongoWriter.")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--uri", help="Benchmark a real mongod (e.g. mongodb://localhost:27017/) instead of mongomock")
+    args = parser.parse_args()
+
+    if args.uri:
+        from pymongo import MongoClient
+        client_factory = lambda: MongoClient(args.uri)
+    else:
+        import mongomock
+        shared = mongomock.MongoClient()
+        # mongomock has no handshake cost, so this only measures per-call overhead
+        client_factory = lambda: shared
+
+    client_factory()['weather_benchmark']['per_row'].drop()
+    client_factory()['weather_benchmark']['batched'].drop()
+
+    results = []
+    for name, run in [("per-row insert_one", lambda docs: per_row(client_factory, docs)),
+                      ("MongoWriter", lambda docs: batched(client_factory, docs, args.batch_size))]:
+        documents = [sample_document(i) for i in range(args.documents)]
+        started = time.perf_counter()
+        run(documents)
+        elapsed = time.perf_counter() - started
+        results.append((name, elapsed))
+
+    for name, elapsed in results:
+        print(f"{name:>20}: {elapsed:.2f}s ({args.documents / elapsed:.0f} docs/s)")
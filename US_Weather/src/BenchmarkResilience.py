@@ -0,0 +1,52 @@
+import argparse
+import time
+
+from requests.exceptions import RequestException
+
+from NoaaClient import NoaaClient
+from Resilience import CircuitBreaker, RetryPolicy
+from StubServer import StubServer
+
+# Exercise the retry and circuit breaker layer against a fault-injecting local stub
+
+# The gridpoint endpoints the forecast scripts call: raw data, daily and hourly forecasts
+ENDPOINTS = ["", "/forecast", "/forecast/hourly"]
+
+def run_scenario(name, server_options, gridpoints, offices, retry_policy):
+    """Fetch every gridpoint of every office once and report how the client coped."""
+    with StubServer(latency=0.005, **server_options) as server:
+        client = NoaaClient(validators_path=None, retry_policy=retry_policy,
+                            breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30))
+        succeeded = failed = 0
+        started = time.perf_counter()
+        for office in offices:
+            for x in range(gridpoints):
+                url = f"{server.base_url}/gridpoints/{office}/{x},37{ENDPOINTS[x % len(ENDPOINTS)]}"
+                try:
+                    response = client.get(url, conditional=False)
+                except RequestException:
+                    failed += 1
+                    continue
+                if response.status_code == 200:
+                    succeeded += 1
+                else:
+                    failed += 1
+        elapsed = time.perf_counter() - started
+        print(f"{name:>28} {succeeded:>9} {failed:>7} {client.stats['retries']:>8} "
+              f"{client.stats['circuit_rejections']:>9} {server.request_count:>9} {elapsed:>8.2f}"
+              f"  open: {','.join(client.breaker.open_keys()) or '-'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check retries, Retry-After and circuit breaking against injected faults.")
+    parser.add_argument("--gridpoints", type=int, default=20, help="Gridpoints per office")
+    args = parser.parse_args()
+
+    offices = ["OKX", "BUF", "BGM", "ALY"]
+    policy = RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.1)
+    print(f"{'scenario':>28} {'succeeded':>9} {'failed':>7} {'retries':>8} {'rejected':>9} {'served':>9} {'seconds':>8}")
+    run_scenario("no faults", {}, args.gridpoints, offices, policy)
+    run_scenario("20% 503", {"fault_rate": 0.2}, args.gridpoints, offices, policy)
+    run_scenario("20% 429 + Retry-After: 0", {"fault_rate": 0.2, "fault_status": 429, "retry_after": 0},
+                 args.gridpoints, offices, policy)
+    run_scenario("BUF office down (500)", {"failing_offices": ["BUF"], "fault_status": 500},
+                 args.gridpoints, offices, policy)
@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from NoaaClient import NoaaClient
+from SpatialIndex import GRID_SPACING_KM, SpatialIndex, grid_cells, project
+from StubServer import StubServer
+
+# Resolve coordinates to stations and grid cells in process, compared with one /points request each
+
+# Office centres on a synthetic CONUS grid; every coordinate belongs to the office nearest to it
+OFFICES = {'OKX': (40.9, -72.9), 'ALY': (42.8, -73.9), 'BGM': (42.2, -75.9), 'BUF': (42.9, -78.7),
+           'PHI': (40.0, -74.8), 'BOX': (41.9, -71.1), 'CLE': (41.4, -81.9), 'PBZ': (40.5, -80.2)}
+
+def synthetic_grid(count, seed):
+    """Random coordinates in the offices' area with their true (gridId, gridX, gridY)."""
+    rng = np.random.default_rng(seed)
+    names = np.array(list(OFFICES))
+    centres = np.array(list(OFFICES.values()))
+    lat = rng.uniform(centres[:, 0].min() - 1, centres[:, 0].max() + 1, count)
+    lon = rng.uniform(centres[:, 1].min() - 1, centres[:, 1].max() + 1, count)
+    office = cKDTree(project(centres[:, 0], centres[:, 1])).query(project(lat, lon))[1]
+    grid = np.zeros((count, 2), dtype=np.int64)
+    for index, (centre_lat, centre_lon) in enumerate(centres):
+        # Each office grid starts some way south-west of its centre, off the cell boundaries of the others
+        origin = project([centre_lat - 2], [centre_lon - 2.5])[0] + index * GRID_SPACING_KM / len(centres)
+        rows = office == index
+        grid[rows] = grid_cells(origin, lat[rows], lon[rows])
+    return pd.DataFrame({'latitude': lat, 'longitude': lon, 'gridId': names[office],
+                         'gridX': grid[:, 0], 'gridY': grid[:, 1]})
+
+def time_it(function, repeat=3):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - started) / repeat, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the spatial index against /points lookups.")
+    parser.add_argument("--places", type=int, default=3000, help="Known places with a grid cell")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--network-queries", type=int, default=50, help="/points requests against the stub")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response latency in seconds")
+    args = parser.parse_args()
+
+    known = synthetic_grid(args.places, seed=0)
+    places = known.rename(columns={'latitude': 'INTPTLAT', 'longitude': 'INTPTLONG'})
+    places['NAME.1'] = [f"Place {i}" for i in range(len(places))]
+    station_points = synthetic_grid(args.stations, seed=1)
+    stations = pd.DataFrame({'stationIdentifier': [f"S{i:05d}" for i in range(args.stations)],
+                             'latitude': station_points['latitude'], 'longitude': station_points['longitude']})
+    queries = synthetic_grid(args.queries, seed=2)
+
+    build_seconds, index = time_it(lambda: SpatialIndex(places, stations), repeat=1)
+    print(f"Index: {len(places)} places, {len(stations)} stations, {len(index.office_grids)}/{len(OFFICES)} "
+          f"office grids fitted in {build_seconds * 1000:.0f} ms")
+
+    lat, lon = queries['latitude'].to_numpy(), queries['longitude'].to_numpy()
+    resolve_seconds, resolved = time_it(lambda: index.resolve_gridpoints(lat, lon))
+    station_seconds, _ = time_it(lambda: index.nearest_stations(lat, lon, k=3))
+
+    answered = resolved['source'].notna()
+    exact = answered & (resolved['gridId'] == queries['gridId']) & (resolved['gridX'] == queries['gridX']) \
+        & (resolved['gridY'] == queries['gridY'])
+    print(f"Grid cells:       {resolve_seconds / args.queries * 1e6:>8.2f} us/query  "
+          f"({answered.mean():.1%} answered in process, {exact.sum() / max(answered.sum(), 1):.2%} exact)")
+    print(f"  sources: {resolved['source'].fillna('unresolved').value_counts().to_dict()}")
+    print(f"3 nearest stations: {station_seconds / args.queries * 1e6:>6.2f} us/query")
+
+    with StubServer(latency=args.latency) as server:
+        client = NoaaClient(validators_path=None)
+        network = SpatialIndex()
+        network.points_url = server.base_url + "/points/{lat:.4f},{lon:.4f}"
+        count = args.network_queries
+        network_seconds, _ = time_it(lambda: network.resolve_gridpoints(lat[:count], lon[:count], client), repeat=1)
+    per_query = network_seconds / count
+    print(f"/points per query: {per_query * 1e6:>8.0f} us/query "
+          f"({per_query / (resolve_seconds / args.queries):,.0f}x slower, stub latency {args.latency * 1000:.0f} ms)")
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import resource
+import runpy
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# End-to-end throughput of the ingest scripts and WeatherCharts, offline: NOAA is replaced by a
+# ReplayServer over recorded (or synthetic) fixtures and MongoDB by mongomock or a local mongod.
+# The scripts derive their Data/Cache/img paths from their own location, so each run works on a
+# copy of src/ in a temporary tree with a catalog built from the fixtures; the real tree is untouched.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+runs_file_path = os.path.join(parent_dir, "Logs", "benchmark_runs.jsonl")
+
+# Places sheet written to the temporary catalog
+STATE = 'Bench'
+DATABASE = 'weather_benchmark'
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+# target: (script, arguments, targets run first to seed the database, counter of records processed, counter labels)
+TARGETS = {
+    'hourly': ('GetRequestHourlyForecast.py', ['--state', STATE], [],
+               'documents_written', {'collection': 'Hourlyforecasts'}),
+    'daily': ('GetRequestDailyForecast.py', ['--state', STATE], [],
+              'documents_written', {'collection': 'daily_forecasts'}),
+    'quantitative': ('GetQuantitativeForecasts.py', ['--state', STATE], [],
+                     'documents_written', {'collection': 'quantitativeForecasts'}),
+    'observations': ('LatestObservationbyUSStationALL.py', ['--restart', '--skip-excel', '--rate', '200'], [],
+                     'rows_written', {'sink': 'csv'}),
+    # One process renders, so the time is the chart pipeline rather than the pool size
+    'charts': ('WeatherCharts.py', ['--state', STATE, '--force', '--workers', '1'], ['hourly', 'quantitative'],
+               'charts', {'result': 'rendered'}),
+}
+
+# Directories the scripts write to, emptied before each target
+OUTPUT_DIRS = ['Cache', 'Logs', 'observations', 'img']
+
+def peak_memory_mb():
+    """Peak resident memory of this process and its finished children (ru_maxrss is in kB on Linux)."""
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / 1e6
+
+def run_script(script, script_args):
+    """Run a pipeline script in this process as `python script args`, discarding its output."""
+    argv = sys.argv
+    sys.argv = [script] + script_args
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code:
+            raise
+    finally:
+        sys.argv = argv
+
+def run_worker(target):
+    """Seed, run and measure one target; runs inside the temporary tree and prints a result line."""
+    from Metrics import counter_total, get_metrics
+    from MongoWriter import DATABASE_NAME, get_database
+
+    script, script_args, seeds, counter, labels = TARGETS[target]
+    get_database().client.drop_database(DATABASE_NAME)
+    for seed in seeds:
+        run_script(*TARGETS[seed][:2])
+    get_metrics().drain()
+
+    started = time.perf_counter()
+    run_script(script, script_args)
+    seconds = time.perf_counter() - started
+    _, counters = get_metrics().drain()
+    print(RESULT_PREFIX + json.dumps({'records': counter_total(counters, counter, **labels), 'seconds': seconds,
+                                      'peak_mb': peak_memory_mb(),
+                                      'requests': counter_total(counters, 'http_requests')}))
+
+def build_tree(root, fixtures_dir, places_per_cell):
+    """Copy the scripts into `root`/src and write a catalog of the places and stations the fixtures cover."""
+    from BuildCatalog import PLACES_INDEXES, STATIONS_INDEXES, write_table
+    from Replay import fixture_catalog
+
+    src = os.path.join(root, 'src')
+    os.makedirs(src)
+    for path in glob.glob(os.path.join(script_dir, '*.py')):
+        shutil.copy(path, src)
+    places, stations = fixture_catalog(fixtures_dir, STATE, places_per_cell)
+    os.makedirs(os.path.join(root, 'Data'))
+    connection = sqlite3.connect(os.path.join(root, 'Data', 'catalog.sqlite'))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_table(connection, 'places', places, PLACES_INDEXES)
+            write_table(connection, 'stations', stations, STATIONS_INDEXES)
+        connection.commit()
+    finally:
+        connection.close()
+    return src, len(places), len(stations)
+
+def startup_seconds(src, module, env, runs):
+    """Best wall time of `python -c "import module"`: interpreter start, imports and module-level setup."""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f"import {module}"], cwd=src, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_target(root, src, target, env, startup_runs):
+    """Run one target in a fresh worker process and return its measurements."""
+    for name in OUTPUT_DIRS:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    completed = subprocess.run([sys.executable, 'BenchmarkSuite.py', '--worker', target], cwd=src, env=env,
+                               capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode or not lines:
+        print(completed.stdout[-2000:] + completed.stderr[-2000:])
+        raise RuntimeError(f"Benchmark target {target} failed with exit code {completed.returncode}")
+    result = json.loads(lines[-1][len(RESULT_PREFIX):])
+    result['records_per_second'] = result['records'] / max(result['seconds'], 1e-9)
+    result['startup_seconds'] = startup_seconds(src, TARGETS[target][0][:-len('.py')], env, startup_runs)
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=script_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def previous_run(path, options):
+    """The last logged run with the same options, or None."""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run.get('options') == options:
+                previous = run
+    return previous
+
+def change(current, before):
+    if not before:
+        return ''
+    return f"{(current / before - 1) * 100:+.0f}%"
+
+def report(results, previous):
+    """Print one row per target, with the change in throughput and memory since `previous`."""
+    print(f"{'target':<13} {'records':>8} {'seconds':>8} {'records/s':>10} {'peak MB':>8} {'startup s':>9}"
+          + (f" {'vs ' + (previous.get('commit') or 'last run'):>18}" if previous else ''))
+    for target, result in results.items():
+        line = (f"{target:<13} {result['records']:>8} {result['seconds']:>8.2f} {result['records_per_second']:>10,.1f} "
+                f"{result['peak_mb']:>8.0f} {result['startup_seconds']:>9.2f}")
+        before = previous['results'].get(target) if previous else None
+        if before:
+            line += (f" {change(result['records_per_second'], before['records_per_second']):>8} rec/s"
+                     f" {change(result['peak_mb'], before['peak_mb']):>5} MB")
+        print(line)
+
+if __name__ == "__main__":
+    from Replay import add_server_arguments, server_from_arguments, synthesize_fixtures
+
+    parser = argparse.ArgumentParser(description="Benchmark the ingest scripts and WeatherCharts end to end, offline.")
+    parser.add_argument("targets", nargs="*", help=f"Targets to run: {', '.join(TARGETS)} (default: all)")
+    add_server_arguments(parser)
+    parser.set_defaults(fixtures=None)
+    parser.add_argument("--gridpoints", type=int, default=20, help="Synthetic gridpoints when --fixtures is not given")
+    parser.add_argument("--stations", type=int, default=100, help="Synthetic stations when --fixtures is not given")
+    parser.add_argument("--places-per-cell", type=int, default=3, help="Catalog places sharing each gridpoint")
+    parser.add_argument("--uri", help="Benchmark a real mongod (e.g. mongodb://localhost:27017/) instead of mongomock")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Imports timed per script (the best is kept)")
+    parser.add_argument("--runs-log", default=runs_file_path, help="Append results to this JSON lines file")
+    parser.add_argument("--worker", choices=list(TARGETS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        sys.exit()
+
+    unknown = [target for target in args.targets if target not in TARGETS]
+    if unknown:
+        parser.error(f"unknown targets {', '.join(unknown)} (choose from {', '.join(TARGETS)})")
+    targets = args.targets or list(TARGETS)
+    options = {'fixtures': args.fixtures, 'gridpoints': args.gridpoints, 'stations': args.stations,
+               'places_per_cell': args.places_per_cell, 'uri': args.uri, 'latency': args.latency,
+               'fault_rate': args.fault_rate, 'synthesize': args.synthesize}
+    with tempfile.TemporaryDirectory(prefix='weather_benchmark_') as root:
+        if args.fixtures is None:
+            args.fixtures = os.path.join(root, 'Fixtures')
+            synthesize_fixtures(args.fixtures, [('OKX', 30 + i % 10, 30 + i // 10) for i in range(args.gridpoints)],
+                                [f"K{i:03d}" for i in range(args.stations)])
+        src, place_count, station_count = build_tree(root, args.fixtures, args.places_per_cell)
+
+        with server_from_arguments(args) as server:
+            env = dict(os.environ, NOAA_API_URL=server.base_url, MONGO_URI=args.uri or 'mongomock://',
+                       MONGO_DATABASE=DATABASE, MPLBACKEND='Agg')
+            env.pop('NOAA_RECORD_DIR', None)
+            print(f"{place_count} places and {station_count} stations from {options['fixtures'] or 'synthetic fixtures'}, "
+                  f"replayed with {args.latency * 1000:.0f} ms latency and {args.fault_rate:.0%} faults, "
+                  f"MongoDB {'at ' + args.uri if args.uri else 'in memory (mongomock)'}")
+            results = {target: run_target(root, src, target, env, args.startup_runs) for target in targets}
+
+    previous = previous_run(args.runs_log, options)
+    report(results, previous)
+    if 'charts' in results:
+        print("charts peak memory includes seeding the database with the hourly and quantitative ingest")
+    os.makedirs(os.path.dirname(args.runs_log), exist_ok=True)
+    with open(args.runs_log, 'a') as f:
+        f.write(json.dumps({'time': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                            'options': options, 'results': results}) + "\n")
@@ -0,0 +1,69 @@
+import argparse
+import time
+
+import pandas as pd
+
+from ChartData import load_hourly_frame
+from ForecastRecords import parse_wind_range
+from StubServer import sample_hourly_forecast
+from Summaries import SUMMARY_COLLECTION, load_daily_frame, update_summaries
+
+# Daily chart data read from the raw hourly documents against the materialized summaries
+
+def issuance_documents(cities, issuance):
+    """One Hourlyforecasts document per city for the `issuance`-th issuance (hourly updateTimes)."""
+    periods = sample_hourly_forecast('OKX', 33, 37)['properties']['periods']
+    forecasts = [{'startTime': pd.Timestamp(period['startTime']).tz_convert('America/New_York').isoformat(),
+                  'temperature': period['temperature'] + issuance % 5,
+                  'probOfPrecipitationValue': period['probabilityOfPrecipitation']['value'],
+                  'windSpeedMin': parse_wind_range(period['windSpeed'])[0],
+                  'windSpeedMax': parse_wind_range(period['windSpeed'])[1],
+                  'forecast': period['shortForecast']} for period in periods]
+    update_time = f"2025-02-{20 + issuance // 24:02d}T{issuance % 24:02d}:00:00+00:00"
+    return [{'city': city, 'updateTime': update_time, 'forecasts': forecasts} for city in cities]
+
+def daily_from_raw(db, cities):
+    """What a daily chart needs without summaries: every stored period, grouped in pandas."""
+    frame = load_hourly_frame(db, cities)
+    frame['date'] = frame['time'].dt.tz_convert('America/New_York').dt.date
+    return frame.groupby(['city', 'date'], observed=True)['temperature'].agg(['min', 'max'])
+
+def time_it(function):
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark daily summaries against scanning raw forecasts.")
+    parser.add_argument("--cities", type=int, default=10)
+    parser.add_argument("--issuances", type=int, default=24, help="Stored issuances per city")
+    parser.add_argument("--chart-cities", type=int, default=3)
+    parser.add_argument("--uri", help="Benchmark a real mongod (e.g. mongodb://localhost:27017/) instead of mongomock")
+    args = parser.parse_args()
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    client.drop_database('weather_benchmark')
+    db = client['weather_benchmark']
+
+    cities = [f"City {i}" for i in range(args.cities)]
+    for issuance in range(args.issuances):
+        db['Hourlyforecasts'].insert_many(issuance_documents(cities, issuance))
+
+    build_seconds, _ = time_it(lambda: update_summaries(db, ['Hourlyforecasts']))
+    db['Hourlyforecasts'].insert_many(issuance_documents(cities, args.issuances))
+    incremental_seconds, _ = time_it(lambda: update_summaries(db, ['Hourlyforecasts']))
+    print(f"{args.cities * (args.issuances + 1)} hourly documents -> "
+          f"{db[SUMMARY_COLLECTION].count_documents({})} daily summaries")
+    print(f"Summaries built in {build_seconds:.2f}s, one new issuance folded in in {incremental_seconds:.2f}s")
+
+    chart_cities = cities[:args.chart_cities]
+    raw_seconds, raw = time_it(lambda: daily_from_raw(db, chart_cities))
+    summary_seconds, summary = time_it(lambda: load_daily_frame(db, chart_cities))
+    print(f"Daily chart data for {len(chart_cities)} cities: raw documents {raw_seconds * 1000:.0f} ms "
+          f"({len(raw)} days), summaries {summary_seconds * 1000:.1f} ms ({len(summary)} days), "
+          f"{raw_seconds / summary_seconds:.0f}x faster")
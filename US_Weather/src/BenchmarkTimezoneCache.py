@@ -0,0 +1,57 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from TimezoneCache import TimezoneCache, get_timezone
+
+# Startup and per-lookup cost of TimezoneFinder versus the on-disk timezone cache
+
+def sample_points(count, seed=0):
+    """Random points inside the contiguous US bounding box."""
+    rng = random.Random(seed)
+    return [(rng.uniform(25.0, 49.0), rng.uniform(-124.0, -67.0)) for _ in range(count)]
+
+def per_lookup_us(seconds, count):
+    return seconds / count * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark timezone lookups.")
+    parser.add_argument("--points", type=int, default=5000)
+    args = parser.parse_args()
+    points = sample_points(args.points)
+
+    # Before: a global TimezoneFinder plus a polygon lookup and pytz.timezone per row
+    started = time.perf_counter()
+    from timezonefinder import TimezoneFinder
+    from pytz import timezone
+    finder = TimezoneFinder()
+    finder_startup = time.perf_counter() - started
+    started = time.perf_counter()
+    for lat, lon in points:
+        timezone(finder.timezone_at(lng=lon, lat=lat) or 'UTC')
+    finder_lookups = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "timezones.json")
+
+        # First run with the cache: every point misses and is written to disk
+        cache = TimezoneCache(path)
+        for lat, lon in points:
+            cache.lookup(lat, lon)
+        cache.save()
+
+        # After: later runs load the cache and never construct TimezoneFinder
+        started = time.perf_counter()
+        cache = TimezoneCache(path)
+        cache_startup = time.perf_counter() - started
+        started = time.perf_counter()
+        for lat, lon in points:
+            get_timezone(cache.lookup(lat, lon))
+        cache_lookups = time.perf_counter() - started
+
+    print(f"{'':>16} {'startup ms':>11} {'lookup us':>10}")
+    print(f"{'TimezoneFinder':>16} {finder_startup * 1000:>11.1f} {per_lookup_us(finder_lookups, len(points)):>10.1f}")
+    print(f"{'TimezoneCache':>16} {cache_startup * 1000:>11.1f} {per_lookup_us(cache_lookups, len(points)):>10.1f}")
+    print(f"cache misses after warm start: {cache.stats['misses']}")
@@ -0,0 +1,93 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ForecastVerification import VARIABLES, error_statistics, error_sums, match_stations, pair_observations
+
+# Pairing and scoring throughput of the verification engine on synthetic data
+
+def synthetic_inputs(stations, hours, issuances, seed=0):
+    """Stations next to one place each, hourly observations and overlapping hourly issuances."""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(25, 49, stations)
+    lon = rng.uniform(-124, -67, stations)
+    station_ids = [f"S{i:05d}" for i in range(stations)]
+    places = pd.DataFrame({'NAME.1': [f"City {i}" for i in range(stations)],
+                           'INTPTLAT': lat + 0.01, 'INTPTLONG': lon + 0.01})
+    station_frame = pd.DataFrame({'stationIdentifier': station_ids, 'latitude': lat, 'longitude': lon})
+
+    base = pd.Timestamp("2025-02-20T00:00:00Z")
+    observation_times = base + pd.to_timedelta(np.arange(hours), unit='h') + pd.Timedelta(minutes=51)
+    observations = pd.DataFrame({
+        'id': np.repeat(station_ids, hours),
+        'timestamp': np.tile(observation_times.strftime('%Y-%m-%dT%H:%M:%S+00:00'), stations),
+        'temperatureValue': rng.normal(5, 8, stations * hours),
+        'dewpointValue': rng.normal(0, 5, stations * hours),
+        'relativeHumidityValue': rng.uniform(20, 100, stations * hours),
+        'windSpeedValue': rng.uniform(0, 40, stations * hours),
+    })
+
+    # Every issuance covers the whole observation window, issued 6 hours apart before it
+    starts = base + pd.to_timedelta(np.arange(hours), unit='h')
+    frames = []
+    for issuance in range(issuances):
+        frames.append(pd.DataFrame({
+            'city': np.repeat(places['NAME.1'].to_numpy(), hours),
+            'issued': base - pd.Timedelta(hours=6 * (issuance + 1)),
+            'start': np.tile(starts, stations),
+            'temperature': rng.normal(5, 8, stations * hours),
+            'dewpoint': rng.normal(0, 5, stations * hours),
+            'relativeHumidity': rng.uniform(20, 100, stations * hours),
+            'windSpeed': rng.uniform(0, 40, stations * hours),
+        }))
+    return station_frame, places, observations, pd.concat(frames, ignore_index=True)
+
+def loop_errors(observations, matches, forecasts):
+    """Row-by-row equivalent: look up each observation's covering periods in a dict."""
+    city_of = dict(zip(matches['station'], matches['city']))
+    periods = {}
+    for row in forecasts.itertuples(index=False):
+        periods.setdefault((row.city, row.start), []).append(row)
+    errors = []
+    for row in observations.itertuples(index=False):
+        start = pd.Timestamp(row.timestamp).floor('h')
+        for period in periods.get((city_of.get(row.id), start), []):
+            lead = int((start - period.issued) / pd.Timedelta(hours=1))
+            errors.append((period.city, lead, period.temperature - row.temperatureValue))
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark forecast verification.")
+    parser.add_argument("--stations", type=int, default=2000)
+    parser.add_argument("--hours", type=int, default=72)
+    parser.add_argument("--issuances", type=int, default=6)
+    args = parser.parse_args()
+
+    stations, places, observations, forecasts = synthetic_inputs(args.stations, args.hours, args.issuances)
+
+    started = time.perf_counter()
+    matches = match_stations(stations, places)
+    match_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    errors = pair_observations(observations, matches, forecasts)
+    sums = error_sums(errors)
+    summary = error_statistics(sums)
+    vectorized_seconds = time.perf_counter() - started
+    pair_count = len(errors)
+
+    # The loop baseline only scores temperature, on a tenth of the stations
+    subset = matches['station'].iloc[:max(1, args.stations // 10)]
+    started = time.perf_counter()
+    loop_pairs = len(loop_errors(observations[observations['id'].isin(subset)], matches,
+                                 forecasts[forecasts['city'].isin(matches.loc[matches['station'].isin(subset), 'city'])]))
+    loop_seconds = time.perf_counter() - started
+
+    print(f"KD-tree matched {len(matches)} stations in {match_seconds * 1000:.1f} ms")
+    print(f"Vectorized: {pair_count} pairs x {len(VARIABLES)} variables in {vectorized_seconds:.2f}s "
+          f"({pair_count / vectorized_seconds:,.0f} pairs/s)")
+    print(f"Row loop (temperature only): {loop_pairs} pairs in {loop_seconds:.2f}s "
+          f"({loop_pairs / loop_seconds:,.0f} pairs/s)")
+    print(summary[summary['variable'] == 'temperature'].head().to_string(index=False))
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from Catalog import (catalog_file_path, places_file_path, quote, stations_file_path,
+                     stations_states_file_path)
+
+# Indexes created when the indexed columns are present in the workbook
+PLACES_INDEXES = {
+    'places_state': ['state'],
+    'places_grid': ['gridId', 'gridX', 'gridY'],
+    'places_combined_grid': ['gridId/gridX/gridY'],
+    'places_lat_lon': ['INTPTLAT', 'INTPTLONG'],
+}
+STATIONS_INDEXES = {
+    'stations_identifier': ['stationIdentifier'],
+    'stations_state': ['state'],
+    'stations_lat_lon': ['latitude', 'longitude'],
+}
+
+def read_places(path):
+    """Stack every state sheet of the places workbook, tagging rows with their sheet name."""
+    sheets = pd.read_excel(path, sheet_name=None)
+    return pd.concat([df.assign(state=sheet_name) for sheet_name, df in sheets.items()], ignore_index=True)
+
+def read_stations(path, states_path):
+    """The station list plus the state each station was assigned to in stations_with_countries.xlsx."""
+    stations = pd.read_excel(path)
+    if os.path.exists(states_path):
+        states = pd.read_excel(states_path, sheet_name='ALL', usecols=['stationIdentifier', 'state'])
+        stations = stations.merge(states.drop_duplicates('stationIdentifier'), on='stationIdentifier', how='left')
+    return stations
+
+def write_table(connection, table, df, indexes):
+    df.to_sql(table, connection, if_exists='replace', index=False)
+    for name, columns in indexes.items():
+        if all(column in df.columns for column in columns):
+            column_list = ', '.join(quote(column) for column in columns)
+            connection.execute(f"CREATE INDEX {name} ON {table} ({column_list})")
+    print(f"Wrote {len(df)} rows to {table}")
+
+def build_catalog(path=catalog_file_path, places_path=places_file_path, stations_path=stations_file_path,
+                  stations_states_path=stations_states_file_path):
+    """Compile the workbooks into a fresh SQLite catalog."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        if os.path.exists(places_path):
+            write_table(connection, 'places', read_places(places_path), PLACES_INDEXES)
+        else:
+            print(f"Places workbook not found at {places_path}, skipping places")
+        write_table(connection, 'stations', read_stations(stations_path, stations_states_path), STATIONS_INDEXES)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the Excel workbooks into an indexed SQLite catalog.")
+    parser.add_argument("--output", default=catalog_file_path)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build_catalog(args.output)
+    print(f"Catalog written to {args.output} in {time.perf_counter() - started:.1f}s")
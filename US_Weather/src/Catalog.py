@@ -0,0 +1,76 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+from Metrics import get_metrics
+
+# Compiled copy of the Excel workbooks (built by BuildCatalog.py). Scripts read only the
+# columns and rows they need from it and fall back to the workbooks when it is missing.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+catalog_file_path = os.path.join(parent_dir, "Data", "catalog.sqlite")
+places_file_path = os.path.join(parent_dir, "Data", "WeatherStationDatabase.xlsx")
+stations_file_path = os.path.join(parent_dir, "Stations", "stations.xlsx")
+stations_states_file_path = os.path.join(parent_dir, "Stations", "stations_with_countries.xlsx")
+
+def quote(column):
+    """Quote a column name such as 'NAME.1' or 'gridId/gridX/gridY' for SQLite."""
+    return '"' + column.replace('"', '""') + '"'
+
+def select(table, columns, where=None, params=(), path=catalog_file_path):
+    """Read `columns` of `table` from the catalog, optionally filtered by a WHERE clause."""
+    column_list = ', '.join(quote(column) for column in columns) if columns else '*'
+    query = f"SELECT {column_list} FROM {table}"
+    if where:
+        query += f" WHERE {where}"
+    with get_metrics().stage("read_catalog"):
+        connection = sqlite3.connect(path)
+        try:
+            return pd.read_sql_query(query, connection, params=params)
+        finally:
+            connection.close()
+
+def has_table(table, path=catalog_file_path):
+    """True when the catalog exists and holds `table` (BuildCatalog.py skips places without their workbook)."""
+    if not os.path.exists(path):
+        return False
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (table,)).fetchone() is not None
+    finally:
+        connection.close()
+
+def load_places(sheet_name, columns=None, path=catalog_file_path):
+    """Places (census cities with their NOAA grid cell) of one state sheet, or of every sheet for None."""
+    if has_table('places', path):
+        if sheet_name is None:
+            return select('places', columns, path=path)
+        return select('places', columns, 'state = ?', (sheet_name,), path)
+    print(f"No places in a catalog at {path}, reading {places_file_path} (run BuildCatalog.py)")
+    with get_metrics().stage("read_excel"):
+        if sheet_name is None:
+            sheets = pd.read_excel(places_file_path, sheet_name=None, usecols=columns)
+            return pd.concat(sheets.values(), ignore_index=True)
+        return pd.read_excel(places_file_path, sheet_name=sheet_name, usecols=columns)
+
+def load_place_states(path=catalog_file_path):
+    """Names of the state sheets that have places, in catalog order."""
+    if has_table('places', path):
+        return select('places', ['state'], path=path)['state'].drop_duplicates().tolist()
+    with get_metrics().stage("read_excel"):
+        return pd.ExcelFile(places_file_path).sheet_names
+
+def load_stations(columns=None, state=None, path=catalog_file_path):
+    """Observation stations, optionally restricted to one state."""
+    if has_table('stations', path):
+        if state:
+            return select('stations', columns, 'state = ?', (state,), path)
+        return select('stations', columns, path=path)
+    print(f"No stations in a catalog at {path}, reading {stations_file_path} (run BuildCatalog.py)")
+    with get_metrics().stage("read_excel"):
+        if state:
+            df = pd.read_excel(stations_states_file_path, sheet_name=state)
+            return df[columns] if columns else df
+        return pd.read_excel(stations_file_path, usecols=columns)
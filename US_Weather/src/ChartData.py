@@ -0,0 +1,131 @@
+import pandas as pd
+
+from ForecastRecords import wind_speed_bounds
+from GridpointParser import split_valid_times
+from TimeSeriesStore import PLACES_COLLECTION, SERIES_COLLECTION
+
+# Chart inputs are pulled with server-side $unwind/$project pipelines so only the plotted
+# fields leave MongoDB, then typed and parsed column-wise in pandas.
+HOURLY_COLUMNS = ['time', 'city', 'temperature', 'precipitation', 'windSpeedMin', 'windSpeedMax', 'Forecast']
+QUANTITATIVE_COLUMNS = ['time', 'city', 'precipitation', 'duration']
+
+def hourly_pipeline(cities):
+    """Aggregation pipeline flattening Hourlyforecasts documents into one row per period."""
+    return [
+        {'$match': {'city': {'$in': list(cities)}}},
+        {'$unwind': '$forecasts'},
+        {'$project': {
+            '_id': 0,
+            'city': 1,
+            'time': '$forecasts.startTime',
+            'temperature': '$forecasts.temperature',
+            'precipitation': '$forecasts.probOfPrecipitationValue',
+            'windSpeedMin': '$forecasts.windSpeedMin',
+            'windSpeedMax': '$forecasts.windSpeedMax',
+            # Only documents stored before the normalized format have the wind as text
+            'windSpeed': '$forecasts.windSpeed',
+            'Forecast': '$forecasts.forecast',
+        }},
+    ]
+
+def series_pipeline(gridpoints):
+    """Aggregation pipeline reading the same fields from the time-series layout."""
+    return [
+        {'$match': {'meta.gridpoint': {'$in': list(gridpoints)}}},
+        {'$project': {
+            '_id': 0,
+            'gridpoint': '$meta.gridpoint',
+            'time': '$validTime',
+            'temperature': 1,
+            'precipitation': '$probOfPrecipitation',
+            'windSpeedMin': 1,
+            'windSpeedMax': 1,
+            'windSpeed': 1,
+            'Forecast': '$forecast',
+        }},
+    ]
+
+def quantitative_pipeline(cities):
+    """Aggregation pipeline flattening quantitative precipitation values."""
+    return [
+        {'$match': {'city': {'$in': list(cities)}}},
+        {'$unwind': '$quantitativePrecipitation'},
+        {'$project': {
+            '_id': 0,
+            'city': 1,
+            'time': '$quantitativePrecipitation.validTime',
+            'precipitation': '$quantitativePrecipitation.value',
+        }},
+    ]
+
+def load_hourly_frame(db, cities, source='documents'):
+    """Load one typed DataFrame of hourly forecast periods for `cities`.
+
+    `source` is "documents" (Hourlyforecasts) or "timeseries" (hourly_forecast_series).
+    """
+    if source == 'timeseries':
+        places = pd.DataFrame(list(db[PLACES_COLLECTION].find({'city': {'$in': list(cities)}},
+                                                              projection={'_id': 0, 'city': 1, 'gridpoint': 1})))
+        if places.empty:
+            return pd.DataFrame(columns=HOURLY_COLUMNS)
+        rows = pd.DataFrame(list(db[SERIES_COLLECTION].aggregate(series_pipeline(places['gridpoint'].unique()))))
+        if rows.empty:
+            return pd.DataFrame(columns=HOURLY_COLUMNS)
+        frame = rows.merge(places, on='gridpoint').drop(columns='gridpoint')
+    else:
+        frame = pd.DataFrame(list(db['Hourlyforecasts'].aggregate(hourly_pipeline(cities))))
+        if frame.empty:
+            return pd.DataFrame(columns=HOURLY_COLUMNS)
+    return hourly_frame_from_rows(frame)
+
+def hourly_frame_from_rows(frame):
+    """Type the flattened hourly rows column-wise: timestamps, numeric values and wind speed range."""
+    frame = pd.DataFrame(frame)
+    wind_min, wind_max = wind_speed_bounds(frame)
+    frame = frame.reindex(columns=HOURLY_COLUMNS)
+    frame['time'] = pd.to_datetime(frame['time'], utc=True, format='ISO8601')
+    frame['city'] = frame['city'].astype('category')
+    frame['temperature'] = pd.to_numeric(frame['temperature'], errors='coerce')
+    frame['precipitation'] = pd.to_numeric(frame['precipitation'], errors='coerce')
+    frame['windSpeedMin'] = wind_min
+    frame['windSpeedMax'] = wind_max
+    return frame
+
+def load_quantitative_frame(db, cities):
+    """Load quantitative precipitation as one typed DataFrame, keyed on each interval's start (duration in seconds)."""
+    frame = pd.DataFrame(list(db['quantitativeForecasts'].aggregate(quantitative_pipeline(cities))))
+    if frame.empty:
+        return pd.DataFrame(columns=QUANTITATIVE_COLUMNS)
+    frame = frame.reindex(columns=QUANTITATIVE_COLUMNS)
+    start, duration = split_valid_times(frame['time'].to_numpy(dtype=str))
+    frame['time'] = pd.DatetimeIndex(start, tz='UTC')
+    frame['duration'] = duration
+    frame['city'] = frame['city'].astype('category')
+    frame['precipitation'] = pd.to_numeric(frame['precipitation'], errors='coerce')
+    return frame
+
+def split_by_city(frame, cities):
+    """Group the frame by city once, returning {city: rows} for the cities that have data."""
+    if frame.empty:
+        return {}
+    groups = dict(tuple(frame.groupby('city', observed=True, sort=False)))
+    return {city: groups[city] for city in cities if city in groups}
+
+def update_times_by_city(db, cities, collection_name='Hourlyforecasts', source='documents'):
+    """Return {city: sorted updateTimes} describing which issuances a chart for that city would draw."""
+    cities = list(cities)
+    if source == 'timeseries':
+        places = list(db[PLACES_COLLECTION].find({'city': {'$in': cities}}, projection={'_id': 0, 'city': 1, 'gridpoint': 1}))
+        gridpoints = {place['gridpoint'] for place in places}
+        grouped = db[SERIES_COLLECTION].aggregate([
+            {'$match': {'meta.gridpoint': {'$in': list(gridpoints)}}},
+            {'$group': {'_id': '$meta.gridpoint', 'updateTimes': {'$addToSet': '$meta.updateTime'}}},
+        ])
+        by_gridpoint = {group['_id']: group['updateTimes'] for group in grouped}
+        return {place['city']: sorted(by_gridpoint.get(place['gridpoint'], [])) for place in places}
+
+    grouped = db[collection_name].aggregate([
+        {'$match': {'city': {'$in': cities}}},
+        {'$group': {'_id': '$city', 'updateTimes': {'$addToSet': '$updateTime'}}},
+    ])
+    return {group['_id']: sorted(group['updateTimes']) for group in grouped}
@@ -0,0 +1,104 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from requests.exceptions import RequestException
+
+from NoaaClient import get_client
+
+# Defaults tuned to stay well inside NOAA's (unpublished) per-client throttling
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_TIMEOUT = 15
+
+
+class RateLimiter:
+    """Token bucket allowing at most `rate` requests per second, shared across threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """At most `rate` requests per second across processes, with bursts of up to `burst` requests.
+
+    Each acquire() reserves the next free slot in a schedule held in shared memory (a GCRA), so
+    any number of worker processes draw on one budget. Create it before starting the workers.
+    """
+
+    def __init__(self, rate, burst=None, context=multiprocessing):
+        self.interval = 1.0 / float(rate)
+        self.tolerance = (float(burst if burst is not None else max(1.0, rate)) - 1) * self.interval
+        self.next_slot = context.Value('d', 0.0, lock=False)
+        self.lock = context.Lock()
+
+    def acquire(self):
+        """Block until this caller's slot comes up."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot.value, now - self.tolerance)
+            self.next_slot.value = slot + self.interval
+        wait = slot + self.tolerance - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Keep one RateLimiter per host so every API endpoint is throttled independently."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = RateLimiter(self.rate)
+        limiter.acquire()
+
+
+def fetch_all(requests_by_key, max_workers=DEFAULT_MAX_WORKERS,
+              requests_per_second=DEFAULT_REQUESTS_PER_SECOND, timeout=DEFAULT_TIMEOUT, client=None,
+              conditional=True):
+    """Fetch many URLs concurrently.
+
+    `requests_by_key` is an iterable of (key, url) pairs. Yields (key, response, error)
+    as each request completes; exactly one of response/error is None. Requests go
+    through the shared NoaaClient, so a 304 response means the payload is unchanged.
+    """
+    client = client or get_client()
+    limiter = HostRateLimiter(requests_per_second)
+
+    def fetch(key, url):
+        limiter.acquire(url)
+        try:
+            return key, client.get(url, conditional=conditional, timeout=timeout), None
+        except RequestException as e:
+            return key, None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch, key, url) for key, url in requests_by_key]
+        for future in as_completed(futures):
+            yield future.result()
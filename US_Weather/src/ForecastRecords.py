@@ -0,0 +1,216 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Hourly forecast periods normalized once at ingest. NOAA sends the wind as text ("10 to 15 mph"),
+# the dewpoint in degC next to temperatures in °F and a unit code on every period. Stored documents
+# hold numbers instead, one canonical unit per quantity, with the unit codes kept once per document.
+UNITS = {'temperature': 'degF', 'dewpoint': 'degF', 'probOfPrecipitation': 'percent',
+         'relativeHumidity': 'percent', 'windSpeed': 'mph'}
+
+# The compass points NOAA uses for windDirection; in memory a direction is its index (-1 when missing)
+WIND_DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                   'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+DIRECTION_CODES = {direction: code for code, direction in enumerate(WIND_DIRECTIONS)}
+# Index -1 (no direction) picks the trailing None
+DIRECTION_LABELS = np.array(WIND_DIRECTIONS + [None], dtype=object)
+
+WIND_SPEED = r"(\d+(?:\.\d+)?)(?:\s*to\s*(\d+(?:\.\d+)?))?\s*(mph|km/h)?"
+WIND_SPEED_PATTERN = re.compile(WIND_SPEED)
+
+KMH_TO_MPH = 1 / 1.609344
+
+UTC_OFFSET = re.compile(r"^(?P<sign>[+-])(?P<hours>\d\d):?(?P<minutes>\d\d)$")
+
+def offset_seconds(suffix):
+    """Seconds east of UTC in a timestamp suffix such as '-05:00' or 'Z'."""
+    if suffix in ('', 'Z'):
+        return 0
+    match = UTC_OFFSET.match(suffix)
+    if match is None:
+        raise ValueError(f"Unsupported UTC offset: {suffix!r}")
+    seconds = int(match.group('hours')) * 3600 + int(match.group('minutes')) * 60
+    return -seconds if match.group('sign') == '-' else seconds
+
+def format_offset(seconds):
+    """The '+HH:MM' suffix isoformat() writes for an offset of `seconds`."""
+    sign = '-' if seconds < 0 else '+'
+    hours, minutes = divmod(abs(seconds) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+def parse_times(timestamps):
+    """Parse ISO-8601 timestamps with a UTC offset into datetime64[s] UTC.
+
+    A forecast only uses one or two offsets (two across a DST change), so each is parsed once.
+    """
+    timestamps = np.asarray(timestamps, dtype=str)
+    if timestamps.size == 0:
+        return np.array([], dtype='datetime64[s]')
+    suffixes = [timestamp[19:] for timestamp in timestamps.tolist()]
+    if not all(len(suffix) in (1, 6) for suffix in suffixes):
+        # Fractional seconds or other variants
+        return pd.to_datetime(timestamps, utc=True, format='ISO8601').tz_localize(None).to_numpy('datetime64[s]')
+    offsets, inverse = np.unique(suffixes, return_inverse=True)
+    seconds = np.array([offset_seconds(offset) for offset in offsets.tolist()], dtype=np.int64)
+    return timestamps.astype('U19').astype('datetime64[s]') - seconds[inverse.ravel()].astype('timedelta64[s]')
+
+def local_times(times, tz):
+    """datetime64[s] UTC times as ISO-8601 strings in the timezone `tz`, as datetime.isoformat() writes them."""
+    local = pd.DatetimeIndex(times, tz='UTC').tz_convert(tz).tz_localize(None).to_numpy('datetime64[s]')
+    offsets, inverse = np.unique((local - times).astype(np.int64), return_inverse=True)
+    suffixes = np.array([format_offset(offset) for offset in offsets.tolist()])
+    return np.char.add(np.datetime_as_string(local, unit='s'), suffixes[inverse.ravel()]).tolist()
+
+def to_fahrenheit(value, unit):
+    """Convert temperatures given in `unit` ('F', 'C', 'wmoUnit:degC', 'degF', ...) to °F."""
+    if unit in ('C', 'degC', 'wmoUnit:degC'):
+        return np.round(np.asarray(value, dtype=np.float64) * 9 / 5 + 32, 1)
+    return value
+
+@lru_cache(maxsize=4096)
+def parse_wind_range(wind_speed):
+    """(low, high) wind speed in mph from strings like '10 to 15 mph'; a single speed is both."""
+    match = WIND_SPEED_PATTERN.search(wind_speed) if isinstance(wind_speed, str) else None
+    if match is None:
+        return np.nan, np.nan
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    if match.group(3) == 'km/h':
+        return round(low * KMH_TO_MPH, 1), round(high * KMH_TO_MPH, 1)
+    return low, high
+
+def wind_speed_ranges(wind_speed):
+    """Vectorized parse_wind_range over a Series of wind strings, returning (low, high) Series in mph."""
+    parts = wind_speed.astype('string').str.extract(WIND_SPEED)
+    low = pd.to_numeric(parts[0], errors='coerce').astype(np.float64)
+    high = pd.to_numeric(parts[1], errors='coerce').astype(np.float64).fillna(low)
+    scale = np.where((parts[2] == 'km/h').fillna(False), KMH_TO_MPH, 1.0)
+    return low * scale, high * scale
+
+def wind_speed_bounds(frame):
+    """windSpeedMin/windSpeedMax columns of flattened forecast rows.
+
+    Documents stored before the normalized format only have the windSpeed text, which is parsed
+    for the rows without numbers.
+    """
+    low = pd.to_numeric(frame.get('windSpeedMin', pd.Series(np.nan, index=frame.index)), errors='coerce')
+    high = pd.to_numeric(frame.get('windSpeedMax', pd.Series(np.nan, index=frame.index)), errors='coerce')
+    legacy = low.isna() & high.isna()
+    if 'windSpeed' in frame and legacy.any():
+        legacy_low, legacy_high = wind_speed_ranges(frame.loc[legacy, 'windSpeed'])
+        low = low.astype(np.float64).where(~legacy, legacy_low)
+        high = high.astype(np.float64).where(~legacy, legacy_high)
+    return low, high
+
+def quantity(period, name):
+    """A period's numeric field, whether NOAA sends it bare or as {'unitCode', 'value'}."""
+    value = period.get(name)
+    return value.get('value') if isinstance(value, dict) else value
+
+def unit_code(periods, name, default):
+    """The unit of `name` in a forecast's periods, which all share the first period's units."""
+    if not periods:
+        return default
+    value = periods[0].get(name)
+    return value.get('unitCode', default) if isinstance(value, dict) else default
+
+def column_values(array):
+    """A float array as a list for MongoDB: NaN as None, whole numbers as ints.
+
+    Hourly values repeat a lot, so every occurrence of a value shares one Python object.
+    """
+    if not array.size:
+        return []
+    distinct, inverse = np.unique(array, return_inverse=True)
+    values = [None if value != value else int(value) if value.is_integer() else value for value in distinct.tolist()]
+    return [values[index] for index in inverse.ravel().tolist()]
+
+
+class HourlyRecords:
+    """The periods of one hourly forecast as NumPy columns in the canonical UNITS (times in datetime64[s] UTC).
+
+    Built once per gridpoint and shared by every city in the cell; documents for a timezone are
+    produced from the columns without re-reading the response.
+    """
+
+    __slots__ = ('start', 'end', 'is_daytime', 'temperature', 'probability', 'dewpoint', 'humidity',
+                 'wind_min', 'wind_max', 'wind_direction', 'forecast_codes', 'forecast_labels')
+
+    def __init__(self, start, end, is_daytime, temperature, probability, dewpoint, humidity,
+                 wind_min, wind_max, wind_direction, forecast_codes, forecast_labels):
+        self.start = start
+        self.end = end
+        self.is_daytime = is_daytime
+        self.temperature = temperature
+        self.probability = probability
+        self.dewpoint = dewpoint
+        self.humidity = humidity
+        self.wind_min = wind_min
+        self.wind_max = wind_max
+        self.wind_direction = wind_direction
+        self.forecast_codes = forecast_codes
+        self.forecast_labels = forecast_labels
+
+    def __len__(self):
+        return len(self.temperature)
+
+    @classmethod
+    def from_periods(cls, periods):
+        """Normalize the 'periods' of an hourly forecast response."""
+        start = parse_times([period['startTime'] for period in periods])
+        end = parse_times([period['endTime'] for period in periods])
+        temperature_unit = periods[0].get('temperatureUnit', 'F') if periods else 'F'
+        temperature = np.array([period.get('temperature') for period in periods], dtype=np.float64)
+        dewpoint = np.array([quantity(period, 'dewpoint') for period in periods], dtype=np.float64)
+        wind = np.array([parse_wind_range(period.get('windSpeed')) for period in periods],
+                        dtype=np.float64).reshape(-1, 2)
+        forecast_codes, forecast_labels = pd.factorize(pd.Series([period.get('shortForecast') for period in periods],
+                                                                 dtype=object))
+        return cls(
+            start=start,
+            end=end,
+            is_daytime=np.array([bool(period.get('isDaytime')) for period in periods], dtype=bool),
+            temperature=to_fahrenheit(temperature, temperature_unit),
+            probability=np.array([quantity(period, 'probabilityOfPrecipitation') for period in periods],
+                                 dtype=np.float64),
+            dewpoint=to_fahrenheit(dewpoint, unit_code(periods, 'dewpoint', 'wmoUnit:degC')),
+            humidity=np.array([quantity(period, 'relativeHumidity') for period in periods], dtype=np.float64),
+            wind_min=wind[:, 0],
+            wind_max=wind[:, 1],
+            wind_direction=np.array([DIRECTION_CODES.get(period.get('windDirection'), -1) for period in periods],
+                                    dtype=np.int8),
+            forecast_codes=forecast_codes.astype(np.int16),
+            forecast_labels=np.append(np.asarray(forecast_labels, dtype=object), None),
+        )
+
+    def forecasts(self, tz):
+        """The periods as stored in an Hourlyforecasts document, with times in the timezone `tz`."""
+        columns = zip(
+            local_times(self.start, tz),
+            local_times(self.end, tz),
+            self.is_daytime.tolist(),
+            column_values(self.temperature),
+            column_values(self.probability),
+            column_values(self.dewpoint),
+            column_values(self.humidity),
+            column_values(self.wind_min),
+            column_values(self.wind_max),
+            DIRECTION_LABELS[self.wind_direction].tolist(),
+            self.forecast_labels[self.forecast_codes].tolist(),
+        )
+        return [{
+            'startTime': start,
+            'endTime': end,
+            'isDaytime': is_daytime,
+            'temperature': temperature,
+            'probOfPrecipitationValue': probability,
+            'dewpointValue': dewpoint,
+            'relativeHumidityValue': humidity,
+            'windSpeedMin': wind_min,
+            'windSpeedMax': wind_max,
+            'windDirection': direction,
+            'forecast': forecast,
+        } for start, end, is_daytime, temperature, probability, dewpoint, humidity, wind_min, wind_max,
+            direction, forecast in columns]
@@ -0,0 +1,239 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from Catalog import load_places, load_stations
+from ForecastRecords import wind_speed_bounds
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import ensure_indexes, get_database
+from SpatialIndex import SpatialIndex
+
+# Verify stored hourly forecasts against station observations.
+# Each observation is matched to the nearest place (and so its grid cell), aligned to the hourly
+# period covering it in every stored issuance, and the errors are accumulated per city, lead time
+# and variable as running sums in MongoDB, so a run only has to process observations it has not seen.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+observations_csv_path = os.path.join(parent_dir, "observations", "Observations.csv")
+
+STATS_COLLECTION = 'verification_stats'
+STATS_KEYS = ('city', 'leadHours', 'variable')
+STATE_COLLECTION = 'verification_state'
+
+DEFAULT_MAX_DISTANCE_KM = 25.0
+
+# Forecasts older than this before an observation cannot cover it (hourly forecasts span 156 hours)
+MAX_LEAD_HOURS = 168
+
+# Variable -> (observation column, forecast column); both sides are converted to the observation units
+VARIABLES = {
+    'temperature': ('temperatureValue', 'temperature'),          # degC
+    'dewpoint': ('dewpointValue', 'dewpoint'),                    # degC
+    'relativeHumidity': ('relativeHumidityValue', 'relativeHumidity'),  # percent
+    'windSpeed': ('windSpeedValue', 'windSpeed'),                 # km/h
+}
+OBSERVATION_COLUMNS = ['id', 'timestamp'] + [column for column, _ in VARIABLES.values()]
+
+MPH_TO_KMH = 1.609344
+
+def match_stations(stations, places, max_distance_km=DEFAULT_MAX_DISTANCE_KM):
+    """Match every station to its nearest place through the places' KD-tree (see SpatialIndex.py).
+
+    `stations` has stationIdentifier/latitude/longitude, `places` has NAME.1/INTPTLAT/INTPTLONG.
+    Returns station, city and distanceKm for stations within `max_distance_km` of a place.
+    """
+    stations = stations.dropna(subset=['latitude', 'longitude'])
+    index = SpatialIndex(places)
+    if stations.empty or not len(index.place_names):
+        return pd.DataFrame(columns=['station', 'city', 'distanceKm'])
+    place, km = index.nearest_places(stations['latitude'], stations['longitude'], max_distance_km)
+    found = place >= 0
+    return pd.DataFrame({
+        'station': stations['stationIdentifier'].to_numpy()[found],
+        'city': index.place_names[place[found]],
+        'distanceKm': km[found],
+    })
+
+def forecast_pipeline(cities, issued_after):
+    """Aggregation pipeline flattening Hourlyforecasts into one row per (city, issuance, period)."""
+    return [
+        {'$match': {'city': {'$in': list(cities)}, 'updateTime': {'$gte': issued_after}}},
+        {'$unwind': '$forecasts'},
+        {'$project': {
+            '_id': 0,
+            'city': 1,
+            'updateTime': 1,
+            'start': '$forecasts.startTime',
+            'temperature': '$forecasts.temperature',
+            # Units are kept once per document, or on every period in documents stored before that
+            'temperatureUnit': {'$ifNull': ['$forecasts.temperatureUnit', '$units.temperature']},
+            'dewpoint': '$forecasts.dewpointValue',
+            'dewpointUnit': {'$ifNull': ['$forecasts.dewpointUnit', '$units.dewpoint']},
+            'relativeHumidity': '$forecasts.relativeHumidityValue',
+            'windSpeedMin': '$forecasts.windSpeedMin',
+            'windSpeedMax': '$forecasts.windSpeedMax',
+            'windSpeed': '$forecasts.windSpeed',
+        }},
+    ]
+
+def to_celsius(values, units, default_unit):
+    """Temperatures in degC from values in °F or degC, `units` giving each row's unit (missing: `default_unit`)."""
+    values = pd.to_numeric(values, errors='coerce')
+    if units is None:
+        units = pd.Series(default_unit, index=values.index)
+    fahrenheit = units.fillna(default_unit).isin(['F', 'degF', 'wmoUnit:degF'])
+    return values.where(~fahrenheit, (values - 32) * 5 / 9)
+
+def forecast_frame(rows):
+    """Type forecast rows and convert them to observation units (degC, km/h)."""
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return frame
+    frame['issued'] = pd.to_datetime(frame['updateTime'], utc=True, format='ISO8601')
+    frame['start'] = pd.to_datetime(frame['start'], utc=True, format='ISO8601')
+    frame['temperature'] = to_celsius(frame['temperature'], frame.get('temperatureUnit'), 'F')
+    frame['dewpoint'] = to_celsius(frame['dewpoint'], frame.get('dewpointUnit'), 'wmoUnit:degC')
+    frame['relativeHumidity'] = pd.to_numeric(frame['relativeHumidity'], errors='coerce')
+    # The middle of a forecast range such as "10 to 15 mph"
+    wind_min, wind_max = wind_speed_bounds(frame)
+    frame['windSpeed'] = (wind_min + wind_max) / 2 * MPH_TO_KMH
+    return frame.drop(columns=['updateTime', 'temperatureUnit', 'dewpointUnit', 'windSpeedMin', 'windSpeedMax'],
+                      errors='ignore')
+
+def pair_observations(observations, matches, forecasts):
+    """Join observations with every forecast period that covered them.
+
+    Hourly periods start on the hour, so an observation is aligned to the period starting at its
+    timestamp floored to the hour. Returns one row per (observation, issuance) with leadHours and
+    an error column per variable (forecast minus observed).
+    """
+    if observations.empty or matches.empty or forecasts.empty:
+        return pd.DataFrame(columns=['city', 'leadHours'] + list(VARIABLES))
+    observed = observations.merge(matches, left_on='id', right_on='station')
+    observed['start'] = pd.to_datetime(observed['timestamp'], utc=True, format='ISO8601').dt.floor('h')
+    pairs = observed.merge(forecasts, on=['city', 'start'])
+    pairs['leadHours'] = ((pairs['start'] - pairs['issued']) // pd.Timedelta(hours=1)).astype('int64')
+    pairs = pairs[(pairs['leadHours'] >= 0) & (pairs['leadHours'] < MAX_LEAD_HOURS)]
+    errors = pd.DataFrame({'city': pairs['city'], 'leadHours': pairs['leadHours']})
+    for variable, (observed_column, forecast_column) in VARIABLES.items():
+        errors[variable] = (pd.to_numeric(pairs[forecast_column], errors='coerce')
+                            - pd.to_numeric(pairs[observed_column], errors='coerce'))
+    return errors
+
+def error_sums(errors):
+    """Sufficient statistics (n, sum, sum of |e|, sum of e^2) per city, lead time and variable."""
+    long = errors.melt(id_vars=['city', 'leadHours'], var_name='variable', value_name='error').dropna(subset=['error'])
+    long['absError'] = long['error'].abs()
+    long['squaredError'] = long['error'] ** 2
+    return long.groupby(['city', 'leadHours', 'variable'], observed=True, sort=False).agg(
+        n=('error', 'size'), sumError=('error', 'sum'), sumAbsError=('absError', 'sum'),
+        sumSquaredError=('squaredError', 'sum')).reset_index()
+
+def error_statistics(sums, by=('leadHours',)):
+    """Bias, MAE and RMSE from accumulated sums, grouped by `by` (and always by variable)."""
+    keys = list(by) + ['variable']
+    totals = sums.groupby(keys, sort=True)[['n', 'sumError', 'sumAbsError', 'sumSquaredError']].sum()
+    return pd.DataFrame({
+        'n': totals['n'],
+        'bias': totals['sumError'] / totals['n'],
+        'mae': totals['sumAbsError'] / totals['n'],
+        'rmse': np.sqrt(totals['sumSquaredError'] / totals['n']),
+    }).reset_index()
+
+def save_error_sums(db, sums):
+    """Add this run's sums to the running totals in MongoDB."""
+    if sums.empty:
+        return
+    db[STATS_COLLECTION].bulk_write([
+        UpdateOne({'city': row.city, 'leadHours': int(row.leadHours), 'variable': row.variable},
+                  {'$inc': {'n': int(row.n), 'sumError': float(row.sumError), 'sumAbsError': float(row.sumAbsError),
+                            'sumSquaredError': float(row.sumSquaredError)}}, upsert=True)
+        for row in sums.itertuples(index=False)
+    ], ordered=False)
+
+def load_error_sums(db):
+    return pd.DataFrame(list(db[STATS_COLLECTION].find({}, projection={'_id': 0})))
+
+def load_state(db):
+    return db[STATE_COLLECTION].find_one({'_id': 'observations'}) or {'_id': 'observations', 'stations': {}}
+
+def new_observations_from_db(db, state):
+    """Observations stored by the scheduler since the last run (ObjectIds grow with insertion time)."""
+    query = {'_id': {'$gt': state['lastId']}} if state.get('lastId') else {}
+    rows = list(db['observations'].find(query, projection=OBSERVATION_COLUMNS + ['_id']).sort('_id', 1))
+    if rows:
+        state['lastId'] = rows[-1]['_id']
+    return pd.DataFrame(rows, columns=OBSERVATION_COLUMNS)
+
+def new_observations_from_file(path, state):
+    """Rows of an observation sweep (CSV or Excel) newer than the last timestamp seen per station."""
+    read = pd.read_excel if path.endswith('.xlsx') else pd.read_csv
+    frame = read(path, usecols=lambda column: column in OBSERVATION_COLUMNS).dropna(subset=['id', 'timestamp'])
+    times = pd.to_datetime(frame['timestamp'], utc=True, format='ISO8601')
+    seen = pd.to_datetime(frame['id'].map(state['stations']), utc=True, format='ISO8601')
+    frame = frame[seen.isna() | (times > seen)]
+    state['stations'].update(frame.groupby('id')['timestamp'].max().to_dict())
+    return frame
+
+def verify(db, observations, matches, max_lead_hours=MAX_LEAD_HOURS):
+    """Pair new observations with stored forecasts and add their errors to the running totals."""
+    metrics = get_metrics()
+    if observations.empty:
+        return 0
+    observations = observations[observations['id'].isin(matches['station'])]
+    cities = matches.loc[matches['station'].isin(observations['id']), 'city'].unique().tolist()
+    if not cities:
+        return 0
+    oldest = pd.to_datetime(observations['timestamp'], utc=True, format='ISO8601').min()
+    issued_after = (oldest - pd.Timedelta(hours=max_lead_hours)).isoformat()
+    with metrics.stage('verification_load_forecasts'):
+        forecasts = forecast_frame(list(db['Hourlyforecasts'].aggregate(forecast_pipeline(cities, issued_after))))
+    with metrics.stage('verification_pair'):
+        errors = pair_observations(observations, matches, forecasts)
+    with metrics.stage('verification_sums'):
+        sums = error_sums(errors)
+    with metrics.stage('verification_write'):
+        save_error_sums(db, sums)
+    metrics.increment('verification_pairs', len(errors))
+    return len(errors)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify stored hourly forecasts against station observations.")
+    parser.add_argument("--state", default="NewYork", help="Places sheet whose forecasts are verified")
+    parser.add_argument("--observations", help="Read observations from this CSV/Excel sweep instead of MongoDB "
+                                               f"(e.g. {observations_csv_path})")
+    parser.add_argument("--max-distance", type=float, default=DEFAULT_MAX_DISTANCE_KM,
+                        help="Ignore stations farther than this many km from every place")
+    parser.add_argument("--by", nargs="+", default=["leadHours"], choices=["leadHours", "city"],
+                        help="Group the printed statistics by lead time and/or city")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    db = get_database()
+    ensure_indexes(db[STATS_COLLECTION], STATS_KEYS)
+    started = time.perf_counter()
+    places = load_places(args.state, ['NAME.1', 'INTPTLAT', 'INTPTLONG'])
+    matches = match_stations(load_stations(['stationIdentifier', 'latitude', 'longitude']), places, args.max_distance)
+    print(f"{len(matches)} stations lie within {args.max_distance:g} km of a place in {args.state}")
+
+    state = load_state(db)
+    with profiled(args.profile, 'verification'):
+        if args.observations:
+            observations = new_observations_from_file(args.observations, state)
+        else:
+            observations = new_observations_from_db(db, state)
+        pairs = verify(db, observations, matches)
+    # Move the watermark only once the sums are stored
+    db[STATE_COLLECTION].replace_one({'_id': 'observations'}, state, upsert=True)
+    print(f"Verified {len(observations)} new observations as {pairs} forecast pairs "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    sums = load_error_sums(db)
+    if not sums.empty:
+        summary = error_statistics(sums, by=args.by)
+        print(summary.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    export_metrics('verification', args)
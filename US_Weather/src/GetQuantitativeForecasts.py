@@ -1,40 +1,58 @@
-import requests
-import pandas as pd
-import os
+import argparse
 from datetime import datetime
-from pymongo import MongoClient
-from pytz import timezone
-from timezonefinder import TimezoneFinder
 
-# Initialize TimezoneFinder
-tf = TimezoneFinder()
+from requests.exceptions import RequestException
 
-# Define the dynamic path for the Excel file
-script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where the script is located
-parent_dir = os.path.abspath(os.path.join(script_dir, ".."))  # Get parent directory
-file_path = os.path.join(parent_dir, "Data", "WeatherStationDatabase.xlsx")  # Build the dynamic path
+from Catalog import load_places
+from GridpointGroups import gridpoint_key, group_by_gridpoint, report_request_savings
+from GridpointParser import loads
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import FORECAST_KEYS, MongoWriter, ensure_indexes, get_database
+from NoaaClient import get_client
+from Summaries import update_summaries
+from TimezoneCache import get_timezone_cache
 
-# Load the Excel file
+# Timezones come from the on-disk cache; TimezoneFinder is only loaded on a cache miss
+timezone_cache = get_timezone_cache()
+
+# Shared NOAA client (pooled connections, conditional requests)
+client = get_client()
+
+# Stage timings and counters, exported at the end of the run
+metrics = get_metrics()
+
+# Batched writer on a shared MongoClient; reruns on an unchanged updateTime write nothing
+collection = get_database()['quantitativeForecasts']
+ensure_indexes(collection)
+writer = MongoWriter(collection, upsert_keys=FORECAST_KEYS)
+
+# Load the places of one state sheet from the catalog (falls back to WeatherStationDatabase.xlsx)
 sheet_name = "NewYork"
-df = pd.read_excel(file_path, sheet_name=sheet_name)
 
-# Extract required columns
-data_entries = df[['gridId', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']]
+# Required columns
+place_columns = ['gridId', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']
 
-def get_time_zone(lat, lon):
+def get_time_zone(lat, lon, gridpoint=None):
     """Get the timezone for given latitude and longitude."""
-    tz_name = tf.timezone_at(lng=lon, lat=lat)
-    return tz_name if tz_name else 'UTC'
+    return timezone_cache.lookup(lat, lon, gridpoint)
 
 def get_quantitative_forecast_url(grid_id, grid_x, grid_y):
     """Build NOAA quantitative forecast API URL using grid values."""
     return f"https://api.weather.gov/gridpoints/{grid_id}/{grid_x},{grid_y}"
 
-def get_quantitative_forecast(forecast_url, tz_name):
+def get_quantitative_forecast(forecast_url):
     """Fetch the quantitative weather forecast using NOAA API."""
-    response = requests.get(forecast_url)
+    try:
+        response = client.get(forecast_url)
+    except RequestException as e:
+        # Timeouts and connection errors that survived the retries, or an open circuit for the office
+        return {'error': f'Failed to fetch data from {forecast_url}: {e}', 'status_code': None}
+    if response.status_code == 304:
+        return {'notModified': True}
     if response.status_code == 200:
-        data = response.json().get('properties', {})
+        # Raw-data payloads are large; decode them with orjson when available
+        with metrics.stage('json_parse'):
+            data = loads(response.content).get('properties', {})
 
         # Parse key weather elements
         forecast_data = {
@@ -44,7 +62,6 @@ def get_quantitative_forecast(forecast_url, tz_name):
             'iceAccumulation': parse_weather_element(data, 'iceAccumulation'),
             'quantitativePrecipitation': parse_weather_element(data, 'quantitativePrecipitation'),
             'skyCover': parse_weather_element(data, 'skyCover'),
-            "timeZone": tz_name
         }
         return forecast_data
     else:
@@ -63,32 +80,73 @@ def parse_weather_element(data, element_name):
     return parsed_elements
 
 def save_to_mongo(forecast_data, city_name):
-    """Save forecast data to MongoDB with city name."""
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['weather_database']
-    collection = db['quantitativeForecasts']
+    """Queue forecast data for MongoDB with city name."""
     forecast_data['city'] = city_name
     forecast_data['insertedAt'] = datetime.now()
-    collection.insert_one(forecast_data)
-    print(f"Data for {city_name} inserted into MongoDB")
-
-# Process each city in the dataset
-for index, row in data_entries.iterrows():
-    grid_id, grid_x, grid_y = row['gridId'], row['gridX'], row['gridY']
-    lat, lon = float(row['INTPTLAT']), float(row['INTPTLONG'])
-    city_name = row['NAME.1']
-    
-    # Get timezone
-    tz_name = get_time_zone(lat, lon)
-    
+    writer.add(forecast_data)
+    print(f"Data for {city_name} queued for MongoDB")
+
+def process_gridpoint(grid_id, grid_x, grid_y, cities):
+    """Fetch one gridpoint and queue a copy of its forecast for every city in the cell.
+
+    Returns the forecast's updateTime, or None when it was unchanged or could not be fetched.
+    """
+    gridpoint = gridpoint_key(grid_id, grid_x, grid_y)
+
     # Build forecast URL
     forecast_url = get_quantitative_forecast_url(grid_id, grid_x, grid_y)
-    
+
     # Fetch forecast
-    forecast_data = get_quantitative_forecast(forecast_url, tz_name)
-    
-    # Save to MongoDB
-    if 'error' not in forecast_data:
-        save_to_mongo(forecast_data, city_name)
-    else:
-        print(f"Error fetching data for {city_name}: {forecast_data['error']}")
+    forecast_data = get_quantitative_forecast(forecast_url)
+
+    if forecast_data.get('notModified'):
+        print(f"Forecast for {gridpoint} unchanged since last run, skipping {len(cities)} cities")
+        metrics.increment('gridpoints', result='unchanged')
+        return None
+    if 'error' in forecast_data:
+        print(f"Error fetching data for {gridpoint}: {forecast_data['error']}")
+        metrics.increment('gridpoints', result='error')
+        return None
+
+    for index, row in cities.iterrows():
+        lat, lon = float(row['INTPTLAT']), float(row['INTPTLONG'])
+        city_name = row['NAME.1']
+
+        # Get timezone
+        tz_name = get_time_zone(lat, lon, gridpoint)
+
+        # Save a copy per city to MongoDB
+        save_to_mongo(dict(forecast_data, timeZone=tz_name), city_name)
+    metrics.increment('gridpoints', result='fetched')
+    return forecast_data.get('updateTime')
+
+def load_gridpoint_groups(state=sheet_name):
+    """Places of one state sheet grouped by grid cell."""
+    return group_by_gridpoint(load_places(state, place_columns))
+
+def store_pending():
+    """Write everything queued so far to MongoDB."""
+    writer.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch NOAA quantitative forecasts for one state sheet and store them in MongoDB.")
+    parser.add_argument("--state", default=sheet_name, help="Places sheet to fetch (ShardedForecasts.py runs several)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # Fetch each gridpoint once and fan the forecast out to every city in that grid cell
+    gridpoint_groups = load_gridpoint_groups(args.state)
+    with profiled(args.profile, 'quantitative_forecast'):
+        for (grid_id, grid_x, grid_y), cities in gridpoint_groups:
+            with metrics.stage('gridpoint'):
+                process_gridpoint(grid_id, grid_x, grid_y, cities)
+
+    report_request_savings(gridpoint_groups)
+    writer.close()
+    # Fold the new issuances into the daily summaries read by the charts
+    update_summaries(collection.database, ['quantitativeForecasts'])
+
+    # Remember validators only after everything fetched this run has been stored
+    client.save_validators()
+    timezone_cache.save()
+    export_metrics('quantitative_forecast', args)
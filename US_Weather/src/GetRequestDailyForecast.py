@@ -1,92 +1,155 @@
-import requests
-import pandas as pd
-import os
+import argparse
 from datetime import datetime
-from pymongo import MongoClient
-from pytz import timezone
-from timezonefinder import TimezoneFinder
 
-# Initialize TimezoneFinder
-tf = TimezoneFinder()
+from requests.exceptions import RequestException
 
-# Define the dynamic path for the Excel file
-script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where the script is located
-parent_dir = os.path.abspath(os.path.join(script_dir, ".."))  # Get parent directory
-file_path = os.path.join(parent_dir, "Data", "WeatherStationDatabase.xlsx")  # Build the dynamic path
+from Catalog import load_places
+from GridpointGroups import gridpoint_key, group_by_gridpoint, report_request_savings
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import FORECAST_KEYS, MongoWriter, ensure_indexes, get_database
+from NoaaClient import get_client
+from TimezoneCache import get_timezone, get_timezone_cache
 
-# Load the Excel file
+# Timezones come from the on-disk cache; TimezoneFinder is only loaded on a cache miss
+timezone_cache = get_timezone_cache()
+
+# Shared NOAA client (pooled connections, conditional requests)
+client = get_client()
+
+# Stage timings and counters, exported at the end of the run
+metrics = get_metrics()
+
+# Batched writer on a shared MongoClient; reruns on an unchanged updateTime write nothing
+collection = get_database()['daily_forecasts']
+ensure_indexes(collection)
+writer = MongoWriter(collection, upsert_keys=FORECAST_KEYS)
+
+# Load the places of one state sheet from the catalog (falls back to WeatherStationDatabase.xlsx)
 sheet_name = "NewYork"
-df = pd.read_excel(file_path, sheet_name=sheet_name)
 
-# Extract required columns
-data_entries = df[['gridId', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']]
+# Required columns
+place_columns = ['gridId', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']
 
-def get_time_zone(lat, lon):
+def get_time_zone(lat, lon, gridpoint=None):
     """Get the timezone for given latitude and longitude."""
-    tz_name = tf.timezone_at(lng=lon, lat=lat)
-    return tz_name if tz_name else 'UTC'
+    return timezone_cache.lookup(lat, lon, gridpoint)
 
 def get_forecast_url(grid_id, grid_x, grid_y):
     """Build NOAA daily forecast API URL using grid values."""
     return f"https://api.weather.gov/gridpoints/{grid_id}/{grid_x},{grid_y}/forecast"
 
-def get_daily_forecast(forecast_url, tz_name):
+def get_daily_forecast(forecast_url):
     """Fetch the daily weather forecast using NOAA API."""
-    response = requests.get(forecast_url)
+    try:
+        response = client.get(forecast_url)
+    except RequestException as e:
+        # Timeouts and connection errors that survived the retries, or an open circuit for the office
+        return {'error': f'Failed to fetch data from {forecast_url}: {e}', 'status_code': None}
+    if response.status_code == 304:
+        return {'notModified': True}
     if response.status_code == 200:
-        data = response.json()
-        properties = data.get('properties', {})
-        structured_forecasts = []
-        
-        for period in properties.get('periods', []):
-            start_time = datetime.fromisoformat(period['startTime'].replace('Z', '+00:00'))
-            structured_forecasts.append({
-                'startTime': start_time.astimezone(timezone(tz_name)).isoformat(),
-                "isDaytime": period['isDaytime'],
-                'temperature': period['temperature'],
-                'temperatureUnit': period['temperatureUnit'],
-                'probOfPrecipitationValue': period['probabilityOfPrecipitation']['value'],
-                'probOfPrecipitationUnit': period['probabilityOfPrecipitation']['unitCode'],
-                'windSpeed': period['windSpeed'],
-                'windDirection': period['windDirection'],
-                'forecast': period['shortForecast']
-            })
-        
-        return {
-            'updateTime': properties.get('updateTime', ''),
-            'generatedAt': properties.get('generatedAt', ''),
-            'forecasts': structured_forecasts
-        }
+        with metrics.stage('json_parse'):
+            data = response.json()
+        return {'properties': data.get('properties', {})}
     else:
         return {'error': f'Failed to fetch data from {forecast_url}', 'status_code': response.status_code}
 
+def structure_daily_forecast(properties, tz_name):
+    """Convert the forecast periods into the stored document shape for one timezone."""
+    structured_forecasts = []
+    tz = get_timezone(tz_name)
+
+    for period in properties.get('periods', []):
+        start_time = datetime.fromisoformat(period['startTime'].replace('Z', '+00:00'))
+        structured_forecasts.append({
+            'startTime': start_time.astimezone(tz).isoformat(),
+            "isDaytime": period['isDaytime'],
+            'temperature': period['temperature'],
+            'temperatureUnit': period['temperatureUnit'],
+            'probOfPrecipitationValue': period['probabilityOfPrecipitation']['value'],
+            'probOfPrecipitationUnit': period['probabilityOfPrecipitation']['unitCode'],
+            'windSpeed': period['windSpeed'],
+            'windDirection': period['windDirection'],
+            'forecast': period['shortForecast']
+        })
+
+    return {
+        'updateTime': properties.get('updateTime', ''),
+        'generatedAt': properties.get('generatedAt', ''),
+        'forecasts': structured_forecasts
+    }
+
 def save_forecasts_to_mongo(forecast_data, city_name):
-    """Save forecast data to MongoDB with city name."""
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['weather_database']
-    collection = db['daily_forecasts']
+    """Queue forecast data for MongoDB with city name."""
     forecast_data['city'] = city_name
     forecast_data['insertedAt'] = datetime.now()
-    collection.insert_one(forecast_data)
-    print(f"Data for {city_name} inserted into MongoDB")
-
-# Process each city in the dataset
-for index, row in data_entries.iterrows():
-    grid_id, grid_x, grid_y = row['gridId'], row['gridX'], row['gridY']
-    lat, lon = float(row['INTPTLAT']), float(row['INTPTLONG'])
-    city_name = row['NAME.1']
-    
-    # Get timezone
-    tz_name = get_time_zone(lat, lon)
-    
+    writer.add(forecast_data)
+    print(f"Data for {city_name} queued for MongoDB")
+
+def process_gridpoint(grid_id, grid_x, grid_y, cities):
+    """Fetch one gridpoint and queue a copy of its forecast for every city in the cell.
+
+    Returns the forecast's updateTime, or None when it was unchanged or could not be fetched.
+    """
+    gridpoint = gridpoint_key(grid_id, grid_x, grid_y)
+
     # Build forecast URL
     forecast_url = get_forecast_url(grid_id, grid_x, grid_y)
-    
+
     # Fetch forecast
-    forecast_data = get_daily_forecast(forecast_url, tz_name)
-    
-    # Save to MongoDB
-    if 'error' not in forecast_data:
-        save_forecasts_to_mongo(forecast_data, city_name)
-    else:
-        print(f"Error fetching data for {city_name}: {forecast_data['error']}")
+    response_data = get_daily_forecast(forecast_url)
+
+    if response_data.get('notModified'):
+        print(f"Forecast for {gridpoint} unchanged since last run, skipping {len(cities)} cities")
+        metrics.increment('gridpoints', result='unchanged')
+        return None
+    if 'error' in response_data:
+        print(f"Error fetching data for {gridpoint}: {response_data['error']}")
+        metrics.increment('gridpoints', result='error')
+        return None
+
+    # Cities in one cell nearly always share a timezone, so this is usually a single conversion
+    forecasts_by_tz = {}
+    for index, row in cities.iterrows():
+        lat, lon = float(row['INTPTLAT']), float(row['INTPTLONG'])
+        city_name = row['NAME.1']
+
+        # Get timezone
+        tz_name = get_time_zone(lat, lon, gridpoint)
+        if tz_name not in forecasts_by_tz:
+            with metrics.stage('structure'):
+                forecasts_by_tz[tz_name] = structure_daily_forecast(response_data['properties'], tz_name)
+
+        # Save a copy per city to MongoDB
+        save_forecasts_to_mongo(dict(forecasts_by_tz[tz_name]), city_name)
+    metrics.increment('gridpoints', result='fetched')
+    return response_data['properties'].get('updateTime')
+
+def load_gridpoint_groups(state=sheet_name):
+    """Places of one state sheet grouped by grid cell."""
+    return group_by_gridpoint(load_places(state, place_columns))
+
+def store_pending():
+    """Write everything queued so far to MongoDB."""
+    writer.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch NOAA daily forecasts for one state sheet and store them in MongoDB.")
+    parser.add_argument("--state", default=sheet_name, help="Places sheet to fetch (ShardedForecasts.py runs several)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # Fetch each gridpoint once and fan the forecast out to every city in that grid cell
+    gridpoint_groups = load_gridpoint_groups(args.state)
+    with profiled(args.profile, 'daily_forecast'):
+        for (grid_id, grid_x, grid_y), cities in gridpoint_groups:
+            with metrics.stage('gridpoint'):
+                process_gridpoint(grid_id, grid_x, grid_y, cities)
+
+    report_request_savings(gridpoint_groups)
+    writer.close()
+
+    # Remember validators only after everything fetched this run has been stored
+    client.save_validators()
+    timezone_cache.save()
+    export_metrics('daily_forecast', args)
@@ -1,94 +1,183 @@
-import requests
-import pandas as pd
-import os
+import argparse
 from datetime import datetime
-from pymongo import MongoClient
-from pytz import timezone
-from timezonefinder import TimezoneFinder
 
-# Initialize TimezoneFinder
-tf = TimezoneFinder()
+from requests.exceptions import RequestException
 
-# Define the dynamic path for the Excel file
-script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where the script is located
-parent_dir = os.path.abspath(os.path.join(script_dir, ".."))  # Get parent directory
-file_path = os.path.join(parent_dir, "Data", "WeatherStationDatabase.xlsx")  # Build the dynamic path
+from Catalog import load_places
+from ForecastRecords import UNITS, HourlyRecords
+from GridpointGroups import gridpoint_key, group_by_gridpoint, report_request_savings, split_grid_column
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import FORECAST_KEYS, MongoWriter, ensure_indexes, get_database
+from NoaaClient import get_client
+from Summaries import update_summaries
+from TimeSeriesStore import ensure_series_collection, hourly_series_rows, save_places, series_already_stored
+from TimezoneCache import get_timezone, get_timezone_cache
 
-# Load the Excel file
+# Timezones come from the on-disk cache; TimezoneFinder is only loaded on a cache miss
+timezone_cache = get_timezone_cache()
+
+# Shared NOAA client (pooled connections, conditional requests)
+client = get_client()
+
+# Stage timings and counters, exported at the end of the run
+metrics = get_metrics()
+
+# Storage layout: "documents" (nested document per city), "timeseries" (one row per gridpoint hour) or "both"
+STORAGE_MODES = ["documents", "timeseries", "both"]
+storage_mode = "documents"
+
+# Batched writers on a shared MongoClient; reruns on an unchanged updateTime write nothing
+db = get_database()
+collection = db['Hourlyforecasts']
+ensure_indexes(collection)
+writer = MongoWriter(collection, upsert_keys=FORECAST_KEYS)
+# The time-series collection and its writer exist only in the "timeseries" and "both" layouts
+series_collection = None
+series_writer = None
+series_places = []
+
+def set_storage_mode(mode):
+    """Select the storage layout (--storage; Scheduler.py and ShardedForecasts.py pass theirs through)."""
+    global storage_mode, series_collection, series_writer
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode {mode!r}, expected one of {', '.join(STORAGE_MODES)}")
+    storage_mode = mode
+    if mode != "documents" and series_writer is None:
+        series_collection = ensure_series_collection(db)
+        series_writer = MongoWriter(series_collection)
+    elif mode == "documents" and series_writer is not None:
+        store_pending()
+        series_collection = series_writer = None
+
+# Load the places of one state sheet from the catalog (falls back to WeatherStationDatabase.xlsx)
 sheet_name = "NewYork"
-df = pd.read_excel(file_path, sheet_name=sheet_name)
 
-# Extract required columns
-data_entries = df[['gridId/gridX/gridY', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']]
+# Required columns
+place_columns = ['gridId/gridX/gridY', 'gridX', 'gridY', 'INTPTLAT', 'INTPTLONG', 'NAME.1']
 
-def get_time_zone(lat, lon):
+def get_time_zone(lat, lon, gridpoint=None):
     """Get the timezone for given latitude and longitude."""
-    tz_name = tf.timezone_at(lng=lon, lat=lat)
-    return tz_name if tz_name else 'UTC'
+    return timezone_cache.lookup(lat, lon, gridpoint)
 
-def get_hourly_forecast(grid_id, grid_x, grid_y, tz_name):
+def get_hourly_forecast(grid_id, grid_x, grid_y):
     """Fetch the hourly weather forecast using NOAA API."""
     url = f"https://api.weather.gov/gridpoints/{grid_id}/{grid_x},{grid_y}/forecast/hourly"
-    response = requests.get(url)
+    try:
+        response = client.get(url)
+    except RequestException as e:
+        # Timeouts and connection errors that survived the retries, or an open circuit for the office
+        return {'error': f'Failed to fetch data for {grid_id}/{grid_x},{grid_y}: {e}', 'status_code': None}
+    if response.status_code == 304:
+        return {'notModified': True}
     if response.status_code == 200:
-        data = response.json()
-        properties = data.get('properties', {})
-        structured_forecasts = []
-        
-        for period in properties.get('periods', []):
-            start_time = datetime.fromisoformat(period['startTime'].replace('Z', '+00:00'))
-            end_time = datetime.fromisoformat(period['endTime'].replace('Z', '+00:00'))
-            structured_forecasts.append({
-                'startTime': start_time.astimezone(timezone(tz_name)).isoformat(),
-                'endTime': end_time.astimezone(timezone(tz_name)).isoformat(),
-                "isDaytime": period['isDaytime'],
-                'temperature': period['temperature'],
-                'temperatureUnit': period['temperatureUnit'],
-                'probOfPrecipitationValue': period['probabilityOfPrecipitation']['value'],
-                'probOfPrecipitationUnit': period['probabilityOfPrecipitation']['unitCode'],
-                'dewpointValue': period['dewpoint']['value'],
-                'dewpointUnit': period['dewpoint']['unitCode'],
-                'relativeHumidityValue': period['relativeHumidity']['value'],
-                'relativeHumidityUnit': period['relativeHumidity']['unitCode'],
-                'windSpeed': period['windSpeed'],
-                'windDirection': period['windDirection'],
-                'forecast': period['shortForecast']
-            })
-        
-        return {
-            'updateTime': properties.get('updateTime', ''),
-            'generatedAt': properties.get('generatedAt', ''),
-            'forecasts': structured_forecasts
-        }
+        with metrics.stage('json_parse'):
+            data = response.json()
+        return {'properties': data.get('properties', {})}
     else:
         return {'error': f'Failed to fetch data for {grid_id}/{grid_x},{grid_y}', 'status_code': response.status_code}
 
+def structure_hourly_forecast(properties, records, tz_name):
+    """Build the stored document shape for one timezone from the gridpoint's normalized records."""
+    return {
+        'updateTime': properties.get('updateTime', ''),
+        'generatedAt': properties.get('generatedAt', ''),
+        # One copy of the unit codes per document instead of one per period
+        'units': UNITS,
+        'forecasts': records.forecasts(get_timezone(tz_name))
+    }
+
 def save_forecasts_to_mongo(forecast_data, city_name):
-    """Save forecast data to MongoDB with city name."""
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['weather_database']
-    collection = db['Hourlyforecasts']
+    """Queue forecast data for MongoDB with city name."""
     forecast_data['city'] = city_name
     forecast_data['insertedAt'] = datetime.now()
-    collection.insert_one(forecast_data)
-    print(f"Data for {city_name} inserted into MongoDB")
-
-# Process each city in the dataset
-for index, row in data_entries.iterrows():
-    grid_info = row['gridId/gridX/gridY'].split('/')
-    if len(grid_info) == 3:
-        grid_id, grid_x, grid_y = grid_info
+    writer.add(forecast_data)
+    print(f"Data for {city_name} queued for MongoDB")
+
+def process_gridpoint(grid_id, grid_x, grid_y, cities):
+    """Fetch one gridpoint and queue its forecast for every city in the cell (and/or as series rows).
+
+    Returns the forecast's updateTime, or None when it was unchanged or could not be fetched.
+    """
+    gridpoint = gridpoint_key(grid_id, grid_x, grid_y)
+
+    # Fetch forecast
+    response_data = get_hourly_forecast(grid_id, grid_x, grid_y)
+
+    if response_data.get('notModified'):
+        print(f"Forecast for {gridpoint} unchanged since last run, skipping {len(cities)} cities")
+        metrics.increment('gridpoints', result='unchanged')
+        return None
+    if 'error' in response_data:
+        print(f"Error fetching data for {gridpoint}: {response_data['error']}")
+        metrics.increment('gridpoints', result='error')
+        return None
+
+    # Time-series layout: one row per hour for the whole grid cell, shared by its cities
+    properties = response_data['properties']
+    with metrics.stage('normalize'):
+        records = HourlyRecords.from_periods(properties.get('periods', []))
+    if series_writer is not None and not series_already_stored(series_collection, gridpoint, properties.get('updateTime', '')):
+        for series_row in hourly_series_rows(gridpoint, properties, records):
+            series_writer.add(series_row)
+
+    # Cities in one cell nearly always share a timezone, so this is usually a single conversion
+    forecasts_by_tz = {}
+    for index, row in cities.iterrows():
         lat, lon = float(row['INTPTLAT']), float(row['INTPTLONG'])
         city_name = row['NAME.1']
-        
+
         # Get timezone
-        tz_name = get_time_zone(lat, lon)
-        
-        # Fetch forecast
-        forecast_data = get_hourly_forecast(grid_id, grid_x, grid_y, tz_name)
-        
-        # Save to MongoDB
-        if 'error' not in forecast_data:
-            save_forecasts_to_mongo(forecast_data, city_name)
-        else:
-            print(f"Error fetching data for {city_name}: {forecast_data['error']}")
+        tz_name = get_time_zone(lat, lon, gridpoint)
+        if series_writer is not None:
+            series_places.append((city_name, gridpoint, tz_name))
+        if storage_mode == "timeseries":
+            continue
+        if tz_name not in forecasts_by_tz:
+            with metrics.stage('structure'):
+                forecasts_by_tz[tz_name] = structure_hourly_forecast(properties, records, tz_name)
+
+        # Save a copy per city to MongoDB
+        save_forecasts_to_mongo(dict(forecasts_by_tz[tz_name]), city_name)
+    metrics.increment('gridpoints', result='fetched')
+    return properties.get('updateTime')
+
+def load_gridpoint_groups(state=sheet_name):
+    """Places of one state sheet grouped by grid cell."""
+    return group_by_gridpoint(split_grid_column(load_places(state, place_columns)))
+
+def store_pending():
+    """Write everything queued so far to MongoDB."""
+    writer.flush()
+    if series_writer is not None:
+        series_writer.flush()
+        save_places(db, series_places)
+        series_places.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch NOAA hourly forecasts for one state sheet and store them in MongoDB.")
+    parser.add_argument("--state", default=sheet_name, help="Places sheet to fetch (ShardedForecasts.py runs several)")
+    parser.add_argument("--storage", choices=STORAGE_MODES, default=storage_mode,
+                        help="Store nested documents per city, time-series rows per gridpoint hour, or both")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    set_storage_mode(args.storage)
+
+    # Fetch each gridpoint once and fan the forecast out to every city in that grid cell
+    gridpoint_groups = load_gridpoint_groups(args.state)
+    with profiled(args.profile, 'hourly_forecast'):
+        for (grid_id, grid_x, grid_y), cities in gridpoint_groups:
+            with metrics.stage('gridpoint'):
+                process_gridpoint(grid_id, grid_x, grid_y, cities)
+
+    report_request_savings(gridpoint_groups)
+    writer.close()
+    if series_writer is not None:
+        series_writer.close()
+        save_places(db, series_places)
+    # Fold the new issuances into the daily summaries read by the charts
+    update_summaries(db, ['Hourlyforecasts'])
+
+    # Remember validators only after everything fetched this run has been stored
+    client.save_validators()
+    timezone_cache.save()
+    export_metrics('hourly_forecast', args)
@@ -0,0 +1,29 @@
+GRID_COLUMNS = ['gridId', 'gridX', 'gridY']
+
+def gridpoint_key(grid_id, grid_x, grid_y):
+    """Identify a NOAA grid cell as 'OKX/33,37'."""
+    return f"{grid_id}/{grid_x},{grid_y}"
+
+def split_grid_column(df, column='gridId/gridX/gridY'):
+    """Split a combined 'OKX/33/37' column into gridId, gridX and gridY, dropping malformed rows."""
+    parts = df[column].astype(str).str.split('/')
+    valid = parts.str.len() == 3
+    parts = parts[valid]
+    return df[valid].assign(gridId=parts.str[0], gridX=parts.str[1], gridY=parts.str[2])
+
+def group_by_gridpoint(data_entries):
+    """Group city rows by NOAA grid cell so each gridpoint is fetched once per run.
+
+    Returns a list of ((gridId, gridX, gridY), rows) pairs in first-seen order.
+    """
+    return list(data_entries.groupby(GRID_COLUMNS, sort=False))
+
+def report_request_savings(groups):
+    """Print how many API requests the gridpoint grouping avoided."""
+    city_count = sum(len(rows) for _, rows in groups)
+    gridpoint_count = len(groups)
+    saved = city_count - gridpoint_count
+    percent = 100 * saved / city_count if city_count else 0
+    print(f"{city_count} cities share {gridpoint_count} gridpoints: "
+          f"{saved} requests saved ({percent:.1f}%)")
+    return saved
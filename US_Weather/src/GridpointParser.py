@@ -0,0 +1,143 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# orjson decodes large /gridpoints payloads several times faster; json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Elements holding an amount per interval; expanding them spreads the amount over the hours
+ACCUMULATED_ELEMENTS = {'quantitativePrecipitation', 'snowfallAmount', 'iceAccumulation'}
+
+# The elements stored by GetQuantitativeForecasts.py
+QUANTITATIVE_ELEMENTS = ['quantitativePrecipitation', 'snowfallAmount', 'iceAccumulation', 'skyCover']
+
+ISO_DURATION = re.compile(r"^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?)?$")
+
+HOUR = np.timedelta64(1, 'h')
+
+def loads(payload):
+    """Decode a JSON response body (bytes or str) with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+def parse_duration(duration):
+    """Seconds in an ISO-8601 duration such as 'PT6H' or 'P1DT12H'."""
+    match = ISO_DURATION.match(duration)
+    if match is None:
+        raise ValueError(f"Unsupported ISO-8601 duration: {duration!r}")
+    days, hours, minutes = (int(part or 0) for part in match.group('days', 'hours', 'minutes'))
+    return ((days * 24 + hours) * 60 + minutes) * 60
+
+def split_valid_times(valid_times):
+    """Split 'start/duration' intervals into datetime64[s] UTC starts and int64 durations in seconds.
+
+    A payload only uses a handful of distinct durations, so each is parsed once.
+    """
+    valid_times = np.asarray(valid_times, dtype=str)
+    if valid_times.size == 0:
+        return np.array([], dtype='datetime64[s]'), np.array([], dtype=np.int64)
+    parts = np.char.partition(valid_times, '/')
+    starts = parts[:, 0]
+    if np.char.endswith(starts, '+00:00').all():
+        # NOAA reports raw data in UTC: NumPy parses the first 19 characters directly
+        starts = starts.astype('U19').astype('datetime64[s]')
+    else:
+        starts = pd.to_datetime(starts, utc=True, format='ISO8601').tz_localize(None).to_numpy('datetime64[s]')
+    durations, inverse = np.unique(parts[:, 2], return_inverse=True)
+    seconds = np.array([parse_duration(duration) for duration in durations], dtype=np.int64)
+    return starts, seconds[inverse.ravel()]
+
+def expand_hourly(start, duration, value, accumulated=False):
+    """Expand intervals onto hourly steps, returning (interval index, times, values) per hour.
+
+    Accumulated amounts are divided evenly across the hours of their interval; other values repeat.
+    """
+    hours = np.maximum(1, -(-duration // 3600))
+    index = np.repeat(np.arange(len(value)), hours)
+    offsets = np.arange(index.size) - np.repeat(np.cumsum(hours) - hours, hours)
+    times = (start.astype('datetime64[h]')[index] + offsets * HOUR).astype('datetime64[s]')
+    values = value[index] / hours[index] if accumulated else value[index]
+    return index, times, values
+
+
+class ElementSeries:
+    """One gridpoint weather element as parallel arrays of interval start, duration and value."""
+
+    __slots__ = ('name', 'uom', 'start', 'duration', 'value')
+
+    def __init__(self, name, uom, start, duration, value):
+        self.name = name
+        self.uom = uom
+        self.start = start
+        self.duration = duration
+        self.value = value
+
+    def __len__(self):
+        return len(self.value)
+
+    @property
+    def end(self):
+        return self.start + self.duration.astype('timedelta64[s]')
+
+    def to_hourly(self, accumulated=None):
+        """Expand the intervals onto a regular hourly grid, returning (times, values) arrays.
+
+        State elements (temperature, sky cover) repeat their value for every hour of the interval;
+        accumulated elements (precipitation, snowfall, ice) divide it evenly across those hours.
+        """
+        if accumulated is None:
+            accumulated = self.name in ACCUMULATED_ELEMENTS
+        _, times, values = expand_hourly(self.start, self.duration, self.value, accumulated)
+        return times, values
+
+
+def parse_element(name, element):
+    """Build an ElementSeries from one element of a /gridpoints response, or None if it is not numeric."""
+    values = element.get('values') if isinstance(element, dict) else None
+    if values is None:
+        return None
+    try:
+        numbers = np.array([value['value'] for value in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        # 'weather' and 'hazards' hold structured values rather than numbers
+        return None
+    start, duration = split_valid_times([value['validTime'] for value in values])
+    return ElementSeries(name, element.get('uom', ''), start, duration, numbers)
+
+def parse_gridpoint(payload, elements=None):
+    """Parse the requested numeric elements of a /gridpoints payload into {name: ElementSeries}.
+
+    `payload` may be the raw response body, the decoded response or its 'properties'.
+    With `elements=None` every numeric element is parsed.
+    """
+    if isinstance(payload, (bytes, str)):
+        payload = loads(payload)
+    properties = payload.get('properties', payload)
+    names = elements if elements is not None else list(properties)
+    parsed = {}
+    for name in names:
+        series = parse_element(name, properties.get(name))
+        if series is not None:
+            parsed[name] = series
+    return parsed
+
+def hourly_frame(series_by_name, accumulated=None):
+    """Align several elements on one hourly UTC index, one column per element.
+
+    The result can be joined directly with hourly forecast frames (see ChartData.py).
+    """
+    columns = {}
+    for name, series in series_by_name.items():
+        times, values = series.to_hourly(accumulated)
+        columns[name] = pd.Series(values, index=pd.DatetimeIndex(times, tz='UTC'))
+    if not columns:
+        return pd.DataFrame()
+    frame = pd.DataFrame(columns)
+    frame.index.name = 'time'
+    return frame
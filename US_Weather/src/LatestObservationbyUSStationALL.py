@@ -1,16 +1,22 @@
-import requests
-import pandas as pd
+import argparse
 import os
-from requests.exceptions import RequestException
+import time
 import logging
 
+from Catalog import load_stations
+from FetchEngine import fetch_all, DEFAULT_MAX_WORKERS, DEFAULT_REQUESTS_PER_SECOND, DEFAULT_TIMEOUT
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from ObservationSink import DEFAULT_CHUNK_SIZE, ObservationSink
+from StationHealth import StationHealth
+
 # Setup basic configuration for logging
 script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where the script is located
 parent_dir = os.path.abspath(os.path.join(script_dir, ".."))  # Move one level up from `src`
 
-# Define dynamic paths for input and output files
-stations_file_path = os.path.join(parent_dir, "Stations", "Stations.xlsx")
-observations_file_path = os.path.join(parent_dir, "Observations", "Observations.xlsx")
+# Define dynamic paths for output files
+observations_file_path = os.path.join(parent_dir, "observations", "Observations.xlsx")
+observations_csv_path = os.path.join(parent_dir, "observations", "Observations.csv")
+checkpoint_file_path = os.path.join(parent_dir, "Cache", "observation_checkpoint.txt")
 
 # Ensure the observations directory exists before saving
 os.makedirs(os.path.dirname(observations_file_path), exist_ok=True)
@@ -21,15 +27,9 @@ os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 logging.basicConfig(filename=log_file_path, level=logging.ERROR, 
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
-# Load the Excel file into a pandas DataFrame
-df = pd.read_excel(stations_file_path)
-
 # Define the base URL for API calls
 base_url = "https://api.weather.gov/stations"
 
-# Create a new DataFrame to store the observations
-observations_data = []
-
 # Function to get value from the property
 def get_property_value(prop, key):
     return prop.get(key, {}).get('value') if key in prop else None
@@ -38,86 +38,144 @@ def get_property_value(prop, key):
 def get_property_unit(prop, key):
     return prop.get(key, {}).get('unitCode') if key in prop else None
 
-# Iterate over each station ID in the DataFrame
-for index, row in df.iterrows():
-    station_id = row['stationIdentifier']
-    observation_url = f"{base_url}/{station_id}/observations/latest"
-
-    try:
-        # Make the API call
-        print(f"Attempting to retrieve data for station ID: {station_id}")
-        response = requests.get(observation_url)
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Parse the JSON data from the response
-            observation = response.json().get('properties', {})
-            
-            # Prepare the data to be added to the observations DataFrame
-            observation_data = {
-                'id': station_id,
-                "type": observation.get('"@type"'),
-                'timestamp': observation.get('timestamp'),
-                'textDescription': observation.get('textDescription'),
-
-                'temperatureUnit': get_property_unit(observation, 'temperature'),
-                'temperatureValue': get_property_value(observation, 'temperature'),
-
-                'dewpointUnit': get_property_unit(observation, 'dewpoint'),
-                'dewpointValue': get_property_value(observation, 'dewpoint'),
-
-                'windDirectionUnit': get_property_unit(observation, 'windDirection'),
-                'windDirectionValue': get_property_value(observation, 'windDirection'),
-
-                'windSpeedUnit': get_property_unit(observation, 'windSpeed'),
-                'windSpeedValue': get_property_value(observation, 'windSpeed'),
-
-                'windGustUnit': get_property_unit(observation, 'windGust'),
-                'windGustValue': get_property_value(observation, 'windGust'),
-
-                'barometricPressureUnit': get_property_unit(observation, 'barometricPressure'),
-                'barometricPressureValue': get_property_value(observation, 'barometricPressure'),
-
-                'seaLevelPressureUnit': get_property_unit(observation, 'seaLevelPressure'),
-                'seaLevelPressureValue': get_property_value(observation, 'seaLevelPressure'),
-
-                'visibilityUnit': get_property_unit(observation, 'visibility'),
-                'visibilityValue': get_property_value(observation, 'visibility'),
-
-                'maxTemperatureLast24HoursUnit': get_property_unit(observation, 'maxTemperatureLast24Hours'),
-                'maxTemperatureLast24HoursValue': get_property_value(observation, 'maxTemperatureLast24Hours'),
-
-                'minTemperatureLast24HoursUnit': get_property_unit(observation, 'minTemperatureLast24Hours'),
-                'minTemperatureLast24HoursValue': get_property_value(observation, 'minTemperatureLast24Hours'),
-
-                'precipitationLast3HoursUnit': get_property_unit(observation, 'precipitationLast3Hours'),
-                'precipitationLast3HoursValue': get_property_value(observation, 'precipitationLast3Hours'),
-
-                'relativeHumidityUnit': get_property_unit(observation, 'relativeHumidity'),
-                'relativeHumidityValue': get_property_value(observation, 'relativeHumidity'),
-
-                'windChillUnit': get_property_unit(observation, 'windChill'),
-                'windChillValue': get_property_value(observation, 'windChill'),
-
-                'heatIndexUnit': get_property_unit(observation, 'heatIndex'),
-                'heatIndexValue': get_property_value(observation, 'heatIndex'),
-            }
-            
-            # Add the observation data to the list
-            observations_data.append(observation_data)
+def get_observation_url(station_id, base_url=base_url):
+    """Build the latest-observation URL for a station."""
+    return f"{base_url}/{station_id}/observations/latest"
+
+def parse_observation(station_id, observation):
+    """Flatten the observation properties into a single row."""
+    observation_data = {
+        'id': station_id,
+        "type": observation.get('"@type"'),
+        'timestamp': observation.get('timestamp'),
+        'textDescription': observation.get('textDescription'),
+
+        'temperatureUnit': get_property_unit(observation, 'temperature'),
+        'temperatureValue': get_property_value(observation, 'temperature'),
+
+        'dewpointUnit': get_property_unit(observation, 'dewpoint'),
+        'dewpointValue': get_property_value(observation, 'dewpoint'),
+
+        'windDirectionUnit': get_property_unit(observation, 'windDirection'),
+        'windDirectionValue': get_property_value(observation, 'windDirection'),
+
+        'windSpeedUnit': get_property_unit(observation, 'windSpeed'),
+        'windSpeedValue': get_property_value(observation, 'windSpeed'),
+
+        'windGustUnit': get_property_unit(observation, 'windGust'),
+        'windGustValue': get_property_value(observation, 'windGust'),
+
+        'barometricPressureUnit': get_property_unit(observation, 'barometricPressure'),
+        'barometricPressureValue': get_property_value(observation, 'barometricPressure'),
+
+        'seaLevelPressureUnit': get_property_unit(observation, 'seaLevelPressure'),
+        'seaLevelPressureValue': get_property_value(observation, 'seaLevelPressure'),
+
+        'visibilityUnit': get_property_unit(observation, 'visibility'),
+        'visibilityValue': get_property_value(observation, 'visibility'),
+
+        'maxTemperatureLast24HoursUnit': get_property_unit(observation, 'maxTemperatureLast24Hours'),
+        'maxTemperatureLast24HoursValue': get_property_value(observation, 'maxTemperatureLast24Hours'),
+
+        'minTemperatureLast24HoursUnit': get_property_unit(observation, 'minTemperatureLast24Hours'),
+        'minTemperatureLast24HoursValue': get_property_value(observation, 'minTemperatureLast24Hours'),
+
+        'precipitationLast3HoursUnit': get_property_unit(observation, 'precipitationLast3Hours'),
+        'precipitationLast3HoursValue': get_property_value(observation, 'precipitationLast3Hours'),
+
+        'relativeHumidityUnit': get_property_unit(observation, 'relativeHumidity'),
+        'relativeHumidityValue': get_property_value(observation, 'relativeHumidity'),
+
+        'windChillUnit': get_property_unit(observation, 'windChill'),
+        'windChillValue': get_property_value(observation, 'windChill'),
+
+        'heatIndexUnit': get_property_unit(observation, 'heatIndex'),
+        'heatIndexValue': get_property_value(observation, 'heatIndex'),
+    }
+    return observation_data
+
+def iter_observations(station_ids, max_workers=DEFAULT_MAX_WORKERS,
+                      requests_per_second=DEFAULT_REQUESTS_PER_SECOND, timeout=DEFAULT_TIMEOUT,
+                      base_url=base_url, client=None, health=None):
+    """Fetch the latest observation of every station concurrently.
+
+    Yields (station_id, row) as each request completes; row is None when the station failed.
+    Outcomes are recorded in `health` (a StationHealth) when one is given.
+    """
+    urls = ((station_id, get_observation_url(station_id, base_url)) for station_id in station_ids)
+    # Every sweep writes a complete snapshot, so always request the full payload
+    results = fetch_all(urls, max_workers, requests_per_second, timeout, client=client, conditional=False)
+    metrics = get_metrics()
+    for station_id, response, error in results:
+        if error is not None:
+            print(f"RequestException occurred for station ID: {station_id}, Error: {error}")
+            logging.error(f"RequestException occurred for station ID: {station_id}, Error: {error}")
+            if health is not None:
+                health.record_failure(station_id, type(error).__name__)
+            metrics.increment('stations', result='error')
+            yield station_id, None
+        elif response.status_code == 200:
+            with metrics.stage('json_parse'):
+                observation = response.json().get('properties', {})
             print(f"Successfully retrieved data for station ID: {station_id}")
+            if health is not None:
+                health.record_success(station_id)
+            metrics.increment('stations', result='fetched')
+            yield station_id, parse_observation(station_id, observation)
         else:
             print(f"Failed to retrieve data for station ID: {station_id}, Status Code: {response.status_code}")
             logging.error(f"Failed to retrieve data for station ID: {station_id}, Status Code: {response.status_code}")
-
-    except RequestException as e:
-        print(f"RequestException occurred for station ID: {station_id}, Error: {e}")
-        logging.error(f"RequestException occurred for station ID: {station_id}, Error: {e}")
-
-# Convert the observations data into a DataFrame
-observations_df = pd.DataFrame(observations_data)
-
-# Save the observations DataFrame to a new Excel file
-observations_df.to_excel(observations_file_path, index=False)
-
-print(f"All observations have been retrieved and saved to {observations_file_path}")
+            if health is not None:
+                health.record_failure(station_id, response.status_code, response.elapsed.total_seconds())
+            metrics.increment('stations', result='error')
+            yield station_id, None
+
+def select_stations(station_ids, completed, health, retry_dead=False):
+    """Stations this sweep requests: not yet done in an interrupted sweep and, unless `retry_dead`, not in back-off."""
+    remaining = [station_id for station_id in station_ids if station_id not in completed]
+    # Stations that keep returning 404 are only retried on an exponential schedule
+    if not retry_dead:
+        remaining = health.filter_stations(remaining)
+    return remaining
+
+def fetch_observations(station_ids, *args, **kwargs):
+    """Fetch the latest observation of every station concurrently and return the parsed rows."""
+    return [row for station_id, row in iter_observations(station_ids, *args, **kwargs) if row is not None]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the latest observation for every station.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Maximum concurrent requests")
+    parser.add_argument("--rate", type=float, default=DEFAULT_REQUESTS_PER_SECOND, help="Maximum requests per second per host")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout per request in seconds")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Stations per CSV append and checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted sweep")
+    parser.add_argument("--retry-dead", action="store_true", help="Also request stations inside their 404 back-off window")
+    parser.add_argument("--skip-excel", action="store_true", help="Only write the CSV, skip the Excel export")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # Load the station list from the catalog (falls back to the Stations workbook)
+    df = load_stations(['stationIdentifier'])
+
+    # Stream rows to CSV in chunks; an interrupted sweep resumes after the last checkpointed chunk
+    sink = ObservationSink(observations_csv_path, checkpoint_file_path, args.chunk_size, resume=not args.restart)
+    health = StationHealth()
+    remaining = select_stations(df['stationIdentifier'], sink.completed, health, args.retry_dead)
+
+    started = time.perf_counter()
+    with profiled(args.profile, 'observations'):
+        for station_id, row in iter_observations(remaining, args.workers, args.rate, args.timeout, health=health):
+            sink.add(station_id, row)
+    sink.finish()
+    health.save()
+    health.report()
+    elapsed = time.perf_counter() - started
+    print(f"Retrieved {sink.written} observations for {len(remaining)} stations in {elapsed:.1f}s "
+          f"({len(remaining) / max(elapsed, 1e-9):.1f} stations/s)")
+
+    # Optional last step: the Excel workbook used downstream
+    if not args.skip_excel:
+        sink.export_excel(observations_file_path)
+
+    print(f"All observations have been retrieved and saved to {observations_csv_path}")
+    export_metrics('observations', args)
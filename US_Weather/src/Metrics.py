@@ -0,0 +1,213 @@
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Per-run instrumentation: stage timings as histograms plus counters, exported as a JSON line
+# in Logs/metrics.jsonl and optionally as a Prometheus textfile (node_exporter textfile collector).
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+metrics_log_file_path = os.path.join(parent_dir, "Logs", "metrics.jsonl")
+profile_dir = os.path.join(parent_dir, "Logs", "profiles")
+
+# Histogram bucket upper bounds in seconds, from a cached lookup up to a slow NOAA response
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, in the Prometheus layout."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with '+Inf'."""
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def merge(self, other):
+        """Add another histogram's observations (same buckets) to this one."""
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': round(self.sum, 6), 'max': round(self.max, 6),
+                'buckets': {str(bound): count for bound, count in self.cumulative()}}
+
+
+class Metrics:
+    """Thread-safe stage timings and labelled counters for one process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one observation of stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        """Add to counter `name`, e.g. increment('http_requests', status=200)."""
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def drain(self):
+        """Take the stages and counters recorded so far and start over, e.g. to ship them from a worker."""
+        with self.lock:
+            stages, counters = self.stages, self.counters
+            self.stages, self.counters = {}, {}
+        return stages, counters
+
+    def merge(self, stages, counters):
+        """Fold in stages and counters drained from another process."""
+        with self.lock:
+            for name, histogram in stages.items():
+                if name in self.stages:
+                    self.stages[name].merge(histogram)
+                else:
+                    self.stages[name] = histogram
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self, job):
+        """The run's metrics as one JSON-serializable record."""
+        with self.lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ','.join(f"{label}={value_}" for label, value_ in labels)
+                counters[f"{name}{{{label_text}}}" if labels else name] = value
+            return {
+                'time': datetime.now(timezone.utc).isoformat(),
+                'job': job,
+                'wallSeconds': round(time.perf_counter() - self.started, 6),
+                'stages': {name: histogram.to_dict() for name, histogram in sorted(self.stages.items())},
+                'counters': counters,
+            }
+
+    def write_json(self, job, path=metrics_log_file_path):
+        """Append the run's snapshot as one line of the structured metrics log."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.snapshot(job)) + "\n")
+
+    def write_prometheus(self, job, path):
+        """Write a Prometheus textfile; replaced atomically so the collector never reads half a file."""
+        lines = []
+        with self.lock:
+            if self.stages:
+                lines.append("# TYPE weatherdata_stage_seconds histogram")
+            for name, histogram in sorted(self.stages.items()):
+                labels = f'job="{job}",stage="{name}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'weatherdata_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"weatherdata_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"weatherdata_stage_seconds_count{{{labels}}} {histogram.count}")
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE weatherdata_{name}_total counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        label_text = ''.join(f',{label}="{value_}"' for label, value_ in labels)
+                        lines.append(f'weatherdata_{name}_total{{job="{job}"{label_text}}} {value}')
+        lines.append("# TYPE weatherdata_last_run_timestamp_seconds gauge")
+        lines.append(f'weatherdata_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def report(self):
+        """Print where the run's time went, slowest stage first."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1].sum, reverse=True)
+        for name, histogram in stages:
+            mean = histogram.sum / histogram.count if histogram.count else 0
+            print(f"  {name:<24} {histogram.sum:>8.2f}s total  {histogram.count:>7} calls  "
+                  f"{mean * 1000:>8.2f} ms mean  {histogram.max * 1000:>8.1f} ms max")
+
+
+_metrics = Metrics()
+
+def get_metrics():
+    """Return the process-wide Metrics."""
+    return _metrics
+
+def counter_total(counters, name, **labels):
+    """Sum of counter `name` over the entries of `counters` (as from drain()) matching `labels`."""
+    wanted = {(label, str(value)) for label, value in labels.items()}
+    return sum(value for (counter, counter_labels), value in counters.items()
+               if counter == name and wanted <= set(counter_labels))
+
+@contextmanager
+def profiled(enabled, job):
+    """Run the enclosed block under cProfile when `enabled`, dumping stats to Logs/profiles/<job>.prof."""
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{job}.prof")
+        profiler.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(20)
+        print(output.getvalue())
+        print(f"Profile written to {path} (open with `python -m pstats` or snakeviz)")
+
+def add_metrics_arguments(parser):
+    """The --profile and metrics export options shared by the pipeline scripts."""
+    parser.add_argument("--profile", action="store_true", help="Run the main loop under cProfile")
+    parser.add_argument("--metrics-log", default=metrics_log_file_path, help="Append run metrics to this JSON lines file")
+    parser.add_argument("--prometheus-textfile", help="Also write metrics to this Prometheus textfile")
+
+def export_metrics(job, args):
+    """Print the stage report and write the metrics selected on the command line."""
+    metrics = get_metrics()
+    print(f"Stage timings for {job}:")
+    metrics.report()
+    if args.metrics_log:
+        metrics.write_json(job, args.metrics_log)
+    if args.prometheus_textfile:
+        metrics.write_prometheus(job, args.prometheus_textfile)
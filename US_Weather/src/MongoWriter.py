@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+from Metrics import get_metrics
+
+# MONGO_URI and MONGO_DATABASE in the environment override these; 'mongomock://' keeps everything in memory
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.environ.get('MONGO_DATABASE', 'weather_database')
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+# A forecast document is identified by the place it was stored for and NOAA's issuance time
+FORECAST_KEYS = ('city', 'updateTime')
+
+# An observation is identified by its station and observation time
+OBSERVATION_KEYS = ('id', 'timestamp')
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_database(uri=MONGO_URI, name=DATABASE_NAME):
+    """Return the weather database on a MongoClient shared by the whole process."""
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = _clients[uri] = connect(uri)
+    return client[name]
+
+def connect(uri):
+    """A MongoClient for `uri`, or an in-memory mongomock client for 'mongomock://' (offline replays)."""
+    if uri.startswith('mongomock://'):
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(uri)
+
+def ensure_indexes(collection, keys=FORECAST_KEYS):
+    """Create the unique compound index that backs upserts and city lookups.
+
+    The index is also used by `find({"city": {"$in": cities}})` since city is its prefix.
+    Collections that already contain duplicates get a non-unique index instead.
+    """
+    index_keys = [(key, ASCENDING) for key in keys]
+    try:
+        collection.create_index(index_keys, unique=True, name='_'.join(keys) + '_unique')
+    except OperationFailure as e:
+        logging.error(f"Unique index on {collection.name} {keys} failed, duplicates exist: {e}")
+        print(f"Duplicates found in {collection.name}; creating a non-unique index on {keys}")
+        collection.create_index(index_keys, name='_'.join(keys))
+
+
+class MongoWriter:
+    """Buffer documents and write them with unordered bulk inserts.
+
+    The buffer is flushed when it reaches `batch_size` documents, when `flush_interval`
+    seconds have passed since the last flush, and on close(). With `upsert_keys` the
+    writer inserts a document only if none with the same key values exists yet, so
+    rerunning a script on an unchanged forecast writes nothing.
+    """
+
+    def __init__(self, collection, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 upsert_keys=None):
+        self.collection = collection
+        self.upsert_keys = upsert_keys
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.stats = {"documents": 0, "unchanged": 0, "batches": 0, "errors": 0, "write_seconds": 0.0}
+
+    def add(self, document):
+        """Queue a document, flushing if a size or time threshold has been reached."""
+        with self.lock:
+            self.buffer.append(document)
+            due = (len(self.buffer) >= self.batch_size
+                   or time.monotonic() - self.last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered documents in a single unordered insert_many.
+
+        If the write fails outright the documents go back into the buffer before the error is raised.
+        """
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            self.last_flush = time.monotonic()
+        if not batch:
+            return 0
+
+        started = time.perf_counter()
+        written = len(batch)
+        failed = 0
+        try:
+            if self.upsert_keys:
+                result = self.collection.bulk_write(self.upsert_requests(batch), ordered=False)
+                written = result.upserted_count
+            else:
+                self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered writes keep going past failed documents; count what did land
+            written = e.details.get('nInserted', 0) + e.details.get('nUpserted', 0)
+            failed = len(e.details.get('writeErrors', []))
+            logging.error(f"Bulk write into {self.collection.name} failed for {failed} documents")
+        except PyMongoError:
+            # Nothing is known to have landed (server unreachable, network timeout): requeue the batch
+            # ahead of anything added since, so a later flush or close() sends it again
+            with self.lock:
+                self.buffer[:0] = batch
+            raise
+
+        with self.lock:
+            self.stats["documents"] += written
+            self.stats["errors"] += failed
+            if self.upsert_keys:
+                self.stats["unchanged"] += len(batch) - written - failed
+            self.stats["batches"] += 1
+            self.stats["write_seconds"] += time.perf_counter() - started
+        metrics = get_metrics()
+        metrics.observe("mongo_write", time.perf_counter() - started)
+        metrics.increment("documents_written", written, collection=self.collection.name)
+        if failed:
+            metrics.increment("documents_failed", failed, collection=self.collection.name)
+        return written
+
+    def upsert_requests(self, batch):
+        """Build one insert-if-absent operation per document, matched on the upsert keys."""
+        return [UpdateOne({key: document.get(key) for key in self.upsert_keys},
+                          {'$setOnInsert': document}, upsert=True)
+                for document in batch]
+
+    def close(self):
+        """Flush what is left and print the write throughput."""
+        self.flush()
+        seconds = self.stats["write_seconds"]
+        rate = self.stats["documents"] / seconds if seconds else 0
+        print(f"Wrote {self.stats['documents']} documents to {self.collection.name} in "
+              f"{self.stats['batches']} batches ({rate:.0f} docs/s)")
+        if self.upsert_keys:
+            print(f"Skipped {self.stats['unchanged']} documents already stored for the same {self.upsert_keys}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, RequestException, Timeout
+
+from Metrics import get_metrics
+from Resilience import (RETRY_STATUS_CODES, CircuitBreaker, CircuitOpenError, RetryPolicy, office_from_url,
+                        parse_retry_after)
+
+# Prefix of every NOAA URL the scripts build; a client with an api_url sends those requests there instead
+API_URL = "https://api.weather.gov"
+
+# api.weather.gov rejects requests without an identifying User-Agent
+USER_AGENT = "(WeatherData, weatherdata@example.com)"
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 15
+
+# Validators (ETag/Last-Modified) persist between runs so scheduled jobs can send conditional requests
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+validators_file_path = os.path.join(parent_dir, "Cache", "http_validators.json")
+
+
+class NoaaClient:
+    """Shared HTTP client for api.weather.gov with pooled keep-alive connections and conditional GETs.
+
+    Transient failures (timeouts, connection errors, 429 and 5xx) are retried with jittered
+    back-off honoring Retry-After, and /gridpoints requests go through a per-office circuit breaker.
+    `api_url` serves NOAA URLs from another server such as the replay stub (validators, circuits and
+    recorded fixtures stay keyed on the NOAA URL), and `recorder` is handed every 200 response
+    (requests are sent unconditionally while recording, so every URL is recorded).
+    """
+
+    def __init__(self, validators_path=validators_file_path, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 retry_policy=None, breaker=None, rate_limiter=None, api_url=None, recorder=None):
+        self.validators_path = validators_path
+        self.timeout = timeout
+        # Optional limiter with an acquire() method, called before every attempt including retries
+        self.rate_limiter = rate_limiter
+        self.api_url = api_url.rstrip("/") if api_url else None
+        # Optional recorder with a record(url, response) method (see Replay.py)
+        self.recorder = recorder
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept": "application/geo+json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+        self.lock = threading.Lock()
+        # Conditional headers come from the previous run only, so a URL fetched twice in one run
+        # (e.g. two cities in the same grid cell) is never answered with 304 the second time
+        self.previous_validators = self.load_validators()
+        self.validators = dict(self.previous_validators)
+        self.stats = {"requests": 0, "not_modified": 0, "bytes": 0, "retries": 0, "circuit_rejections": 0}
+        self.metrics = get_metrics()
+
+    def load_validators(self):
+        """Load the per-URL validators saved by the previous run."""
+        if self.validators_path and os.path.exists(self.validators_path):
+            with open(self.validators_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def save_validators(self):
+        """Persist validators; call once the run has stored everything it fetched.
+
+        Saved validators also become the ones sent from then on, so a long-running process
+        gets 304s for payloads it has already stored.
+        """
+        with self.lock:
+            snapshot = dict(self.validators)
+            self.previous_validators = snapshot
+        if not self.validators_path:
+            return
+        os.makedirs(os.path.dirname(self.validators_path), exist_ok=True)
+        tmp_path = self.validators_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.validators_path)
+
+    def new_validators(self):
+        """Validators learned this run that differ from the ones loaded at startup."""
+        with self.lock:
+            return {url: validator for url, validator in self.validators.items()
+                    if self.previous_validators.get(url) != validator}
+
+    def merge_validators(self, validators):
+        """Adopt validators learned by another process (see ShardedForecasts.py); saved with the rest."""
+        with self.lock:
+            self.validators.update(validators)
+
+    def route(self, url):
+        """The URL actually requested: NOAA URLs go to `api_url` when one is set."""
+        if self.api_url and url.startswith(API_URL):
+            return self.api_url + url[len(API_URL):]
+        return url
+
+    def get(self, url, conditional=True, timeout=None):
+        """GET a URL, sending If-None-Match/If-Modified-Since when a validator is known.
+
+        A 304 response means the payload is unchanged since the last stored run and
+        should not be parsed or saved again. Raises CircuitOpenError (a RequestException)
+        without touching the network while the URL's forecast office is failing.
+        """
+        headers = {}
+        # A recorder needs every body, so it never lets the server answer 304
+        if conditional and self.recorder is None:
+            validator = self.previous_validators.get(url)
+            if validator:
+                if validator.get("etag"):
+                    headers["If-None-Match"] = validator["etag"]
+                if validator.get("last_modified"):
+                    headers["If-Modified-Since"] = validator["last_modified"]
+
+        office = office_from_url(url)
+        if office and not self.breaker.allow(office):
+            with self.lock:
+                self.stats["circuit_rejections"] += 1
+            self.metrics.increment("circuit_rejections", office=office)
+            raise CircuitOpenError(f"Circuit open for office {office}, skipping {url}")
+
+        with self.metrics.stage("http_request"):
+            try:
+                response = self.request_with_retries(url, headers, timeout or self.timeout, office)
+            except RequestException as e:
+                self.metrics.increment("http_errors", error=type(e).__name__)
+                raise
+
+        size = int(response.headers.get("Content-Length", len(response.content)))
+        self.metrics.increment("http_requests", status=response.status_code)
+        self.metrics.increment("http_bytes", size)
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes"] += size
+            if response.status_code == 304:
+                self.stats["not_modified"] += 1
+            elif response.status_code == 200 and conditional:
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                if etag or last_modified:
+                    self.validators[url] = {"etag": etag, "last_modified": last_modified}
+        if self.recorder is not None and response.status_code == 200:
+            self.recorder.record(url, response)
+        return response
+
+    def request_with_retries(self, url, headers, timeout, office):
+        """Send the GET, retrying transient failures and reporting the outcome to the breaker."""
+        policy = self.retry_policy
+        for attempt in range(policy.max_attempts):
+            last_attempt = attempt == policy.max_attempts - 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(self.route(url), headers=headers, timeout=timeout)
+            except (ConnectionError, Timeout):
+                if office:
+                    self.breaker.record_failure(office)
+                if last_attempt:
+                    raise
+                delay = policy.delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if office:
+                        self.breaker.record_success(office)
+                    return response
+                if office:
+                    self.breaker.record_failure(office)
+                if last_attempt:
+                    return response
+                delay = policy.delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+
+            with self.lock:
+                self.stats["retries"] += 1
+            self.metrics.increment("http_retries")
+            if office and not self.breaker.allow(office):
+                raise CircuitOpenError(f"Circuit opened for office {office} while retrying {url}")
+            time.sleep(delay)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide NoaaClient, creating it on first use.
+
+    NOAA_API_URL in the environment points it at another server (e.g. `Replay.py serve`), and
+    NOAA_RECORD_DIR saves every response it receives there as a replay fixture.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            recorder = None
+            if os.environ.get("NOAA_RECORD_DIR"):
+                from Replay import FixtureRecorder
+                recorder = FixtureRecorder(os.environ["NOAA_RECORD_DIR"])
+            _client = NoaaClient(api_url=os.environ.get("NOAA_API_URL"), recorder=recorder)
+        return _client
@@ -0,0 +1,88 @@
+import csv
+import os
+
+import pandas as pd
+
+from Metrics import get_metrics
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+class ObservationSink:
+    """Stream observation rows to CSV in chunks and checkpoint which stations are done.
+
+    Rows are appended every `chunk_size` stations, then the station IDs of that chunk are
+    appended to the checkpoint file. If a sweep is interrupted, the next sweep reopens both
+    files and skips the stations already recorded; a sweep that finishes removes the
+    checkpoint so the following sweep starts a fresh file.
+    """
+
+    def __init__(self, path, checkpoint_path, chunk_size=DEFAULT_CHUNK_SIZE, resume=True):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.pending_stations = []
+        self.completed = set()
+        self.columns = None
+        self.written = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                self.completed = {line.strip() for line in f if line.strip()}
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8', newline='') as f:
+                    self.columns = next(csv.reader(f), None)
+            print(f"Resuming sweep: {len(self.completed)} stations already done")
+        else:
+            # Fresh sweep: start both files empty
+            for stale_path in (path, checkpoint_path):
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+
+    def add(self, station_id, row=None):
+        """Record a finished station, with its observation row if one was retrieved."""
+        if row is not None:
+            self.rows.append(row)
+        self.pending_stations.append(station_id)
+        if len(self.pending_stations) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Append buffered rows to the CSV, then checkpoint their stations."""
+        if self.rows:
+            if self.columns is None:
+                self.columns = list(self.rows[0].keys())
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with get_metrics().stage('csv_write'), open(self.path, 'a', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.columns, extrasaction='ignore')
+                if write_header:
+                    writer.writeheader()
+                writer.writerows(self.rows)
+            self.written += len(self.rows)
+            get_metrics().increment('rows_written', len(self.rows), sink='csv')
+        if self.pending_stations:
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(f"{station_id}\n" for station_id in self.pending_stations))
+            self.completed.update(self.pending_stations)
+        self.rows = []
+        self.pending_stations = []
+
+    def finish(self):
+        """Flush the last chunk and mark the sweep complete."""
+        self.flush()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def export_excel(self, excel_path):
+        """Optional last step: convert the streamed CSV into the Excel workbook used downstream."""
+        if not os.path.exists(self.path):
+            print("No observations to export")
+            return
+        # A crash between the CSV append and the checkpoint can repeat a station; keep its last row
+        with get_metrics().stage('excel_export'):
+            df = pd.read_csv(self.path).drop_duplicates('id', keep='last')
+            df.to_excel(excel_path, index=False)
+        print(f"Exported {len(df)} observations to {excel_path}")
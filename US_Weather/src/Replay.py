@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+from urllib.parse import unquote, urlparse
+
+import pandas as pd
+
+from GridpointParser import loads
+from StubServer import (StubHandler, StubServer, sample_daily_forecast, sample_gridpoint, sample_hourly_forecast,
+                        sample_observation)
+
+# orjson is optional, as in GridpointParser.py
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Record real NOAA responses as fixtures and serve them back offline.
+# A fixture is the response body of one URL path, stored under the fixtures directory as that
+# path plus '.json' (/gridpoints/OKX/33,37/forecast -> gridpoints/OKX/33,37/forecast.json).
+# Any script records when run with NOAA_RECORD_DIR set, and replays with NOAA_API_URL pointing
+# at `Replay.py serve`; paths without a fixture get a 404, or a synthetic sample with --synthesize.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+fixtures_dir_path = os.path.join(parent_dir, "Fixtures")
+
+# Where synthetic places and stations are put when a fixture has no geometry (New York City)
+DEFAULT_LOCATION = (40.71, -74.01)
+
+def fixture_path(fixtures_dir, url_path):
+    """File holding the fixture for a URL path, or None for an empty path."""
+    parts = [part for part in unquote(url_path).split('/') if part not in ('', '.', '..')]
+    if not parts:
+        return None
+    return os.path.join(fixtures_dir, *parts[:-1], parts[-1] + '.json')
+
+def dumps(payload):
+    """Encode a payload as a JSON response body."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+def write_fixture(path, body):
+    """Write a fixture atomically, so a replay never serves a half-written body."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+
+class FixtureRecorder:
+    """Save the body of every response a NoaaClient receives as a fixture (see NoaaClient.get_client)."""
+
+    def __init__(self, fixtures_dir=fixtures_dir_path):
+        self.fixtures_dir = fixtures_dir
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def record(self, url, response):
+        path = fixture_path(self.fixtures_dir, urlparse(url).path)
+        if path is None:
+            return
+        write_fixture(path, response.content)
+        with self.lock:
+            self.count += 1
+
+
+class ReplayHandler(StubHandler):
+    """Serve fixtures, with the latency and fault injection of StubHandler."""
+
+    def respond(self):
+        server = self.server
+        path = fixture_path(server.fixtures_dir, urlparse(self.path).path)
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+            with server.lock:
+                server.replayed_count += 1
+            self.send_body(200, body)
+            return
+        with server.lock:
+            server.missing_count += 1
+        if server.synthesize:
+            super().respond()
+        else:
+            self.send_json(404, {"title": "Not Found", "detail": f"No fixture for {self.path}"})
+
+
+class ReplayServer(StubServer):
+    """Local NOAA stand-in serving the fixtures in `fixtures_dir`; see StubServer for the fault options."""
+
+    def __init__(self, fixtures_dir=fixtures_dir_path, latency=0.0, synthesize=False, **kwargs):
+        super().__init__(latency=latency, handler=ReplayHandler, **kwargs)
+        self.fixtures_dir = fixtures_dir
+        self.synthesize = synthesize
+        self.replayed_count = 0
+        self.missing_count = 0
+
+def synthesize_fixtures(fixtures_dir, gridpoints, stations):
+    """Write StubServer samples as fixtures for `gridpoints` ((gridId, gridX, gridY) tuples) and `stations`."""
+    for grid_id, grid_x, grid_y in gridpoints:
+        base = f"/gridpoints/{grid_id}/{grid_x},{grid_y}"
+        write_fixture(fixture_path(fixtures_dir, base), dumps(sample_gridpoint(grid_id, grid_x, grid_y)))
+        write_fixture(fixture_path(fixtures_dir, base + "/forecast"),
+                      dumps(sample_daily_forecast(grid_id, grid_x, grid_y)))
+        write_fixture(fixture_path(fixtures_dir, base + "/forecast/hourly"),
+                      dumps(sample_hourly_forecast(grid_id, grid_x, grid_y)))
+    for station_id in stations:
+        write_fixture(fixture_path(fixtures_dir, f"/stations/{station_id}/observations/latest"),
+                      dumps(sample_observation(station_id)))
+
+def fixture_location(path, rng):
+    """(lat, lon) of a fixture's geometry (a point, or the middle of a forecast polygon), else near DEFAULT_LOCATION."""
+    if path is not None and os.path.exists(path):
+        with open(path, 'rb') as f:
+            geometry = loads(f.read()).get('geometry') or {}
+        coordinates = geometry.get('coordinates')
+        if geometry.get('type') == 'Point' and coordinates:
+            return coordinates[1], coordinates[0]
+        if geometry.get('type') == 'Polygon' and coordinates:
+            ring = coordinates[0]
+            return sum(point[1] for point in ring) / len(ring), sum(point[0] for point in ring) / len(ring)
+    return DEFAULT_LOCATION[0] + rng.uniform(-0.2, 0.2), DEFAULT_LOCATION[1] + rng.uniform(-0.2, 0.2)
+
+def fixture_catalog(fixtures_dir, state, places_per_cell=3, seed=0):
+    """Places and stations tables covering every gridpoint and station in a fixtures directory.
+
+    Each grid cell gets `places_per_cell` places in the sheet `state`, so the ingest scripts
+    fan each fixture out to several cities as they would with the real catalog.
+    """
+    rng = random.Random(seed)
+    cells = set()
+    gridpoints_dir = os.path.join(fixtures_dir, 'gridpoints')
+    for grid_id in sorted(os.listdir(gridpoints_dir)) if os.path.isdir(gridpoints_dir) else []:
+        for name in os.listdir(os.path.join(gridpoints_dir, grid_id)):
+            cell = name[:-len('.json')] if name.endswith('.json') else name
+            grid_x, _, grid_y = cell.partition(',')
+            if grid_x.isdigit() and grid_y.isdigit():
+                cells.add((grid_id, int(grid_x), int(grid_y)))
+    places = []
+    for grid_id, grid_x, grid_y in sorted(cells):
+        forecast = fixture_path(fixtures_dir, f"/gridpoints/{grid_id}/{grid_x},{grid_y}/forecast/hourly")
+        lat, lon = fixture_location(forecast, rng)
+        for index in range(places_per_cell):
+            places.append({'state': state, 'NAME.1': f"{grid_id} {grid_x},{grid_y} place {index + 1}",
+                           'INTPTLAT': lat + index * 0.001, 'INTPTLONG': lon,
+                           'gridId/gridX/gridY': f"{grid_id}/{grid_x}/{grid_y}",
+                           'gridId': grid_id, 'gridX': grid_x, 'gridY': grid_y})
+
+    stations = []
+    stations_dir = os.path.join(fixtures_dir, 'stations')
+    for station_id in sorted(os.listdir(stations_dir)) if os.path.isdir(stations_dir) else []:
+        observation = fixture_path(fixtures_dir, f"/stations/{station_id}/observations/latest")
+        if os.path.exists(observation):
+            lat, lon = fixture_location(observation, rng)
+            stations.append({'stationIdentifier': station_id, 'state': state, 'latitude': lat, 'longitude': lon})
+    return (pd.DataFrame(places, columns=['state', 'NAME.1', 'INTPTLAT', 'INTPTLONG', 'gridId/gridX/gridY',
+                                          'gridId', 'gridX', 'gridY']),
+            pd.DataFrame(stations, columns=['stationIdentifier', 'state', 'latitude', 'longitude']))
+
+def add_server_arguments(parser):
+    """Latency and fault options of the replay server, shared with BenchmarkSuite.py."""
+    parser.add_argument("--fixtures", default=fixtures_dir_path, help="Fixtures directory")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Fraction of requests answered with --fault-status")
+    parser.add_argument("--fault-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with injected faults")
+    parser.add_argument("--synthesize", action="store_true", help="Answer paths without a fixture with a synthetic sample")
+
+def server_from_arguments(args, port=0):
+    return ReplayServer(args.fixtures, latency=args.latency, synthesize=args.synthesize, fault_rate=args.fault_rate,
+                        fault_status=args.fault_status, retry_after=args.retry_after, port=port)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record NOAA responses as fixtures and replay them from a local server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Run a script against api.weather.gov, saving every response")
+    record.add_argument("--fixtures", default=fixtures_dir_path, help="Fixtures directory")
+    record.add_argument("script", help="Script to run, e.g. GetRequestHourlyForecast.py")
+    record.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments for the script")
+    serve = commands.add_parser("serve", help="Serve the fixtures until interrupted")
+    add_server_arguments(serve)
+    serve.add_argument("--port", type=int, default=8080)
+    synthesize = commands.add_parser("synthesize", help="Write synthetic fixtures for offline runs")
+    synthesize.add_argument("--fixtures", default=fixtures_dir_path, help="Fixtures directory")
+    synthesize.add_argument("--gridpoints", type=int, default=20)
+    synthesize.add_argument("--stations", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        env = dict(os.environ, NOAA_RECORD_DIR=os.path.abspath(args.fixtures))
+        sys.exit(subprocess.call([sys.executable, args.script] + args.script_args, env=env, cwd=script_dir))
+    elif args.command == "synthesize":
+        synthesize_fixtures(args.fixtures, [('OKX', 30 + i % 10, 30 + i // 10) for i in range(args.gridpoints)],
+                            [f"K{i:03d}" for i in range(args.stations)])
+        print(f"Wrote fixtures for {args.gridpoints} gridpoints and {args.stations} stations to {args.fixtures}")
+    else:
+        server = server_from_arguments(args, args.port)
+        with server:
+            print(f"Replaying {args.fixtures} at {server.base_url}; run scripts with NOAA_API_URL={server.base_url}")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        print(f"{server.request_count} requests: {server.replayed_count} replayed, {server.missing_count} without "
+              f"a fixture, {server.fault_count} faults injected")
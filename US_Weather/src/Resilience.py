@@ -0,0 +1,94 @@
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.exceptions import RequestException
+
+# Statuses NOAA returns under load; anything else (e.g. 404) is final
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+GRIDPOINT_OFFICE = re.compile(r"/gridpoints/(?P<office>[A-Za-z]+)/")
+
+
+class CircuitOpenError(RequestException):
+    """Raised instead of calling an office whose circuit breaker is open."""
+
+
+def office_from_url(url):
+    """Return the forecast office (gridId) of a /gridpoints URL, or None for other endpoints."""
+    match = GRIDPOINT_OFFICE.search(url)
+    return match.group("office").upper() if match else None
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Jittered exponential back-off ("full jitter"), overridden by Retry-After when present."""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Per-key breaker: opens after `failure_threshold` consecutive failures, half-opens after `reset_timeout`.
+
+    Keys are forecast offices, so one failing WFO is skipped for a while instead of stalling the run.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.opened_at = {}
+
+    def allow(self, key):
+        """True if a request may go out; after the timeout one trial request is let through."""
+        with self.lock:
+            opened_at = self.opened_at.get(key)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                # Half-open: admit one probe, re-arm the timer until it reports back
+                self.opened_at[key] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+            self.opened_at.pop(key, None)
+
+    def record_failure(self, key):
+        with self.lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            if self.failures[key] >= self.failure_threshold:
+                if key not in self.opened_at:
+                    logging.warning(f"Circuit opened for {key} after {self.failures[key]} consecutive failures")
+                self.opened_at[key] = time.monotonic()
+
+    def open_keys(self):
+        with self.lock:
+            return sorted(self.opened_at)
@@ -0,0 +1,302 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+from requests.exceptions import RequestException
+
+from Catalog import load_stations
+from GridpointGroups import gridpoint_key
+from LatestObservationbyUSStationALL import get_observation_url, parse_observation
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import OBSERVATION_KEYS, MongoWriter, ensure_indexes, get_database
+from NoaaClient import get_client
+from StationHealth import StationHealth
+from Summaries import PRODUCT_SOURCES, update_summaries
+from TimezoneCache import get_timezone_cache
+
+# Last issuance seen per gridpoint/station and the learned issuance cadence, kept across restarts
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+poll_state_file_path = os.path.join(parent_dir, "Cache", "poll_state.json")
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_TICK_SECONDS = 30
+
+# Until an office (or station) has been seen reissuing, assume it does so hourly
+DEFAULT_CADENCE_SECONDS = 3600
+MIN_CADENCE_SECONDS = 600
+# Weight of the newest interval in the cadence moving average
+CADENCE_SMOOTHING = 0.2
+# Never poll an item again sooner than this after a poll that found nothing new
+MIN_RECHECK_SECONDS = 300
+
+# Forecast products are polled through the per-product scripts, one request per gridpoint
+FORECAST_MODULES = {
+    'daily': 'GetRequestDailyForecast',
+    'hourly': 'GetRequestHourlyForecast',
+    'quantitative': 'GetQuantitativeForecasts',
+}
+PRODUCTS = list(FORECAST_MODULES) + ['observations']
+
+def parse_time(value):
+    """Epoch seconds of an ISO 8601 timestamp such as NOAA's updateTime, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+class PollState:
+    """Last issuance seen per item and the issuance cadence learned per (product, office).
+
+    Issuance is tracked by updateTime (or an observation's timestamp): generatedAt changes
+    whenever the API re-renders the same issuance, so it would make every poll look new.
+    """
+
+    def __init__(self, path=poll_state_file_path):
+        self.path = path
+        state = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        self.items = state.get('items', {})
+        self.cadences = state.get('cadences', {})
+
+    def cadence(self, cadence_key):
+        return self.cadences.get(cadence_key, DEFAULT_CADENCE_SECONDS)
+
+    def staleness(self, key, cadence_key, now):
+        """Issuance cycles that have probably passed since the stored one, or None if not worth a request yet."""
+        entry = self.items.get(key)
+        if entry is None:
+            return math.inf
+        cadence = self.cadence(cadence_key)
+        if now - entry['lastChecked'] < max(MIN_RECHECK_SECONDS, cadence / 6):
+            return None
+        if entry.get('issued') is None:
+            # Never fetched successfully: as stale as it gets
+            return math.inf
+        score = (now - entry['issued']) / cadence
+        return score if score >= 1 else None
+
+    def record(self, key, cadence_key, update_time, now):
+        """Remember a poll; returns True when it brought a new issuance."""
+        entry = self.items.setdefault(key, {})
+        entry['lastChecked'] = now
+        if not update_time or update_time == entry.get('updateTime'):
+            return False
+        issued = parse_time(update_time)
+        previous = entry.get('issued')
+        if issued is not None and previous is not None and issued > previous:
+            cadence = self.cadence(cadence_key)
+            cadence += CADENCE_SMOOTHING * (issued - previous - cadence)
+            self.cadences[cadence_key] = max(MIN_CADENCE_SECONDS, cadence)
+        entry['updateTime'] = update_time
+        entry['issued'] = issued
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'items': self.items, 'cadences': self.cadences}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ForecastJob:
+    """Poll one forecast product gridpoint by gridpoint through its ingest script."""
+
+    def __init__(self, product, state):
+        self.product = product
+        self.module = importlib.import_module(FORECAST_MODULES[product])
+        self.items = {}
+        for (grid_id, grid_x, grid_y), cities in self.module.load_gridpoint_groups(state):
+            self.items[f"{product}:{gridpoint_key(grid_id, grid_x, grid_y)}"] = ((grid_id, grid_x, grid_y), cities)
+
+    def cadence_key(self, key):
+        # Offices issue on their own schedules; every gridpoint of an office shares it
+        (grid_id, _, _), _ = self.items[key]
+        return f"{self.product}:{grid_id}"
+
+    def available(self, key):
+        return True
+
+    def poll(self, key):
+        (grid_id, grid_x, grid_y), cities = self.items[key]
+        return self.module.process_gridpoint(grid_id, grid_x, grid_y, cities)
+
+    def store(self):
+        self.module.store_pending()
+
+
+class ObservationJob:
+    """Poll the latest observation of each station and store new ones in MongoDB."""
+
+    product = 'observations'
+
+    def __init__(self, state, client, health):
+        self.client = client
+        self.health = health
+        stations = load_stations(['stationIdentifier'], state)
+        self.items = {f"observations:{station_id}": station_id for station_id in stations['stationIdentifier']}
+        collection = get_database()['observations']
+        ensure_indexes(collection, OBSERVATION_KEYS)
+        self.writer = MongoWriter(collection, upsert_keys=OBSERVATION_KEYS)
+
+    def cadence_key(self, key):
+        # Stations report on their own schedules (most hourly, some every few minutes)
+        return key
+
+    def available(self, key):
+        # Stations that keep returning 404 stay on their back-off schedule
+        return not self.health.should_skip(self.items[key])
+
+    def poll(self, key):
+        station_id = self.items[key]
+        try:
+            response = self.client.get(get_observation_url(station_id))
+        except RequestException as e:
+            print(f"RequestException occurred for station ID: {station_id}, Error: {e}")
+            self.health.record_failure(station_id, type(e).__name__)
+            return None
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            print(f"Failed to retrieve data for station ID: {station_id}, Status Code: {response.status_code}")
+            self.health.record_failure(station_id, response.status_code, response.elapsed.total_seconds())
+            return None
+        self.health.record_success(station_id)
+        row = parse_observation(station_id, response.json().get('properties', {}))
+        self.writer.add(row)
+        return row['timestamp']
+
+    def store(self):
+        self.writer.flush()
+        self.health.save()
+
+
+class Scheduler:
+    """Spend a fixed request budget per minute on the items most likely to have a new issuance.
+
+    Every tick, items are ranked by how many of their office's issuance cycles have passed
+    since the stored issuance; never-fetched items come first. Polls run until the tick's
+    share of the budget is used up, then everything fetched is stored before the next tick.
+    """
+
+    def __init__(self, jobs, state, client, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tick_seconds=DEFAULT_TICK_SECONDS, prometheus_textfile=None):
+        self.jobs = jobs
+        self.metrics = get_metrics()
+        self.prometheus_textfile = prometheus_textfile
+        self.state = state
+        self.client = client
+        self.tick_seconds = tick_seconds
+        self.rate = requests_per_minute / 60.0
+        # Unused budget carries over for at most one tick, so no minute exceeds the budget by much
+        self.capacity = max(1.0, self.rate * tick_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.summary_sources = [PRODUCT_SOURCES[job.product] for job in jobs if job.product in PRODUCT_SOURCES]
+
+    def due_items(self, now):
+        """(job, key) pairs worth polling, stalest first."""
+        ranked = []
+        for job in self.jobs:
+            for key in job.items:
+                score = self.state.staleness(key, job.cadence_key(key), now)
+                if score is not None and job.available(key):
+                    last_checked = self.state.items.get(key, {}).get('lastChecked', 0)
+                    ranked.append((score, now - last_checked, job, key))
+        ranked.sort(key=lambda item: item[:2], reverse=True)
+        return [(job, key) for _, _, job, key in ranked]
+
+    def requests_made(self):
+        return self.client.stats['requests'] + self.client.stats['retries']
+
+    def run_tick(self):
+        monotonic = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (monotonic - self.updated) * self.rate)
+        self.updated = monotonic
+
+        now = time.time()
+        due = self.due_items(now)
+        polled = fresh = 0
+        for job, key in due:
+            if self.tokens < 1:
+                break
+            before = self.requests_made()
+            with self.metrics.stage(f"poll_{job.product}"):
+                update_time = job.poll(key)
+            self.tokens -= self.requests_made() - before
+            polled += 1
+            if self.state.record(key, job.cadence_key(key), update_time, time.time()):
+                fresh += 1
+                self.metrics.increment('new_issuances', product=job.product)
+
+        with self.metrics.stage('store'):
+            self.store()
+        # A daemon never reaches the end of a run, so the textfile is refreshed every tick
+        if self.prometheus_textfile:
+            self.metrics.write_prometheus('scheduler', self.prometheus_textfile)
+        print(f"{datetime.now():%Y-%m-%d %H:%M:%S} polled {polled} of {len(due)} due items, "
+              f"{fresh} new issuances, {self.tokens:.0f} requests left in budget")
+        return polled
+
+    def store(self):
+        """Store what was fetched, then save validators and state, so a crash never marks unstored data as seen."""
+        for job in self.jobs:
+            job.store()
+        if self.summary_sources:
+            update_summaries(get_database(), self.summary_sources)
+        self.client.save_validators()
+        get_timezone_cache().save()
+        self.state.save()
+
+    def run(self, once=False):
+        try:
+            while True:
+                started = time.monotonic()
+                self.run_tick()
+                if once:
+                    break
+                time.sleep(max(0.0, self.tick_seconds - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("Stopping scheduler, storing pending data")
+            self.store()
+
+def build_jobs(products, state, station_state, client, storage="documents"):
+    if 'hourly' in products:
+        importlib.import_module(FORECAST_MODULES['hourly']).set_storage_mode(storage)
+    jobs = [ForecastJob(product, state) for product in products if product in FORECAST_MODULES]
+    if 'observations' in products:
+        jobs.append(ObservationJob(station_state, client, StationHealth()))
+    return jobs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll NOAA forecasts and observations continuously within a request budget.")
+    parser.add_argument("--jobs", nargs="+", choices=PRODUCTS, default=PRODUCTS, help="Products to poll")
+    parser.add_argument("--state", default="NewYork", help="Places sheet whose gridpoints are polled")
+    parser.add_argument("--station-state", default="New York", help="State whose observation stations are polled")
+    parser.add_argument("--budget", type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="NOAA requests per minute")
+    parser.add_argument("--tick", type=float, default=DEFAULT_TICK_SECONDS, help="Seconds between scheduling rounds")
+    parser.add_argument("--once", action="store_true", help="Run a single scheduling round and exit")
+    parser.add_argument("--storage", choices=["documents", "timeseries", "both"], default="documents",
+                        help="Hourly forecast storage layout (see GetRequestHourlyForecast.py --storage)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    client = get_client()
+    jobs = build_jobs(args.jobs, args.state, args.station_state, client, args.storage)
+    print(f"Scheduling {sum(len(job.items) for job in jobs)} items across {', '.join(args.jobs)} "
+          f"at {args.budget:.0f} requests/minute")
+    with profiled(args.profile, 'scheduler'):
+        Scheduler(jobs, PollState(), client, args.budget, args.tick, args.prometheus_textfile).run(args.once)
+    export_metrics('scheduler', args)
@@ -0,0 +1,178 @@
+import argparse
+import importlib
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from Catalog import load_place_states, load_places
+from FetchEngine import SharedRateLimiter
+from GridpointGroups import GRID_COLUMNS, split_grid_column
+from Metrics import add_metrics_arguments, counter_total, export_metrics, get_metrics
+from MongoWriter import get_database
+from NoaaClient import get_client
+from Scheduler import FORECAST_MODULES
+from Summaries import PRODUCT_SOURCES, update_summaries
+from TimezoneCache import get_timezone_cache
+
+# Run the forecast scripts for many states at once: the work is cut into shards (one per state or
+# per forecast office) that a process pool takes from a shared queue, largest first. All processes
+# draw on one request budget and write to the same MongoDB collections as the single-state scripts.
+
+# Requests per minute for all workers together; FetchEngine's default rate of 10 per second
+DEFAULT_BUDGET = 600
+DEFAULT_WORKERS = 4
+
+# Set in each worker process by init_worker
+worker_products = []
+reported_validators = {}
+known_timezones = set()
+
+def plan_shards(states, shard_by='state'):
+    """Shards covering the gridpoints of `states`, largest first.
+
+    Each shard is a dict with its name, the states it reads places from, the office it is
+    restricted to (None for state shards) and its number of gridpoints.
+    """
+    frames = []
+    for state in states:
+        cells = split_grid_column(load_places(state, ['gridId/gridX/gridY']))
+        frames.append(cells[GRID_COLUMNS].drop_duplicates().assign(state=state))
+    cells = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=GRID_COLUMNS + ['state'])
+
+    shards = []
+    if shard_by == 'state':
+        for state, rows in cells.groupby('state', sort=False):
+            shards.append({'name': state, 'states': [state], 'office': None, 'gridpoints': len(rows)})
+    else:
+        # A cell shared by two states is fetched once, for the cities of both
+        for office, rows in cells.groupby('gridId', sort=False):
+            shards.append({'name': office, 'states': rows['state'].unique().tolist(), 'office': office,
+                           'gridpoints': len(rows.drop_duplicates(GRID_COLUMNS))})
+    return sorted(shards, key=lambda shard: shard['gridpoints'], reverse=True)
+
+def select_shards(shards, shard_index, shard_count):
+    """This machine's part of the shards when the run is split over `shard_count` machines."""
+    return [shard for shard in shards if zlib.crc32(shard['name'].encode('utf-8')) % shard_count == shard_index]
+
+def init_worker(limiter, products, storage="documents"):
+    """Point the worker's NOAA client at the shared budget and select the hourly storage layout."""
+    global worker_products, known_timezones
+    # Forked workers inherit the parent's metrics; only what the worker records is sent back
+    get_metrics().drain()
+    get_client().rate_limiter = limiter
+    worker_products = products
+    if 'hourly' in products:
+        importlib.import_module(FORECAST_MODULES['hourly']).set_storage_mode(storage)
+    known_timezones = set(get_timezone_cache().entries)
+
+def shard_groups(module, shard):
+    """The shard's ((gridId, gridX, gridY), cities) groups as loaded by one forecast script."""
+    groups = {}
+    for state in shard['states']:
+        for cell, cities in module.load_gridpoint_groups(state):
+            if shard['office'] is not None and cell[0] != shard['office']:
+                continue
+            groups[cell] = pd.concat([groups[cell], cities]) if cell in groups else cities
+    return list(groups.items())
+
+def run_shard(shard):
+    """Fetch and store every product for one shard; runs in a worker process."""
+    metrics = get_metrics()
+    started = time.perf_counter()
+    cities = 0
+    for product in worker_products:
+        module = importlib.import_module(FORECAST_MODULES[product])
+        for (grid_id, grid_x, grid_y), group in shard_groups(module, shard):
+            cities += len(group)
+            with metrics.stage('gridpoint'):
+                module.process_gridpoint(grid_id, grid_x, grid_y, group)
+        module.store_pending()
+    seconds = time.perf_counter() - started
+
+    # Validators and timezones go back to the parent, which saves them once for all workers
+    validators = {url: validator for url, validator in get_client().new_validators().items()
+                  if reported_validators.get(url) != validator}
+    reported_validators.update(validators)
+    entries = get_timezone_cache().entries
+    timezones = {key: entries[key] for key in set(entries) - known_timezones}
+    known_timezones.update(timezones)
+
+    stages, counters = metrics.drain()
+    return {'shard': shard, 'pid': os.getpid(), 'seconds': seconds, 'cities': cities, 'stages': stages,
+            'counters': counters, 'validators': validators, 'timezones': timezones}
+
+def report_shards(results, wall_seconds, budget):
+    """Print throughput per shard and for the whole run."""
+    print(f"{'shard':<12} {'pid':>7} {'gridpoints':>10} {'fetched':>8} {'unchanged':>9} {'errors':>6} "
+          f"{'requests':>8} {'seconds':>8} {'req/min':>8}")
+    total_requests = 0
+    for result in sorted(results, key=lambda result: result['seconds'], reverse=True):
+        counters = result['counters']
+        requests = counter_total(counters, 'http_requests') + counter_total(counters, 'http_retries')
+        total_requests += requests
+        rate = 60 * requests / result['seconds'] if result['seconds'] else 0
+        print(f"{result['shard']['name']:<12} {result['pid']:>7} {result['shard']['gridpoints']:>10} "
+              f"{counter_total(counters, 'gridpoints', result='fetched'):>8} "
+              f"{counter_total(counters, 'gridpoints', result='unchanged'):>9} "
+              f"{counter_total(counters, 'gridpoints', result='error'):>6} "
+              f"{requests:>8} {result['seconds']:>8.1f} {rate:>8.0f}")
+    rate = 60 * total_requests / wall_seconds if wall_seconds else 0
+    print(f"{len(results)} shards, {total_requests} requests in {wall_seconds:.1f}s: "
+          f"{rate:.0f} requests/minute against a budget of {budget:.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch NOAA forecasts for several states in parallel shards.")
+    parser.add_argument("states", nargs="+", help="Places sheets to fetch, or 'all'")
+    parser.add_argument("--products", nargs="+", choices=list(FORECAST_MODULES), default=list(FORECAST_MODULES))
+    parser.add_argument("--shard-by", choices=['state', 'office'], default='state',
+                        help="Cut the work into one shard per state or per forecast office")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="NOAA requests per minute for the whole run, across every machine")
+    parser.add_argument("--shard-index", type=int, default=0, help="This machine's index when splitting over machines")
+    parser.add_argument("--shard-count", type=int, default=1, help="Machines the shards are split over")
+    parser.add_argument("--storage", choices=["documents", "timeseries", "both"], default="documents",
+                        help="Hourly forecast storage layout (see GetRequestHourlyForecast.py --storage)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    states = load_place_states() if args.states == ['all'] else args.states
+    shards = select_shards(plan_shards(states, args.shard_by), args.shard_index, args.shard_count)
+    # Every machine gets an equal share of the budget
+    budget = args.budget / args.shard_count
+    print(f"{len(shards)} shards ({sum(shard['gridpoints'] for shard in shards)} gridpoints) of {len(states)} states, "
+          f"{', '.join(args.products)}, {args.workers} workers sharing {budget:.0f} requests/minute")
+
+    metrics = get_metrics()
+    limiter = SharedRateLimiter(budget / 60)
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(limiter, args.products, args.storage)) as executor:
+        futures = {executor.submit(run_shard, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                metrics.increment('shards', result='error')
+                print(f"Shard {shard['name']} failed: {e}")
+                continue
+            metrics.increment('shards', result='done')
+            metrics.merge(result['stages'], result['counters'])
+            get_client().merge_validators(result['validators'])
+            get_timezone_cache().merge(result['timezones'])
+            results.append(result)
+            print(f"Shard {shard['name']} done in {result['seconds']:.1f}s ({len(results)}/{len(shards)})")
+    wall_seconds = time.perf_counter() - started
+
+    report_shards(results, wall_seconds, budget)
+    # One summary update for everything the workers stored
+    update_summaries(get_database(), [PRODUCT_SOURCES[product] for product in args.products if product in PRODUCT_SOURCES])
+    # Everything the workers fetched is stored by now, so their validators can be saved
+    get_client().save_validators()
+    get_timezone_cache().save()
+    export_metrics('sharded_forecasts', args)
@@ -0,0 +1,326 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from requests.exceptions import RequestException
+from scipy.spatial import cKDTree
+
+from Catalog import catalog_file_path, has_table, load_places, load_stations, places_file_path, stations_file_path
+from GridpointGroups import split_grid_column
+from Metrics import get_metrics
+
+# In-process lookups of nearby stations and NOAA grid cells, built from the catalog and pickled
+# to Cache/spatial_index.pkl. Only coordinates outside every known office grid go to /points.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+spatial_index_file_path = os.path.join(parent_dir, "Cache", "spatial_index.pkl")
+
+POINTS_URL = "https://api.weather.gov/points/{lat:.4f},{lon:.4f}"
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Projection of the NWS CONUS forecast grids: Lambert conformal, standard parallel 25N, central
+# meridian 95W, with square cells. Each office grid differs only in its origin; offices on other
+# projections (Alaska, Hawaii, Puerto Rico) fail the fit and fall back to nearest place or /points.
+LCC_RADIUS_KM = 6371.2
+LCC_STANDARD_PARALLEL = np.radians(25.0)
+LCC_CENTRAL_MERIDIAN = np.radians(-95.0)
+LCC_CONE = np.sin(LCC_STANDARD_PARALLEL)
+LCC_SCALE = np.cos(LCC_STANDARD_PARALLEL) * np.tan(np.pi / 4 + LCC_STANDARD_PARALLEL / 2) ** LCC_CONE / LCC_CONE
+GRID_SPACING_KM = 2.539703
+# Without a fitted grid, a point this close to a known place is assumed to share its cell
+CELL_RADIUS_KM = GRID_SPACING_KM / 4
+# An office's fitted grid is trusted this far from the nearest known place of that office
+DEFAULT_FIT_DISTANCE_KM = 15.0
+# Places consulted to decide which office a point belongs to
+OFFICE_NEIGHBOURS = 4
+# Fits need enough places, and every place must land in its own cell to within this fraction of a cell
+MIN_FIT_POINTS = 12
+MAX_FIT_MISMATCH = 0.1
+
+def unit_vectors(lat, lon):
+    """Points on the unit sphere, so Euclidean nearest neighbours are great-circle nearest neighbours."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord, 2.0) / 2)
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(km, np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+def project(lat, lon):
+    """Points in the CONUS Lambert conformal projection, as an (n, 2) array of x, y in km."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    rho = LCC_RADIUS_KM * LCC_SCALE / np.tan(np.pi / 4 + lat / 2) ** LCC_CONE
+    theta = LCC_CONE * (lon - LCC_CENTRAL_MERIDIAN)
+    return np.column_stack((rho * np.sin(theta), -rho * np.cos(theta)))
+
+def fit_office_grid(lat, lon, grid_x, grid_y):
+    """Projected origin (km) of an office grid, or None when the known places do not pin one down.
+
+    Each place at projected p in cell g constrains the origin to (p - (g + 1) * spacing, p - g * spacing];
+    the origin is the middle of the intersection of those intervals.
+    """
+    if len(lat) < MIN_FIT_POINTS:
+        return None
+    projected = project(lat, lon)
+    cells = np.column_stack((grid_x, grid_y)).astype(np.float64)
+    low = (projected - (cells + 1) * GRID_SPACING_KM).max(axis=0)
+    high = (projected - cells * GRID_SPACING_KM).min(axis=0)
+    if (low - high > MAX_FIT_MISMATCH * GRID_SPACING_KM).any():
+        return None
+    return (low + high) / 2
+
+def grid_cells(origin, lat, lon):
+    """(gridX, gridY) of coordinates on the office grid with the given origin."""
+    return np.floor((project(lat, lon) - origin) / GRID_SPACING_KM).astype(np.int64)
+
+def catalog_signature():
+    """Modification times of the files the index is built from, to detect a stale pickle."""
+    # Each table missing from the catalog is read from its workbook instead (see Catalog.has_table)
+    paths = [catalog_file_path] if os.path.exists(catalog_file_path) else []
+    paths += [workbook for table, workbook in (('places', places_file_path), ('stations', stations_file_path))
+              if not has_table(table)]
+    return tuple((path, os.path.getmtime(path)) for path in paths if os.path.exists(path))
+
+
+class SpatialIndex:
+    """KD-trees over stations and places, plus a fitted grid per forecast office.
+
+    All queries take arrays of latitudes and longitudes and are answered in bulk.
+    """
+
+    points_url = POINTS_URL
+
+    def __init__(self, places=None, stations=None, signature=None):
+        self.signature = signature
+        self.resolved = {}
+        self.dirty = False
+
+        places = places if places is not None else pd.DataFrame(columns=['NAME.1', 'INTPTLAT', 'INTPTLONG'])
+        if 'gridId' not in places.columns and 'gridId/gridX/gridY' in places.columns:
+            places = split_grid_column(places)
+        places = places.dropna(subset=['INTPTLAT', 'INTPTLONG']).reset_index(drop=True)
+        self.place_names = places['NAME.1'].to_numpy(dtype=object)
+        self.place_lat = places['INTPTLAT'].to_numpy(dtype=np.float64)
+        self.place_lon = places['INTPTLONG'].to_numpy(dtype=np.float64)
+        self.place_tree = cKDTree(unit_vectors(self.place_lat, self.place_lon)) if len(places) else None
+
+        if 'gridId' in places.columns:
+            gridded = places.dropna(subset=['gridId', 'gridX', 'gridY'])
+            self.place_office = places['gridId'].astype(object).to_numpy()
+            self.place_grid_x = pd.to_numeric(places['gridX'], errors='coerce').to_numpy()
+            self.place_grid_y = pd.to_numeric(places['gridY'], errors='coerce').to_numpy()
+            self.offices = np.unique(gridded['gridId'].astype(str).to_numpy())
+            self.office_grids = {}
+            for office, rows in gridded.groupby('gridId'):
+                fit = fit_office_grid(rows['INTPTLAT'], rows['INTPTLONG'],
+                                      pd.to_numeric(rows['gridX']), pd.to_numeric(rows['gridY']))
+                if fit is not None:
+                    self.office_grids[office] = fit
+            self.known_cells = set(self.cell_codes(gridded['gridId'].astype(str).to_numpy(),
+                                                   pd.to_numeric(gridded['gridX']).to_numpy(),
+                                                   pd.to_numeric(gridded['gridY']).to_numpy()).tolist())
+        else:
+            self.place_office = np.full(len(places), None, dtype=object)
+            self.place_grid_x = self.place_grid_y = np.full(len(places), np.nan)
+            self.offices = np.array([], dtype=str)
+            self.office_grids = {}
+            self.known_cells = set()
+
+        stations = stations if stations is not None else pd.DataFrame(columns=['stationIdentifier', 'latitude', 'longitude'])
+        stations = stations.dropna(subset=['latitude', 'longitude']).reset_index(drop=True)
+        self.station_ids = stations['stationIdentifier'].to_numpy(dtype=object)
+        self.station_tree = (cKDTree(unit_vectors(stations['latitude'], stations['longitude']))
+                             if len(stations) else None)
+
+    @classmethod
+    def from_catalog(cls):
+        places = load_places(None, ['NAME.1', 'INTPTLAT', 'INTPTLONG', 'gridId/gridX/gridY'])
+        stations = load_stations(['stationIdentifier', 'latitude', 'longitude'])
+        return cls(places, stations, catalog_signature())
+
+    def cell_codes(self, offices, grid_x, grid_y):
+        """Encode (office, gridX, gridY) as int64 so cell membership is a vectorized isin."""
+        office_index = np.searchsorted(self.offices, np.asarray(offices, dtype=str))
+        return (office_index.astype(np.int64) * 1_000_000 + np.asarray(grid_x, dtype=np.int64) * 1_000
+                + np.asarray(grid_y, dtype=np.int64))
+
+    @staticmethod
+    def query(tree, lat, lon, k, max_distance_km):
+        lat, lon = np.atleast_1d(lat), np.atleast_1d(lon)
+        chord, index = tree.query(unit_vectors(lat, lon), k=k, distance_upper_bound=km_to_chord(max_distance_km))
+        return index, chord_to_km(chord)
+
+    def nearest_stations(self, lat, lon, k=1, max_distance_km=np.inf):
+        """Station identifiers and distances (km) of the k nearest stations; None / inf beyond the limit."""
+        if self.station_tree is None:
+            raise ValueError("No stations in the index")
+        index, km = self.query(self.station_tree, lat, lon, k, max_distance_km)
+        found = index < len(self.station_ids)
+        ids = np.full(index.shape, None, dtype=object)
+        ids[found] = self.station_ids[index[found]]
+        return ids, km
+
+    def nearest_places(self, lat, lon, max_distance_km=np.inf, k=1):
+        """Row indices (-1 beyond the limit) and distances (km) of the k nearest known places."""
+        if self.place_tree is None:
+            shape = np.atleast_1d(lat).shape + ((k,) if k > 1 else ())
+            return np.full(shape, -1), np.full(shape, np.inf)
+        index, km = self.query(self.place_tree, lat, lon, k, max_distance_km)
+        return np.where(index < len(self.place_lat), index, -1), km
+
+    def resolve_gridpoints(self, lat, lon, client=None, fit_distance_km=DEFAULT_FIT_DISTANCE_KM):
+        """Resolve coordinates to (gridId, gridX, gridY) in bulk.
+
+        Points are placed on the fitted grid of the nearest known place's office when that place is
+        within `fit_distance_km` and its neighbours agree on the office ('known' if a known place lies
+        in the cell, otherwise 'fit'). In offices without a fit they take the cell of a place a fraction
+        of a cell away ('nearest'). Earlier /points answers are reused ('cached'); anything else is
+        looked up through `client` ('network') or, without a client, left unresolved.
+        """
+        metrics = get_metrics()
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        result = pd.DataFrame({'latitude': lat, 'longitude': lon, 'gridId': None,
+                               'gridX': pd.array([pd.NA] * len(lat), dtype='Int64'),
+                               'gridY': pd.array([pd.NA] * len(lat), dtype='Int64'), 'source': None})
+        grid_x = np.zeros(len(lat), dtype=np.int64)
+        grid_y = np.zeros(len(lat), dtype=np.int64)
+        offices = np.full(len(lat), None, dtype=object)
+        source = np.full(len(lat), '', dtype=object)
+
+        with metrics.stage('spatial_resolve'):
+            if self.place_tree is not None:
+                neighbours, neighbour_km = self.nearest_places(lat, lon, fit_distance_km, k=OFFICE_NEIGHBOURS)
+                place, km = neighbours[:, 0], neighbour_km[:, 0]
+                near = place >= 0
+                offices[near] = self.place_office[place[near]]
+                # Near an office boundary the nearest place may belong to the other office: only points
+                # whose nearby places all agree on the office go on its fitted grid
+                neighbour_offices = np.where(neighbours >= 0, self.place_office[np.maximum(neighbours, 0)], None)
+                agree = ((neighbour_offices == offices[:, None]) | (neighbours < 0)).all(axis=1)
+                for office in pd.unique(offices[near]):
+                    if office not in self.office_grids:
+                        continue
+                    rows = near & agree & (offices == office)
+                    predicted = grid_cells(self.office_grids[office], lat[rows], lon[rows])
+                    grid_x[rows], grid_y[rows] = predicted[:, 0], predicted[:, 1]
+                    source[rows] = 'fit'
+                fitted = source == 'fit'
+                if fitted.any():
+                    known = np.isin(self.cell_codes(offices[fitted].astype(str), grid_x[fitted], grid_y[fitted]),
+                                    list(self.known_cells))
+                    source[np.flatnonzero(fitted)[known]] = 'known'
+
+                # Offices without a reliable fit: share the cell of a place a fraction of a cell away
+                unfitted = np.array([office not in self.office_grids for office in offices], dtype=bool)
+                close = near & unfitted & (km <= CELL_RADIUS_KM)
+                close &= np.isfinite(self.place_grid_x[np.maximum(place, 0)])
+                grid_x[close] = self.place_grid_x[place[close]]
+                grid_y[close] = self.place_grid_y[place[close]]
+                source[close] = 'nearest'
+
+            # Earlier /points answers
+            for row in np.flatnonzero(source == ''):
+                cached = self.resolved.get(self.coordinate_key(lat[row], lon[row]))
+                if cached:
+                    offices[row], grid_x[row], grid_y[row] = cached
+                    source[row] = 'cached'
+
+        if client is not None:
+            for row in np.flatnonzero(source == ''):
+                cell = self.lookup_point(client, lat[row], lon[row])
+                if cell is not None:
+                    offices[row], grid_x[row], grid_y[row] = cell
+                    source[row] = 'network'
+
+        resolved = source != ''
+        result.loc[resolved, 'gridId'] = offices[resolved]
+        result.loc[resolved, 'gridX'] = grid_x[resolved]
+        result.loc[resolved, 'gridY'] = grid_y[resolved]
+        result['source'] = np.where(resolved, source, None)
+        for name, count in pd.Series(np.where(resolved, source, 'unresolved')).value_counts().items():
+            metrics.increment('spatial_resolutions', int(count), source=name)
+        return result
+
+    @staticmethod
+    def coordinate_key(lat, lon):
+        return f"{lat:.4f},{lon:.4f}"
+
+    def lookup_point(self, client, lat, lon):
+        """Ask /points for the grid cell of one coordinate and remember the answer."""
+        try:
+            response = client.get(self.points_url.format(lat=lat, lon=lon), conditional=False)
+        except RequestException as e:
+            print(f"Error resolving {lat:.4f},{lon:.4f}: {e}")
+            return None
+        if response.status_code != 200:
+            # 404 for points outside the NWS domain
+            print(f"No grid cell for {lat:.4f},{lon:.4f} (status {response.status_code})")
+            return None
+        properties = response.json().get('properties', {})
+        cell = (properties.get('gridId'), int(properties.get('gridX')), int(properties.get('gridY')))
+        self.resolved[self.coordinate_key(lat, lon)] = cell
+        self.dirty = True
+        return cell
+
+    def save(self, path=spatial_index_file_path):
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+
+_index = None
+
+def get_spatial_index(path=spatial_index_file_path, rebuild=False):
+    """Return the process-wide SpatialIndex, unpickling it unless the catalog changed since it was built."""
+    global _index
+    if _index is None:
+        signature = catalog_signature()
+        previous = None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                previous = pickle.load(f)
+            if previous.signature == signature and not rebuild:
+                _index = previous
+        if _index is None:
+            _index = SpatialIndex.from_catalog()
+            if previous is not None:
+                # /points answers stay valid when the workbooks change
+                _index.resolved = previous.resolved
+            _index.save(path)
+    return _index
+
+if __name__ == "__main__":
+    import argparse
+
+    from NoaaClient import get_client
+
+    parser = argparse.ArgumentParser(description="Resolve coordinates to nearby stations and NOAA grid cells.")
+    parser.add_argument("coordinates", nargs="+", help="lat,lon pairs, e.g. 40.7128,-74.0060")
+    parser.add_argument("--stations", type=int, default=3, help="Nearest stations to list per coordinate")
+    parser.add_argument("--offline", action="store_true", help="Never call /points for unresolved coordinates")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the catalog")
+    args = parser.parse_args()
+
+    index = get_spatial_index(rebuild=args.rebuild)
+    lat, lon = np.array([[float(part) for part in pair.split(",")] for pair in args.coordinates]).T
+    cells = index.resolve_gridpoints(lat, lon, client=None if args.offline else get_client())
+    station_ids, km = index.nearest_stations(lat, lon, k=args.stations)
+    for row, cell in cells.iterrows():
+        grid = f"{cell['gridId']}/{cell['gridX']},{cell['gridY']} ({cell['source']})" if cell['source'] else "unresolved"
+        nearby = ", ".join(f"{station} {distance:.1f} km" for station, distance
+                           in zip(np.atleast_1d(station_ids[row]), np.atleast_1d(km[row])) if station is not None)
+        print(f"{cell['latitude']:.4f},{cell['longitude']:.4f}: {grid}; stations {nearby}")
+    if index.dirty:
+        index.save()
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+
+# Persistent failure history per station, used to skip stations that keep returning 404
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+station_health_file_path = os.path.join(parent_dir, "Cache", "station_health.json")
+
+# A station that failed N times in a row is retried after BASE_BACKOFF * 2**(N-1), capped
+BASE_BACKOFF_SECONDS = 6 * 3600
+MAX_BACKOFF_SECONDS = 30 * 24 * 3600
+
+# Only statuses that mean "this station has no data" earn a back-off; 5xx/timeouts are transient
+DEAD_STATUS_CODES = {404, 410}
+
+
+class StationHealth:
+    """Negative cache of station failures with an exponential retry schedule.
+
+    `clock` returns the current epoch seconds (time.time unless a test supplies its own).
+    """
+
+    def __init__(self, path=station_health_file_path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        self.stats = {"skipped": 0, "recovered": 0, "reclaimed_seconds": 0.0}
+
+    def backoff_seconds(self, consecutive_failures):
+        return min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (consecutive_failures - 1))
+
+    def should_skip(self, station_id, now=None):
+        """True while a consistently dead station is still inside its back-off window."""
+        entry = self.entries.get(station_id)
+        if not entry or entry['status'] not in DEAD_STATUS_CODES:
+            return False
+        now = now or self.clock()
+        return now < entry['lastAttempt'] + self.backoff_seconds(entry['consecutiveFailures'])
+
+    def filter_stations(self, station_ids, now=None):
+        """Return the stations worth requesting this sweep, counting the rest as skipped."""
+        now = now or self.clock()
+        due = []
+        for station_id in station_ids:
+            if self.should_skip(station_id, now):
+                # What the request cost the last time it was attempted
+                self.stats["skipped"] += 1
+                self.stats["reclaimed_seconds"] += self.entries[station_id].get('seconds', 0)
+            else:
+                due.append(station_id)
+        return due
+
+    def record_failure(self, station_id, status, seconds=0.0):
+        """Remember a failed attempt; `status` is the HTTP code or an exception name."""
+        with self.lock:
+            entry = self.entries.get(station_id, {'consecutiveFailures': 0})
+            self.entries[station_id] = {
+                'status': status,
+                'lastAttempt': self.clock(),
+                'consecutiveFailures': entry['consecutiveFailures'] + 1,
+                'seconds': seconds,
+            }
+
+    def record_success(self, station_id):
+        with self.lock:
+            if self.entries.pop(station_id, None) is not None:
+                self.stats["recovered"] += 1
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+    def report(self):
+        print(f"Skipped {self.stats['skipped']} stations with a history of 404s "
+              f"(~{self.stats['reclaimed_seconds']:.0f}s of sweep time reclaimed), "
+              f"{self.stats['recovered']} previously failing stations recovered")
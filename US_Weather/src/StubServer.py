@@ -0,0 +1,288 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Resilience import office_from_url
+
+# Minimal stand-in for api.weather.gov used by the benchmarks
+OBSERVATION_PATH = re.compile(r"^/stations/(?P<station_id>[^/]+)/observations/latest$")
+HOURLY_FORECAST_PATH = re.compile(r"^/gridpoints/(?P<grid_id>[A-Z]+)/(?P<grid_x>\d+),(?P<grid_y>\d+)/forecast/hourly$")
+DAILY_FORECAST_PATH = re.compile(r"^/gridpoints/(?P<grid_id>[A-Z]+)/(?P<grid_x>\d+),(?P<grid_y>\d+)/forecast$")
+GRIDPOINT_PATH = re.compile(r"^/gridpoints/(?P<grid_id>[A-Z]+)/(?P<grid_x>\d+),(?P<grid_y>\d+)$")
+POINTS_PATH = re.compile(r"^/points/(?P<lat>-?[\d.]+),(?P<lon>-?[\d.]+)$")
+
+# (element, unit, interval hours, base value) of the numeric layers in a /gridpoints payload
+GRIDPOINT_ELEMENTS = [
+    ("temperature", "wmoUnit:degC", 1, 2.0),
+    ("dewpoint", "wmoUnit:degC", 1, -3.0),
+    ("maxTemperature", "wmoUnit:degC", 12, 6.0),
+    ("minTemperature", "wmoUnit:degC", 12, -2.0),
+    ("relativeHumidity", "wmoUnit:percent", 1, 60.0),
+    ("apparentTemperature", "wmoUnit:degC", 1, 0.0),
+    ("heatIndex", "wmoUnit:degC", 1, 2.0),
+    ("windChill", "wmoUnit:degC", 1, -4.0),
+    ("skyCover", "wmoUnit:percent", 1, 40.0),
+    ("windDirection", "wmoUnit:degree_(angle)", 1, 270.0),
+    ("windSpeed", "wmoUnit:km_h-1", 1, 12.0),
+    ("windGust", "wmoUnit:km_h-1", 1, 20.0),
+    ("probabilityOfPrecipitation", "wmoUnit:percent", 1, 10.0),
+    ("quantitativePrecipitation", "wmoUnit:mm", 6, 1.5),
+    ("iceAccumulation", "wmoUnit:mm", 6, 0.0),
+    ("snowfallAmount", "wmoUnit:mm", 6, 0.0),
+    ("ceilingHeight", "wmoUnit:m", 1, 1500.0),
+    ("visibility", "wmoUnit:m", 1, 16000.0),
+    ("transportWindSpeed", "wmoUnit:km_h-1", 1, 20.0),
+    ("mixingHeight", "wmoUnit:m", 1, 800.0),
+]
+
+
+def sample_observation(station_id):
+    """Build a small observation payload shaped like NOAA's latest-observation response."""
+    return {
+        "properties": {
+            "@type": "wx:ObservationStation",
+            "station": f"https://api.weather.gov/stations/{station_id}",
+            "timestamp": "2025-02-20T21:00:00+00:00",
+            "textDescription": "Clear",
+            "temperature": {"unitCode": "wmoUnit:degC", "value": 4.4},
+            "dewpoint": {"unitCode": "wmoUnit:degC", "value": -3.1},
+            "windDirection": {"unitCode": "wmoUnit:degree_(angle)", "value": 270},
+            "windSpeed": {"unitCode": "wmoUnit:km_h-1", "value": 14.8},
+            "barometricPressure": {"unitCode": "wmoUnit:Pa", "value": 101730},
+            "relativeHumidity": {"unitCode": "wmoUnit:percent", "value": 57.6},
+        }
+    }
+
+
+def sample_hourly_forecast(grid_id, grid_x, grid_y, hours=156):
+    """Build an hourly forecast payload shaped like NOAA's /forecast/hourly response."""
+    periods = []
+    for hour in range(hours):
+        day, hour_of_day = divmod(hour, 24)
+        periods.append({
+            "number": hour + 1,
+            "startTime": f"2025-02-{20 + day:02d}T{hour_of_day:02d}:00:00-05:00",
+            "endTime": f"2025-02-{20 + day:02d}T{hour_of_day:02d}:59:59-05:00",
+            "isDaytime": 6 <= hour_of_day < 18,
+            "temperature": 30 + hour % 12,
+            "temperatureUnit": "F",
+            "probabilityOfPrecipitation": {"unitCode": "wmoUnit:percent", "value": hour % 40},
+            "dewpoint": {"unitCode": "wmoUnit:degC", "value": -3.3},
+            "relativeHumidity": {"unitCode": "wmoUnit:percent", "value": 60},
+            "windSpeed": f"{5 + hour % 10} mph",
+            "windDirection": "NW",
+            "shortForecast": "Partly Cloudy",
+        })
+    return {
+        "properties": {
+            "gridId": grid_id,
+            "gridX": int(grid_x),
+            "gridY": int(grid_y),
+            "updateTime": "2025-02-20T20:11:52+00:00",
+            "generatedAt": "2025-02-20T21:00:00+00:00",
+            "periods": periods,
+        }
+    }
+
+
+def sample_daily_forecast(grid_id, grid_x, grid_y, days=7):
+    """Build a forecast payload shaped like NOAA's /forecast response (12-hour day and night periods)."""
+    periods = []
+    for number in range(days * 2):
+        day, night = divmod(number, 2)
+        start, end = (6, 18) if not night else (18, 6)
+        end_day = day + 1 if night else day
+        periods.append({
+            "number": number + 1,
+            "name": f"Day {day + 1} Night" if night else f"Day {day + 1}",
+            "startTime": f"2025-02-{20 + day:02d}T{start:02d}:00:00-05:00",
+            "endTime": f"2025-02-{20 + end_day:02d}T{end:02d}:00:00-05:00",
+            "isDaytime": not night,
+            "temperature": (28 if night else 40) + day % 4,
+            "temperatureUnit": "F",
+            "probabilityOfPrecipitation": {"unitCode": "wmoUnit:percent", "value": (number * 10) % 60},
+            "windSpeed": f"{5 + day % 5} to {10 + day % 5} mph",
+            "windDirection": "NW",
+            "shortForecast": "Partly Cloudy",
+            "detailedForecast": "Partly cloudy, with a high near 40.",
+        })
+    return {
+        "properties": {
+            "gridId": grid_id,
+            "gridX": int(grid_x),
+            "gridY": int(grid_y),
+            "updateTime": "2025-02-20T20:11:52+00:00",
+            "generatedAt": "2025-02-20T21:00:00+00:00",
+            "periods": periods,
+        }
+    }
+
+
+def sample_gridpoint(grid_id, grid_x, grid_y, days=7):
+    """Build a raw-data payload shaped like NOAA's /gridpoints response (ISO-8601 interval validTimes)."""
+    properties = {
+        "updateTime": "2025-02-20T20:11:52+00:00",
+        "validTimes": f"2025-02-20T12:00:00+00:00/P{days}DT12H",
+        "gridId": grid_id,
+        "gridX": int(grid_x),
+        "gridY": int(grid_y),
+    }
+    for name, uom, interval, base in GRIDPOINT_ELEMENTS:
+        values = []
+        for step in range(days * 24 // interval):
+            day, hour = divmod(12 + step * interval, 24)
+            values.append({
+                "validTime": f"2025-02-{20 + day:02d}T{hour:02d}:00:00+00:00/PT{interval}H",
+                "value": round(base + step % 7 * 0.5, 1),
+            })
+        properties[name] = {"uom": uom, "values": values}
+    properties["weather"] = {"values": [{"validTime": "2025-02-20T12:00:00+00:00/P7D",
+                                         "value": [{"coverage": None, "weather": None}]}]}
+    return {"properties": properties}
+
+
+def sample_point(lat, lon):
+    """Build a /points response; the cell is a simple function of the coordinates."""
+    grid_x = int((float(lon) + 80) * 40) % 1000
+    grid_y = int((float(lat) - 35) * 40) % 1000
+    return {
+        "properties": {
+            "gridId": "OKX",
+            "gridX": grid_x,
+            "gridY": grid_y,
+            "forecastHourly": f"https://api.weather.gov/gridpoints/OKX/{grid_x},{grid_y}/forecast/hourly",
+        }
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve canned NOAA responses after an artificial latency."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        time.sleep(server.latency)
+
+        if server.should_fail(self.path):
+            self.send_fault()
+            return
+        self.respond()
+
+    def respond(self):
+        """Send the canned response for the request path."""
+        match = OBSERVATION_PATH.match(self.path)
+        if match is not None:
+            self.send_json(200, sample_observation(match.group("station_id")))
+            return
+        match = HOURLY_FORECAST_PATH.match(self.path)
+        if match is not None:
+            self.send_json(200, sample_hourly_forecast(**match.groupdict()))
+            return
+        match = DAILY_FORECAST_PATH.match(self.path)
+        if match is not None:
+            self.send_json(200, sample_daily_forecast(**match.groupdict()))
+            return
+        match = GRIDPOINT_PATH.match(self.path)
+        if match is not None:
+            self.send_json(200, sample_gridpoint(**match.groupdict()))
+            return
+        match = POINTS_PATH.match(self.path)
+        if match is not None:
+            self.send_json(200, sample_point(**match.groupdict()))
+            return
+        self.send_json(404, {"title": "Not Found"})
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode("utf-8"))
+
+    def send_body(self, status, body):
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            with self.server.lock:
+                self.server.not_modified_count += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/geo+json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_fault(self):
+        body = json.dumps({"title": "Injected fault", "status": self.server.fault_status}).encode("utf-8")
+        self.send_response(self.server.fault_status)
+        self.send_header("Content-Type", "application/problem+json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header("Retry-After", str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local NOAA stub with optional fault injection.
+
+    `fault_rate` makes that fraction of requests fail with `fault_status` (and a Retry-After
+    header when `retry_after` is set); every /gridpoints request (raw data, daily and hourly
+    forecasts) for an office listed in `failing_offices` fails.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, handler=StubHandler, fault_rate=0.0, fault_status=503, retry_after=None,
+                 failing_offices=(), seed=0, port=0):
+        super().__init__(("127.0.0.1", port), handler)
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.fault_status = fault_status
+        self.retry_after = retry_after
+        self.failing_offices = {office.upper() for office in failing_offices}
+        self.random = random.Random(seed)
+        self.fault_count = 0
+        self.request_count = 0
+        self.connection_count = 0
+        self.not_modified_count = 0
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        # Called once per accepted TCP connection, so this counts new connections rather than requests
+        with self.lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+
+    def should_fail(self, path):
+        office = office_from_url(path)
+        with self.lock:
+            fail = office is not None and office in self.failing_offices
+            fail = fail or self.random.random() < self.fault_rate
+            if fail:
+                self.fault_count += 1
+        return fail
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
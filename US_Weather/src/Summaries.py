@@ -0,0 +1,262 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+
+from ForecastRecords import wind_speed_bounds
+from GridpointParser import expand_hourly, split_valid_times
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import ensure_indexes, get_database
+
+# Materialized daily summaries, updated incrementally from the documents stored since the last update.
+# Forecast summaries hold one document per (city, local date): the newest issuance's daily values plus
+# their Low/High envelope over every issuance that covered the day. Observation summaries hold one
+# document per (station, UTC date). Charts and ad-hoc queries read these instead of the raw forecasts.
+SUMMARY_COLLECTION = 'daily_summaries'
+SUMMARY_KEYS = ('city', 'date')
+OBSERVATION_SUMMARY_COLLECTION = 'observation_daily_summaries'
+OBSERVATION_SUMMARY_KEYS = ('station', 'date')
+STATE_COLLECTION = 'summary_state'
+
+# Collection each ingest product stores its documents in (daily forecasts are not summarized)
+PRODUCT_SOURCES = {'hourly': 'Hourlyforecasts', 'quantitative': 'quantitativeForecasts', 'observations': 'observations'}
+
+# Source documents read per batch; the watermark moves after each batch is stored
+BATCH_DOCUMENTS = 500
+
+# Daily statistics of the hourly forecast (°F, mph, percent) and of the quantitative forecast (mm)
+HOURLY_STATISTICS = ['temperatureMin', 'temperatureMax', 'windSpeedMax', 'precipitationProbabilityMax']
+QUANTITATIVE_STATISTICS = ['precipitation']
+
+def hourly_summary_pipeline(id_range):
+    """Hourly forecast periods of the documents in `id_range`, with the fields the summaries need."""
+    return [
+        {'$match': {'_id': id_range}},
+        {'$unwind': '$forecasts'},
+        {'$project': {
+            '_id': 0,
+            'city': 1,
+            'updateTime': 1,
+            'time': '$forecasts.startTime',
+            'temperature': '$forecasts.temperature',
+            'precipitationProbability': '$forecasts.probOfPrecipitationValue',
+            'windSpeedMax': '$forecasts.windSpeedMax',
+            'windSpeed': '$forecasts.windSpeed',
+        }},
+    ]
+
+def quantitative_summary_pipeline(id_range):
+    """Quantitative precipitation intervals of the documents in `id_range`."""
+    return [
+        {'$match': {'_id': id_range}},
+        {'$unwind': '$quantitativePrecipitation'},
+        {'$project': {
+            '_id': 0,
+            'city': 1,
+            'updateTime': 1,
+            'timeZone': 1,
+            'validTime': '$quantitativePrecipitation.validTime',
+            'value': '$quantitativePrecipitation.value',
+        }},
+    ]
+
+def hourly_daily_statistics(frame):
+    """Per (city, updateTime, local date): temperature range, max wind and max precipitation probability."""
+    frame = frame.dropna(subset=['time'])
+    # startTime is stored in the city's local time, so its first ten characters are the local date
+    frame = frame.assign(date=frame['time'].astype(str).str[:10],
+                         temperature=pd.to_numeric(frame['temperature'], errors='coerce'),
+                         precipitationProbability=pd.to_numeric(frame['precipitationProbability'], errors='coerce'),
+                         # A forecast of "10 to 15 mph" counts as 15
+                         windSpeed=wind_speed_bounds(frame)[1])
+    grouped = frame.groupby(['city', 'updateTime', 'date'], sort=False)
+    return grouped.agg(temperatureMin=('temperature', 'min'), temperatureMax=('temperature', 'max'),
+                       windSpeedMax=('windSpeed', 'max'),
+                       precipitationProbabilityMax=('precipitationProbability', 'max'),
+                       hours=('time', 'size')).reset_index()
+
+def quantitative_daily_totals(frame):
+    """Per (city, updateTime, local date): total precipitation, spreading each interval over its hours."""
+    frame = frame.dropna(subset=['validTime']).reset_index(drop=True)
+    start, duration = split_valid_times(frame['validTime'].to_numpy(dtype=str))
+    value = pd.to_numeric(frame['value'], errors='coerce').to_numpy(dtype=np.float64)
+    index, times, amounts = expand_hourly(start, duration, value, accumulated=True)
+    hours = frame.iloc[index].reset_index(drop=True).assign(precipitation=amounts)
+    utc = pd.DatetimeIndex(times, tz='UTC')
+    hours['date'] = ''
+    for tz_name, rows in hours.groupby(hours['timeZone'].fillna('UTC')).groups.items():
+        hours.loc[rows, 'date'] = utc[rows].tz_convert(tz_name).strftime('%Y-%m-%d')
+    grouped = hours.groupby(['city', 'updateTime', 'date'], sort=False)
+    return grouped.agg(precipitation=('precipitation', 'sum'), precipitationHours=('precipitation', 'size')).reset_index()
+
+def observation_daily_statistics(frame):
+    """Per (station, UTC date): temperature range (degC), max wind speed (km/h) and minimum relative humidity."""
+    frame = frame.dropna(subset=['id', 'timestamp'])
+    frame = frame.assign(station=frame['id'], date=frame['timestamp'].astype(str).str[:10])
+    for column in ['temperatureValue', 'windSpeedValue', 'relativeHumidityValue']:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    grouped = frame.groupby(['station', 'date'], sort=False)
+    return grouped.agg(temperatureMin=('temperatureValue', 'min'), temperatureMax=('temperatureValue', 'max'),
+                       windSpeedMax=('windSpeedValue', 'max'),
+                       relativeHumidityMin=('relativeHumidityValue', 'min')).reset_index()
+
+def present(row, fields):
+    """{field: value} for the fields of `row` that hold a number."""
+    return {field: float(row[field]) for field in fields if pd.notna(row[field])}
+
+def envelope_updates(stats, keys, fields, latest_fields, issuance_field):
+    """Upserts setting each key's newest issuance and widening the Low/High envelopes of `fields`.
+
+    Every operator used ($set of the newest values, $min, $max) gives the same result when a batch
+    is applied twice, so a crash between storing the summaries and moving the watermark is harmless.
+    """
+    if stats.empty:
+        return []
+    keys = list(keys)
+    stats = stats.sort_values(issuance_field)
+    low = stats.groupby(keys)[fields].min()
+    high = stats.groupby(keys)[fields].max()
+    latest = stats.groupby(keys).tail(1).set_index(keys)
+    updates = []
+    for key, row in latest.iterrows():
+        key = key if isinstance(key, tuple) else (key,)
+        update = {'$set': dict(present(row, fields + latest_fields), **{issuance_field: row[issuance_field]})}
+        lows = present(low.loc[key], fields)
+        highs = present(high.loc[key], fields)
+        if lows:
+            update['$min'] = {f"{field}Low": value for field, value in lows.items()}
+            update['$max'] = {f"{field}High": value for field, value in highs.items()}
+        updates.append(UpdateOne(dict(zip(keys, key)), update, upsert=True))
+    return updates
+
+def observation_updates(stats):
+    """Upserts widening each (station, date) summary with a batch of observations."""
+    updates = []
+    for row in stats.itertuples(index=False):
+        update = {}
+        minimums = present(row._asdict(), ['temperatureMin', 'relativeHumidityMin'])
+        maximums = present(row._asdict(), ['temperatureMax', 'windSpeedMax'])
+        if minimums:
+            update['$min'] = minimums
+        if maximums:
+            update['$max'] = maximums
+        if update:
+            updates.append(UpdateOne({'station': row.station, 'date': row.date}, update, upsert=True))
+    return updates
+
+def read_hourly(db, id_range):
+    frame = pd.DataFrame(list(db['Hourlyforecasts'].aggregate(hourly_summary_pipeline(id_range))))
+    return frame.reindex(columns=['city', 'updateTime', 'time', 'temperature', 'precipitationProbability',
+                                  'windSpeedMax', 'windSpeed'])
+
+def summarize_hourly(frame):
+    return envelope_updates(hourly_daily_statistics(frame), SUMMARY_KEYS, HOURLY_STATISTICS, ['hours'], 'updateTime')
+
+def read_quantitative(db, id_range):
+    frame = pd.DataFrame(list(db['quantitativeForecasts'].aggregate(quantitative_summary_pipeline(id_range))))
+    return frame.reindex(columns=['city', 'updateTime', 'timeZone', 'validTime', 'value'])
+
+def summarize_quantitative(frame):
+    # The quantitative issuance is tracked apart from the hourly one that fills the other fields
+    totals = quantitative_daily_totals(frame).rename(columns={'updateTime': 'quantitativeUpdateTime'})
+    return envelope_updates(totals, SUMMARY_KEYS, QUANTITATIVE_STATISTICS, ['precipitationHours'],
+                            'quantitativeUpdateTime')
+
+def read_observations(db, id_range):
+    columns = ['id', 'timestamp', 'temperatureValue', 'windSpeedValue', 'relativeHumidityValue']
+    rows = db['observations'].find({'_id': id_range}, projection=dict.fromkeys(columns, 1) | {'_id': 0})
+    return pd.DataFrame(list(rows)).reindex(columns=columns)
+
+def summarize_observations(frame):
+    return observation_updates(observation_daily_statistics(frame))
+
+# Source collection -> (reader, summarizer, summary collection)
+SOURCES = {
+    'Hourlyforecasts': (read_hourly, summarize_hourly, SUMMARY_COLLECTION),
+    'quantitativeForecasts': (read_quantitative, summarize_quantitative, SUMMARY_COLLECTION),
+    'observations': (read_observations, summarize_observations, OBSERVATION_SUMMARY_COLLECTION),
+}
+
+def next_batch(db, source, state):
+    """The _id range, last _id and size of the next batch of `source` documents after the watermark."""
+    query = {'_id': {'$gt': state['lastId']}} if state.get('lastId') else {}
+    ids = [document['_id'] for document in
+           db[source].find(query, projection={'_id': 1}).sort('_id', 1).limit(BATCH_DOCUMENTS)]
+    if not ids:
+        return None
+    return dict(query.get('_id', {}), **{'$lte': ids[-1]}), ids[-1], len(ids)
+
+def summarize_source(db, source):
+    """Fold every document of `source` stored since the last update into its summaries."""
+    metrics = get_metrics()
+    read, summarize, target = SOURCES[source]
+    state = db[STATE_COLLECTION].find_one({'_id': source}) or {'_id': source}
+    documents = 0
+    while True:
+        batch = next_batch(db, source, state)
+        if batch is None:
+            break
+        id_range, last_id, size = batch
+        with metrics.stage('summary_read'):
+            frame = read(db, id_range)
+        with metrics.stage('summary_aggregate'):
+            updates = summarize(frame) if not frame.empty else []
+        if updates:
+            with metrics.stage('summary_write'):
+                db[target].bulk_write(updates, ordered=False)
+        # Move the watermark only once the batch's summaries are stored
+        state['lastId'] = last_id
+        db[STATE_COLLECTION].replace_one({'_id': source}, state, upsert=True)
+        documents += size
+        metrics.increment('summary_documents', size, source=source)
+        metrics.increment('summary_updates', len(updates), collection=target)
+    return documents
+
+def update_summaries(db=None, sources=tuple(SOURCES)):
+    """Bring the daily summaries up to date with everything stored so far; returns documents read per source."""
+    db = db if db is not None else get_database()
+    ensure_indexes(db[SUMMARY_COLLECTION], SUMMARY_KEYS)
+    ensure_indexes(db[OBSERVATION_SUMMARY_COLLECTION], OBSERVATION_SUMMARY_KEYS)
+    return {source: summarize_source(db, source) for source in sources}
+
+def load_daily_frame(db, cities):
+    """Daily forecast summaries of `cities`, one row per city and date, with 'time' as the date."""
+    statistics = HOURLY_STATISTICS + QUANTITATIVE_STATISTICS
+    columns = ['city', 'date'] + [f"{field}{suffix}" for field in statistics for suffix in ('', 'Low', 'High')]
+    frame = pd.DataFrame(list(db[SUMMARY_COLLECTION].find({'city': {'$in': list(cities)}},
+                                                         projection=dict.fromkeys(columns, 1) | {'_id': 0})))
+    if frame.empty:
+        return pd.DataFrame(columns=['time'] + columns)
+    frame = frame.reindex(columns=columns)
+    frame['time'] = pd.to_datetime(frame['date'])
+    frame['city'] = frame['city'].astype('category')
+    return frame.sort_values(['city', 'time'])
+
+def summary_update_times(db, cities):
+    """{city: sorted issuances} of the summaries, so a daily chart is redrawn when a summary changes."""
+    update_times = {}
+    for document in db[SUMMARY_COLLECTION].find({'city': {'$in': list(cities)}},
+                                                projection={'_id': 0, 'city': 1, 'updateTime': 1,
+                                                            'quantitativeUpdateTime': 1}):
+        issuances = update_times.setdefault(document['city'], set())
+        issuances.update(filter(None, [document.get('updateTime'), document.get('quantitativeUpdateTime')]))
+    return {city: sorted(issuances) for city, issuances in update_times.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the materialized daily summaries from stored forecasts and observations.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the summaries and rebuild them from all stored data")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    db = get_database()
+    if args.rebuild:
+        for name in [SUMMARY_COLLECTION, OBSERVATION_SUMMARY_COLLECTION, STATE_COLLECTION]:
+            db[name].drop()
+    started = time.perf_counter()
+    with profiled(args.profile, 'summaries'):
+        counts = update_summaries(db)
+    print(", ".join(f"{count} {source}" for source, count in counts.items()) +
+          f" documents summarized in {time.perf_counter() - started:.1f}s")
+    export_metrics('summaries', args)
@@ -0,0 +1,69 @@
+import pandas as pd
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+from pytz import utc
+
+from ForecastRecords import UNITS, HourlyRecords
+
+# Hourly forecasts stored as one row per (gridpoint, validTime) in a MongoDB time-series collection.
+# Units and issuance times live in the row metadata, which MongoDB stores once per bucket.
+SERIES_COLLECTION = 'hourly_forecast_series'
+PLACES_COLLECTION = 'hourly_forecast_places'
+
+def ensure_series_collection(db, name=SERIES_COLLECTION):
+    """Create the time-series collection (or a plain one on MongoDB < 5.0) and its indexes."""
+    if name not in db.list_collection_names():
+        try:
+            db.create_collection(name, timeseries={'timeField': 'validTime', 'metaField': 'meta',
+                                                   'granularity': 'hours'})
+        except (OperationFailure, CollectionInvalid, NotImplementedError):  # NotImplementedError: mongomock
+            print(f"Time-series collections unavailable, storing {name} as a regular collection")
+            db.create_collection(name)
+    collection = db[name]
+    collection.create_index([('meta.gridpoint', ASCENDING), ('validTime', ASCENDING)])
+    db[PLACES_COLLECTION].create_index('city', unique=True)
+    return collection
+
+def hourly_series_rows(gridpoint, properties, records=None):
+    """Turn an hourly forecast response into compact rows sharing a single metadata object."""
+    if records is None:
+        records = HourlyRecords.from_periods(properties.get('periods', []))
+    if not len(records):
+        return []
+
+    meta = {
+        'gridpoint': gridpoint,
+        'updateTime': properties.get('updateTime', ''),
+        'generatedAt': properties.get('generatedAt', ''),
+        'units': UNITS,
+    }
+    columns = zip(pd.DatetimeIndex(records.start, tz='UTC').to_pydatetime(),
+                  pd.DatetimeIndex(records.end, tz='UTC').to_pydatetime(), records.forecasts(utc))
+    return [{
+        'validTime': start,
+        'endTime': end,
+        'meta': meta,
+        'isDaytime': period['isDaytime'],
+        'temperature': period['temperature'],
+        'probOfPrecipitation': period['probOfPrecipitationValue'],
+        'dewpoint': period['dewpointValue'],
+        'relativeHumidity': period['relativeHumidityValue'],
+        'windSpeedMin': period['windSpeedMin'],
+        'windSpeedMax': period['windSpeedMax'],
+        'windDirection': period['windDirection'],
+        'forecast': period['forecast'],
+    } for start, end, period in columns]
+
+def series_already_stored(collection, gridpoint, update_time):
+    """True when this gridpoint's issuance is already in the series collection."""
+    return collection.find_one({'meta.gridpoint': gridpoint, 'meta.updateTime': update_time},
+                               projection={'_id': 1}) is not None
+
+def save_places(db, places):
+    """Record which gridpoint and timezone each city reads from; `places` holds (city, gridpoint, tz_name)."""
+    if not places:
+        return
+    db[PLACES_COLLECTION].bulk_write([
+        UpdateOne({'city': city}, {'$set': {'gridpoint': gridpoint, 'timeZone': tz_name}}, upsert=True)
+        for city, gridpoint, tz_name in places
+    ], ordered=False)
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from functools import lru_cache
+
+from pytz import timezone
+
+from Metrics import get_metrics
+
+# A place's timezone never changes, so lookups are cached on disk by coordinates and by grid cell.
+# TimezoneFinder is only constructed when a lookup misses the cache.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(script_dir, ".."))
+timezone_cache_file_path = os.path.join(parent_dir, "Cache", "timezones.json")
+
+COORDINATE_PRECISION = 4  # ~11 m, far finer than any timezone boundary we care about
+
+@lru_cache(maxsize=None)
+def get_timezone(tz_name):
+    """Memoized pytz.timezone, so periods are converted without re-resolving the zone each time."""
+    return timezone(tz_name)
+
+
+class TimezoneCache:
+    """Persistent (lat, lon) / gridpoint -> timezone name lookup."""
+
+    def __init__(self, path=timezone_cache_file_path):
+        self.path = path
+        self.finder = None
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def coordinate_key(lat, lon):
+        return f"{round(float(lat), COORDINATE_PRECISION)},{round(float(lon), COORDINATE_PRECISION)}"
+
+    def lookup(self, lat, lon, gridpoint=None):
+        """Return the timezone name for a point, falling back to UTC like the original helper."""
+        key = self.coordinate_key(lat, lon)
+        with self.lock:
+            tz_name = self.entries.get(key) or (self.entries.get(gridpoint) if gridpoint else None)
+            metrics = get_metrics()
+            if tz_name:
+                self.stats["hits"] += 1
+                metrics.increment("timezone_lookups", result="hit")
+                return tz_name
+
+            self.stats["misses"] += 1
+            metrics.increment("timezone_lookups", result="miss")
+            if self.finder is None:
+                with metrics.stage("timezone_finder_init"):
+                    from timezonefinder import TimezoneFinder
+                    self.finder = TimezoneFinder()
+            with metrics.stage("timezone_lookup_miss"):
+                tz_name = self.finder.timezone_at(lng=float(lon), lat=float(lat)) or 'UTC'
+            self.entries[key] = tz_name
+            if gridpoint:
+                self.entries.setdefault(gridpoint, tz_name)
+            self.dirty = True
+            return tz_name
+
+    def merge(self, entries):
+        """Add entries looked up by another process; they are written on the next save."""
+        with self.lock:
+            new = {key: tz_name for key, tz_name in entries.items() if key not in self.entries}
+            self.entries.update(new)
+            self.dirty = self.dirty or bool(new)
+
+    def save(self):
+        """Write new entries back to disk."""
+        if not self.path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self.lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+
+_cache = None
+
+def get_timezone_cache():
+    """Return the process-wide TimezoneCache, loading it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = TimezoneCache()
+    return _cache
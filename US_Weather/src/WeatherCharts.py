@@ -1,13 +1,18 @@
-import matplotlib.pyplot as plt
-import pandas as pd
+import argparse
+import hashlib
+import json
 import os
-from pymongo import MongoClient
-from datetime import datetime, timedelta
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['weather_database']
+import matplotlib
+
+from Catalog import load_places
+from ChartData import load_hourly_frame, load_quantitative_frame, split_by_city, update_times_by_city
+from Metrics import add_metrics_arguments, export_metrics, get_metrics, profiled
+from MongoWriter import get_database
+from Summaries import load_daily_frame, summary_update_times, update_summaries
 
 # Define cities to filter
 cities = ["New York city, New York", "Buffalo city, New York", "Rochester city, New York"]
@@ -15,142 +20,217 @@ cities = ["New York city, New York", "Buffalo city, New York", "Rochester city,
 # Define image directory to save plots
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))  # Get parent folder
 img_dir = os.path.join(parent_dir, "img")
-os.makedirs(img_dir, exist_ok=True)
-
-# Fetch data from Hourly Forecasts
-hourly_collection = db['Hourlyforecasts']  # Corrected dataset name
-hourly_data = list(hourly_collection.find({"city": {"$in": cities}}))
-
-def parse_wind_speed(wind_speed_str):
-    """Extract numeric wind speed from string."""
-    if isinstance(wind_speed_str, str):
-        match = re.search(r'\d+', wind_speed_str)
-        return int(match.group()) if match else None
-    return None
-
-# Process Hourly Forecast Data
-temp_data = []
-precip_data = []
-wind_data = []
-forecasttext = []
-
-for entry in hourly_data:
-    city = entry.get('city', 'Unknown')
-    if 'forecasts' not in entry:
-        print(f"No forecasts found for {city}")
-        continue
-    for forecast in entry['forecasts']:
-        try:
-            timestamp = datetime.fromisoformat(forecast['startTime'])
-            temp_data.append({'time': timestamp, 'city': city, 'temperature': forecast.get('temperature', None)})
-            precip_data.append({'time': timestamp, 'city': city, 'precipitation': forecast.get('probOfPrecipitationValue', None)})
-            wind_data.append({'time': timestamp, 'city': city, 'windSpeed': parse_wind_speed(forecast.get('windSpeed', ''))})
-            forecasttext.append({'time': timestamp, 'city': city, 'Forecast': forecast.get('forecast', '')})
-        except Exception as e:
-            print(f"Error processing forecast data for {city}: {e}")
-
-# Convert to DataFrame
-temp_df = pd.DataFrame(temp_data)
-precip_df = pd.DataFrame(precip_data)
-wind_df = pd.DataFrame(wind_data)
-forecast_df = pd.DataFrame(forecasttext)
-
-# Fetch data from Quantitative Forecasts
-quantitative_collection = db['quantitativeForecasts']
-quantitative_data = list(quantitative_collection.find({"city": {"$in": cities}}))
-
-# Process Quantitative Precipitation Data
-quant_precip_data = []
-for entry in quantitative_data:
-    city = entry.get('city', 'Unknown')
-    for precip in entry.get('quantitativePrecipitation', []):
-        try:
-            timestamp = datetime.fromisoformat(precip['validTime'].split('/')[0])
-            quant_precip_data.append({'time': timestamp, 'city': city, 'precipitation': precip['value']})
-        except Exception as e:
-            print(f"Error processing quantitative precipitation data for {city}: {e}")
-
-# Convert to DataFrame
-quant_precip_df = pd.DataFrame(quant_precip_data)
-
-def save_plot(fig, filename):
+
+# Records the data fingerprint each chart was last drawn from, so unchanged charts are skipped
+manifest_path = os.path.join(img_dir, "chart_manifest.json")
+
+# Where hourly forecasts are read from by default: "documents" (Hourlyforecasts) or "timeseries" (hourly_forecast_series)
+HOURLY_SOURCES = ["documents", "timeseries"]
+hourly_source = "documents"
+
+# Chart name -> (data source, column, y label, title, file name, plot kind)
+CHARTS = {
+    'temperature': ('hourly', 'temperature', "Temperature (°F)", "Temperature Evolution Over Hours",
+                    "temperature_evolution.png", 'plot'),
+    # NOAA forecasts wind as a range ("10 to 15 mph"): the upper speed, shaded down to the lower one
+    'windSpeed': ('hourly', 'windSpeed', "Wind Speed (mph)", "Wind Speed Evolution Over Hours",
+                  "wind_speed_evolution.png", 'range'),
+    'precipitationProbability': ('hourly', 'precipitation', "Precipitation Probability (%)",
+                                 "Precipitation Probability Over Hours", "precipitation_probability.png", 'plot'),
+    'forecast': ('hourly', 'Forecast', "Forecast", "Forecast Over Hours", "forecast_over_time.png", 'scatter'),
+    'quantitativePrecipitation': ('quantitative', 'precipitation', "Precipitation (mm)",
+                                  "Quantitative Precipitation Over Time", "quantitative_precipitation.png", 'plot'),
+    # Read from the daily summaries: the newest issuance, shaded between its lowest and highest issuance
+    'dailyTemperatureMax': ('daily', 'temperatureMax', "Daily High (°F)", "Forecast Daily High Temperature",
+                            "daily_temperature_max.png", 'band'),
+    'dailyTemperatureMin': ('daily', 'temperatureMin', "Daily Low (°F)", "Forecast Daily Low Temperature",
+                            "daily_temperature_min.png", 'band'),
+    'dailyWindSpeedMax': ('daily', 'windSpeedMax', "Max Wind Speed (mph)", "Forecast Daily Maximum Wind Speed",
+                          "daily_wind_speed_max.png", 'band'),
+    'dailyPrecipitationProbability': ('daily', 'precipitationProbabilityMax', "Max Precipitation Probability (%)",
+                                      "Forecast Daily Maximum Precipitation Probability",
+                                      "daily_precipitation_probability.png", 'band'),
+    'dailyPrecipitation': ('daily', 'precipitation', "Precipitation (mm)", "Forecast Daily Precipitation",
+                           "daily_precipitation.png", 'band'),
+}
+
+def city_slug(city):
+    """Turn 'New York city, New York' into a file-system friendly 'New_York_city_New_York'."""
+    return re.sub(r'[^A-Za-z0-9]+', '_', city).strip('_')
+
+def load_state_cities(sheet_name):
+    """Read every place name from one state sheet of the places catalog."""
+    df = load_places(sheet_name, ['NAME.1'])
+    return df['NAME.1'].dropna().unique().tolist()
+
+def save_plot(fig, filepath):
     """Save the plot to the img directory."""
-    filepath = os.path.join(img_dir, filename)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
     fig.tight_layout()  # Ensure all plot elements fit correctly
     fig.savefig(filepath, bbox_inches='tight')
     print(f"Saved plot: {filepath}")
 
-# Plot Temperature Evolution
-fig = plt.figure(figsize=(12, 6))
-for city in cities:
-    city_data = temp_df[temp_df['city'] == city]
-    if not city_data.empty:
-        plt.plot(city_data['time'], city_data['temperature'], label=city)
-plt.xlabel("Time")
-plt.ylabel("Temperature (°F)")
-plt.title("Temperature Evolution Over Hours")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid()
-save_plot(fig, "temperature_evolution.png")
-plt.show()
-
-# Plot Wind Speed Evolution
-fig = plt.figure(figsize=(12, 6))
-for city in cities:
-    city_data = wind_df[wind_df['city'] == city]
-    if not city_data.empty:
-        plt.plot(city_data['time'], city_data['windSpeed'], label=city)
-plt.xlabel("Time")
-plt.ylabel("Wind Speed (mph)")
-plt.title("Wind Speed Evolution Over Hours")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid()
-save_plot(fig, "wind_speed_evolution.png")
-plt.show()
-
-# Plot Precipitation Probability
-fig = plt.figure(figsize=(12, 6))
-for city in cities:
-    city_data = precip_df[precip_df['city'] == city]
-    if not city_data.empty:
-        plt.plot(city_data['time'], city_data['precipitation'], label=city)
-plt.xlabel("Time")
-plt.ylabel("Precipitation Probability (%)")
-plt.title("Precipitation Probability Over Hours")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid()
-save_plot(fig, "precipitation_probability.png")
-plt.show()
-
-# Plot Cloud Cover
-fig = plt.figure(figsize=(12, 6))
-for city in cities:
-    city_data = forecast_df[forecast_df['city'] == city]
-    if not city_data.empty:
-        plt.scatter(city_data['time'], city_data['Forecast'], label=city)
-plt.xlabel("Time")
-plt.ylabel("Forecast")
-plt.title("Forecast Over Hours")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid()
-save_plot(fig, "forecast_over_time.png")
-plt.show()
-
-# Plot Quantitative Precipitation Over Time
-fig = plt.figure(figsize=(12, 6))
-for city in cities:
-    city_data = quant_precip_df[quant_precip_df['city'] == city]
-    if not city_data.empty:
-        plt.plot(city_data['time'], city_data['precipitation'], label=city)
-plt.xlabel("Time")
-plt.ylabel("Precipitation (mm)")
-plt.title("Quantitative Precipitation Over Time")
-plt.legend()
-plt.xticks(rotation=45)
-plt.grid()
-save_plot(fig, "quantitative_precipitation.png")
-plt.show()
+def render_chart(chart, filepath, data_by_city, show=False):
+    """Draw one chart with a line (or scatter) per city and save it."""
+    import matplotlib.pyplot as plt
+
+    source, column, ylabel, title, filename, kind = CHARTS[chart]
+    fig = plt.figure(figsize=(12, 6))
+    draw = plt.scatter if kind == 'scatter' else plt.plot
+    for city, city_data in data_by_city.items():
+        if kind == 'band':
+            line, = plt.plot(city_data['time'], city_data[column], marker='o', label=city)
+            plt.fill_between(city_data['time'], city_data[f"{column}Low"].astype(float),
+                             city_data[f"{column}High"].astype(float), color=line.get_color(), alpha=0.2)
+        elif kind == 'range':
+            line, = plt.plot(city_data['time'], city_data[f"{column}Max"], label=city)
+            plt.fill_between(city_data['time'], city_data[f"{column}Min"].astype(float),
+                             city_data[f"{column}Max"].astype(float), color=line.get_color(), alpha=0.2)
+        else:
+            draw(city_data['time'], city_data[column], label=city)
+    plt.xlabel("Time")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.xticks(rotation=45)
+    plt.grid()
+    save_plot(fig, filepath)
+    if show:
+        plt.show()
+    plt.close(fig)
+    return filepath
+
+def timed_render(chart, filepath, data_by_city, show=False):
+    """render_chart returning its duration, so renders in worker processes are timed too."""
+    started = time.perf_counter()
+    render_chart(chart, filepath, data_by_city, show)
+    return time.perf_counter() - started
+
+def plan_charts(selected_cities, per_city, chart_names=None):
+    """List (chart, filepath, cities) jobs: one chart per metric, or per metric and city."""
+    charts = [(chart, CHARTS[chart]) for chart in (chart_names or CHARTS)]
+    if not per_city:
+        return [(chart, os.path.join(img_dir, spec[4]), list(selected_cities)) for chart, spec in charts]
+    return [(chart, os.path.join(img_dir, "cities", city_slug(city), spec[4]), [city])
+            for city in selected_cities for chart, spec in charts]
+
+def chart_fingerprint(chart, job_cities, update_times):
+    """Hash the updateTimes of every issuance a chart draws from."""
+    payload = json.dumps([chart, [[city, update_times.get(city, [])] for city in job_cities]])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def load_manifest():
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest):
+    os.makedirs(img_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render forecast charts from MongoDB.")
+    parser.add_argument("--cities", nargs="+", help="Cities to chart (defaults to the built-in list)")
+    parser.add_argument("--state", help="Chart every place in this sheet of WeatherStationDatabase.xlsx")
+    parser.add_argument("--per-city", action="store_true", help="Render one chart per city and metric")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Rendering processes")
+    parser.add_argument("--charts", nargs="+", choices=list(CHARTS), default=list(CHARTS),
+                        help="Charts to draw; the daily* charts only read the small daily summaries")
+    parser.add_argument("--force", action="store_true", help="Redraw charts even if their data is unchanged")
+    parser.add_argument("--show", action="store_true", help="Open each chart in a window (interactive)")
+    parser.add_argument("--hourly-source", choices=HOURLY_SOURCES, default=hourly_source,
+                        help="Read hourly forecasts from the documents or the time-series collection")
+    parser.add_argument("--update-summaries", action="store_true",
+                        help="Fold newly stored forecasts into the daily summaries before charting (writes to MongoDB)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = get_metrics()
+
+    # Headless by default so the renderer runs on a schedule without a display
+    if not args.show:
+        matplotlib.use("Agg")
+
+    selected_cities = args.cities or (load_state_cities(args.state) if args.state else cities)
+    db = get_database()
+
+    sources = {CHARTS[chart][0] for chart in args.charts}
+    if 'daily' in sources and args.update_summaries:
+        # The ingest scripts keep the summaries current; this catches up after storing by other means
+        update_summaries(db, ['Hourlyforecasts', 'quantitativeForecasts'])
+
+    # Decide which charts are stale before loading any forecast data
+    with metrics.stage('chart_plan'):
+        update_times = {}
+        if 'hourly' in sources:
+            update_times['hourly'] = update_times_by_city(db, selected_cities, source=args.hourly_source)
+        if 'quantitative' in sources:
+            update_times['quantitative'] = update_times_by_city(db, selected_cities,
+                                                                collection_name='quantitativeForecasts')
+        if 'daily' in sources:
+            update_times['daily'] = summary_update_times(db, selected_cities)
+    manifest = load_manifest()
+    jobs = []
+    skipped = 0
+    for chart, filepath, job_cities in plan_charts(selected_cities, args.per_city, args.charts):
+        source = CHARTS[chart][0]
+        if not any(update_times[source].get(city) for city in job_cities):
+            continue
+        fingerprint = chart_fingerprint(chart, job_cities, update_times[source])
+        key = os.path.relpath(filepath, img_dir)
+        if not args.force and manifest.get(key) == fingerprint and os.path.exists(filepath):
+            skipped += 1
+            continue
+        jobs.append((chart, filepath, job_cities, key, fingerprint))
+
+    # Load data only for the cities that appear in a stale chart
+    stale = {'hourly': set(), 'quantitative': set(), 'daily': set()}
+    for chart, filepath, job_cities, key, fingerprint in jobs:
+        stale[CHARTS[chart][0]].update(job_cities)
+    data = {'hourly': {}, 'quantitative': {}, 'daily': {}}
+    if stale['hourly']:
+        hourly_cities = [city for city in selected_cities if city in stale['hourly']]
+        with metrics.stage('chart_data'):
+            data['hourly'] = split_by_city(load_hourly_frame(db, hourly_cities, source=args.hourly_source), hourly_cities)
+    if stale['quantitative']:
+        quantitative_cities = [city for city in selected_cities if city in stale['quantitative']]
+        with metrics.stage('chart_data'):
+            data['quantitative'] = split_by_city(load_quantitative_frame(db, quantitative_cities), quantitative_cities)
+    if stale['daily']:
+        daily_cities = [city for city in selected_cities if city in stale['daily']]
+        with metrics.stage('chart_data'):
+            data['daily'] = split_by_city(load_daily_frame(db, daily_cities), daily_cities)
+
+    def job_data(chart, job_cities):
+        by_city = data[CHARTS[chart][0]]
+        return {city: by_city[city] for city in job_cities if city in by_city}
+
+    if args.show or args.workers <= 1:
+        with profiled(args.profile, 'charts'):
+            for chart, filepath, job_cities, key, fingerprint in jobs:
+                metrics.observe('chart_render', timed_render(chart, filepath, job_data(chart, job_cities), show=args.show))
+                metrics.increment('charts', result='rendered')
+                manifest[key] = fingerprint
+    else:
+        # cProfile only sees this process; use --workers 1 to profile the rendering itself
+        with profiled(args.profile, 'charts'), ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(timed_render, chart, filepath, job_data(chart, job_cities)): (key, fingerprint)
+                       for chart, filepath, job_cities, key, fingerprint in jobs}
+            for future in as_completed(futures):
+                key, fingerprint = futures[future]
+                try:
+                    metrics.observe('chart_render', future.result())
+                    metrics.increment('charts', result='rendered')
+                    manifest[key] = fingerprint
+                except Exception as e:
+                    metrics.increment('charts', result='error')
+                    print(f"Error rendering {key}: {e}")
+
+    save_manifest(manifest)
+    metrics.increment('charts', skipped, result='unchanged')
+    print(f"Rendered {len(jobs)} charts, skipped {skipped} unchanged")
+    export_metrics('charts', args)
+
+if __name__ == "__main__":
+    main()
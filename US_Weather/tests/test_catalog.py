@@ -0,0 +1,44 @@
+import pandas as pd
+
+import Catalog
+from BuildCatalog import build_catalog
+
+# The SQLite catalog and its fallback to the workbooks
+
+def write_stations(path):
+    pd.DataFrame({'stationIdentifier': ['KNYC', 'KBUF'], 'latitude': [40.78, 42.94],
+                  'longitude': [-73.97, -78.74]}).to_excel(path, index=False)
+
+def write_places(path):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'NAME.1': ['New York city, New York'], 'gridId': ['OKX']}).to_excel(
+            writer, sheet_name='NewYork', index=False)
+        pd.DataFrame({'NAME.1': ['Newark city, New Jersey'], 'gridId': ['OKX']}).to_excel(
+            writer, sheet_name='NewJersey', index=False)
+
+def test_places_come_from_the_catalog(tmp_path):
+    places_path, stations_path = tmp_path / "places.xlsx", tmp_path / "stations.xlsx"
+    write_places(places_path)
+    write_stations(stations_path)
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    build_catalog(catalog_path, str(places_path), str(stations_path), str(tmp_path / "missing.xlsx"))
+
+    assert Catalog.has_table('places', catalog_path)
+    assert Catalog.load_places('NewJersey', ['NAME.1'], catalog_path)['NAME.1'].tolist() == ['Newark city, New Jersey']
+    assert sorted(Catalog.load_place_states(catalog_path)) == ['NewJersey', 'NewYork']
+    assert len(Catalog.load_stations(['stationIdentifier'], path=catalog_path)) == 2
+
+def test_catalog_without_places_falls_back_to_the_workbook(tmp_path, monkeypatch):
+    stations_path = tmp_path / "stations.xlsx"
+    write_stations(stations_path)
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    # Built before the places workbook existed: the catalog only has stations
+    build_catalog(catalog_path, str(tmp_path / "missing.xlsx"), str(stations_path), str(tmp_path / "missing.xlsx"))
+    assert not Catalog.has_table('places', catalog_path)
+
+    places_path = tmp_path / "places.xlsx"
+    write_places(places_path)
+    monkeypatch.setattr(Catalog, 'places_file_path', str(places_path))
+    assert Catalog.load_places('NewYork', ['NAME.1'], catalog_path)['NAME.1'].tolist() == ['New York city, New York']
+    assert sorted(Catalog.load_place_states(catalog_path)) == ['NewJersey', 'NewYork']
+    assert sorted(Catalog.load_stations(['stationIdentifier'], path=catalog_path)['stationIdentifier']) == ['KBUF', 'KNYC']
@@ -0,0 +1,50 @@
+import json
+
+from NoaaClient import NoaaClient
+from StubServer import StubServer
+
+# Pooled keep-alive connections and ETag validators of NoaaClient against the local stub
+
+def forecast_urls(server, count=10):
+    return [f"{server.base_url}/gridpoints/OKX/{x},37/forecast/hourly" for x in range(count)]
+
+def test_requests_share_one_pooled_connection():
+    with StubServer(latency=0) as server:
+        client = NoaaClient(validators_path=None)
+        responses = [client.get(url) for url in forecast_urls(server)]
+    assert [response.status_code for response in responses] == [200] * 10
+    assert server.request_count == 10
+    assert server.connection_count == 1
+
+def test_validators_are_saved_and_the_next_run_gets_304s(tmp_path):
+    validators_path = str(tmp_path / "Cache" / "http_validators.json")
+    with StubServer(latency=0) as server:
+        urls = forecast_urls(server)
+        client = NoaaClient(validators_path=validators_path)
+        for url in urls:
+            client.get(url)
+        client.save_validators()
+
+        with open(validators_path) as f:
+            saved = json.load(f)
+        assert sorted(saved) == sorted(urls)
+        assert all(validator["etag"] for validator in saved.values())
+
+        # The next scheduled run, in a fresh process, loads the validators from disk
+        client = NoaaClient(validators_path=validators_path)
+        responses = [client.get(url) for url in urls]
+    assert [response.status_code for response in responses] == [304] * 10
+    assert all(response.content == b"" for response in responses)
+    assert server.not_modified_count == 10
+    assert client.stats["not_modified"] == 10
+    assert client.stats["bytes"] == 0
+
+def test_validators_from_this_run_are_not_sent_until_saved():
+    with StubServer(latency=0) as server:
+        url = forecast_urls(server, 1)[0]
+        client = NoaaClient(validators_path=None)
+        # Two cities in one grid cell fetch the same URL; the second must still get the payload
+        assert client.get(url).status_code == 200
+        assert client.get(url).status_code == 200
+        client.save_validators()
+        assert client.get(url).status_code == 304
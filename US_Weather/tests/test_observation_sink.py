@@ -0,0 +1,96 @@
+import csv
+
+import pandas as pd
+
+from LatestObservationbyUSStationALL import iter_observations
+from NoaaClient import NoaaClient
+from ObservationSink import ObservationSink
+from StubServer import StubServer
+
+# Chunked CSV writes, checkpoints and resuming an interrupted observation sweep
+
+STATIONS = [f"K{i:03d}" for i in range(7)]
+
+def make_sink(tmp_path, chunk_size=2, resume=True):
+    return ObservationSink(str(tmp_path / "observations" / "Observations.csv"),
+                           str(tmp_path / "Cache" / "observation_checkpoint.txt"), chunk_size, resume=resume)
+
+def csv_ids(sink):
+    with open(sink.path, newline='', encoding='utf-8') as f:
+        return [row['id'] for row in csv.DictReader(f)]
+
+def checkpointed(sink):
+    with open(sink.checkpoint_path, encoding='utf-8') as f:
+        return [line.strip() for line in f]
+
+def sweep(sink, station_ids, server, stop_after=None):
+    """Feed observations from the stub into `sink`, stopping without finish() after `stop_after` stations."""
+    client = NoaaClient(validators_path=None)
+    remaining = [station_id for station_id in station_ids if station_id not in sink.completed]
+    for count, (station_id, row) in enumerate(iter_observations(remaining, max_workers=2, requests_per_second=1000,
+                                                                base_url=server.base_url + "/stations",
+                                                                client=client), 1):
+        sink.add(station_id, row)
+        if count == stop_after:
+            return
+    sink.finish()
+
+def test_rows_are_written_and_checkpointed_a_chunk_at_a_time(tmp_path):
+    sink = make_sink(tmp_path)
+    sink.add("K000", {'id': "K000", 'temperatureValue': 1.0})
+    sink.add("K001")  # failed station: checkpointed, no row
+    assert csv_ids(sink) == ["K000"]
+    assert checkpointed(sink) == ["K000", "K001"]
+
+    sink.add("K002", {'id': "K002", 'temperatureValue': 2.0})
+    # Not a full chunk yet
+    assert csv_ids(sink) == ["K000"]
+    sink.finish()
+    assert csv_ids(sink) == ["K000", "K002"]
+    assert sink.written == 2
+    # A completed sweep drops its checkpoint
+    assert not (tmp_path / "Cache" / "observation_checkpoint.txt").exists()
+
+def test_interrupted_sweep_resumes_without_losing_or_repeating_stations(tmp_path):
+    with StubServer(latency=0) as server:
+        sink = make_sink(tmp_path)
+        sweep(sink, STATIONS, server, stop_after=5)
+        # Two full chunks reached disk; the fifth station was still buffered when the sweep stopped
+        assert len(sink.completed) == 4
+        assert sorted(csv_ids(sink)) == sorted(sink.completed)
+
+        resumed = make_sink(tmp_path)
+        assert resumed.completed == sink.completed
+        requests_before = server.request_count
+        sweep(resumed, STATIONS, server)
+        assert server.request_count - requests_before == len(STATIONS) - 4
+
+    assert sorted(csv_ids(resumed)) == STATIONS
+
+def test_restart_ignores_the_checkpoint(tmp_path):
+    with StubServer(latency=0) as server:
+        sweep(make_sink(tmp_path), STATIONS, server, stop_after=5)
+        restarted = make_sink(tmp_path, resume=False)
+        assert restarted.completed == set()
+        assert not (tmp_path / "observations" / "Observations.csv").exists()
+        sweep(restarted, STATIONS, server)
+    assert sorted(csv_ids(restarted)) == STATIONS
+
+def test_export_keeps_the_last_row_of_a_repeated_station(tmp_path):
+    sink = make_sink(tmp_path, chunk_size=1)
+    sink.add("K000", {'id': "K000", 'temperatureValue': 1.0})
+    # Crash between the CSV append and the checkpoint write: the row is on disk, the station is not done
+    sink.rows = [{'id': "K001", 'temperatureValue': 2.0}]
+    sink.flush()
+
+    resumed = make_sink(tmp_path, chunk_size=1)
+    assert resumed.completed == {"K000"}
+    resumed.add("K001", {'id': "K001", 'temperatureValue': 3.0})
+    resumed.finish()
+    assert csv_ids(resumed) == ["K000", "K001", "K001"]
+
+    excel_path = tmp_path / "observations" / "Observations.xlsx"
+    resumed.export_excel(str(excel_path))
+    exported = pd.read_excel(excel_path)
+    assert exported['id'].tolist() == ["K000", "K001"]
+    assert exported['temperatureValue'].tolist() == [1.0, 3.0]
@@ -0,0 +1,43 @@
+import os
+
+from NoaaClient import NoaaClient
+from Replay import FixtureRecorder, ReplayServer, fixture_path
+from StubServer import StubServer
+
+# Recording responses as fixtures and replaying them offline
+
+URL_PATHS = ["/gridpoints/OKX/33,37/forecast/hourly", "/stations/KNYC/observations/latest"]
+
+
+def test_recording_after_a_previous_run_saves_every_fixture(tmp_path):
+    validators_path = str(tmp_path / "Cache" / "http_validators.json")
+    fixtures_dir = str(tmp_path / "Fixtures")
+    with StubServer(latency=0) as server:
+        # An earlier scheduled run leaves validators behind
+        client = NoaaClient(validators_path=validators_path)
+        for path in URL_PATHS:
+            assert client.get(server.base_url + path).status_code == 200
+        client.save_validators()
+
+        recorder = FixtureRecorder(fixtures_dir)
+        client = NoaaClient(validators_path=validators_path, recorder=recorder)
+        for path in URL_PATHS:
+            assert client.get(server.base_url + path).status_code == 200
+        assert server.not_modified_count == 0
+
+    assert recorder.count == len(URL_PATHS)
+    for path in URL_PATHS:
+        assert os.path.getsize(fixture_path(fixtures_dir, path)) > 0
+
+def test_recorded_fixtures_are_replayed(tmp_path):
+    fixtures_dir = str(tmp_path / "Fixtures")
+    with StubServer(latency=0) as server:
+        recorded = NoaaClient(validators_path=None, recorder=FixtureRecorder(fixtures_dir)).get(
+            server.base_url + URL_PATHS[0])
+
+    with ReplayServer(fixtures_dir) as replay:
+        client = NoaaClient(validators_path=None)
+        assert client.get(replay.base_url + URL_PATHS[0]).content == recorded.content
+        assert client.get(replay.base_url + "/gridpoints/OKX/1,1/forecast").status_code == 404
+    assert replay.replayed_count == 1
+    assert replay.missing_count == 1
@@ -0,0 +1,130 @@
+import time
+
+import pytest
+
+from NoaaClient import NoaaClient
+from Resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from StubServer import StubServer
+
+# Retries and circuit breaking of NoaaClient against a local fault-injecting stub
+
+URL_PATH = "/gridpoints/OKX/33,37/forecast/hourly"
+
+
+class ScriptedServer(StubServer):
+    """StubServer whose first requests follow `script`: a status code to fail with, or 'timeout' to stall."""
+
+    def __init__(self, script=(), stall=1.0, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.script = list(script)
+        self.stall = stall
+
+    def should_fail(self, path):
+        with self.lock:
+            step = self.script.pop(0) if self.script else None
+        if step == 'timeout':
+            time.sleep(self.stall)
+            return False
+        if step is not None:
+            with self.lock:
+                self.fault_status = step
+                self.fault_count += 1
+            return True
+        return super().should_fail(path)
+
+    def handle_error(self, request, client_address):
+        # The client has already given up on stalled requests, so writing their response fails
+        pass
+
+
+def make_client(max_attempts=4, failure_threshold=5, reset_timeout=60.0):
+    return NoaaClient(validators_path=None, timeout=0.3,
+                      retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=5.0),
+                      breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout))
+
+def test_503_is_retried_until_it_succeeds():
+    with ScriptedServer([503, 503]) as server:
+        client = make_client()
+        response = client.get(server.base_url + URL_PATH, conditional=False)
+    assert response.status_code == 200
+    assert server.request_count == 3
+    assert client.stats["retries"] == 2
+
+def test_503_is_returned_after_the_last_attempt():
+    with ScriptedServer([503] * 3) as server:
+        response = make_client(max_attempts=3).get(server.base_url + URL_PATH, conditional=False)
+    assert response.status_code == 503
+    assert server.request_count == 3
+
+def test_429_waits_for_retry_after():
+    with ScriptedServer([429], retry_after=1) as server:
+        client = make_client()
+        started = time.monotonic()
+        response = client.get(server.base_url + URL_PATH, conditional=False)
+        elapsed = time.monotonic() - started
+    assert response.status_code == 200
+    assert server.request_count == 2
+    # Without Retry-After the back-off would be at most base_delay (0.01s)
+    assert elapsed >= 1.0
+
+def test_timeouts_are_retried():
+    with ScriptedServer(['timeout', 'timeout']) as server:
+        client = make_client()
+        response = client.get(server.base_url + URL_PATH, conditional=False)
+    assert response.status_code == 200
+    assert server.request_count == 3
+    assert client.stats["retries"] == 2
+
+def test_breaker_opens_after_consecutive_failures_and_rejects_requests():
+    with StubServer(latency=0, failing_offices=["OKX"], fault_status=500) as server:
+        client = make_client(max_attempts=1, failure_threshold=3)
+        for _ in range(3):
+            assert client.get(server.base_url + URL_PATH, conditional=False).status_code == 500
+        assert client.breaker.open_keys() == ["OKX"]
+
+        with pytest.raises(CircuitOpenError):
+            client.get(server.base_url + URL_PATH, conditional=False)
+        # Other offices are unaffected
+        assert client.get(server.base_url + "/gridpoints/BUF/1,2/forecast/hourly", conditional=False).status_code == 200
+    assert server.request_count == 4
+    assert client.stats["circuit_rejections"] == 1
+
+def test_failing_office_fails_every_gridpoints_endpoint():
+    with StubServer(latency=0, failing_offices=["OKX"], fault_status=500) as server:
+        client = make_client(max_attempts=1, failure_threshold=3)
+        for path in ("/gridpoints/OKX/33,37", "/gridpoints/OKX/33,37/forecast", "/gridpoints/OKX/33,37/forecast/hourly"):
+            assert client.get(server.base_url + path, conditional=False).status_code == 500
+        # Daily, hourly and raw-data failures all count towards the office's breaker
+        assert client.breaker.open_keys() == ["OKX"]
+        assert client.get(server.base_url + "/stations/KNYC/observations/latest", conditional=False).status_code == 200
+
+def test_breaker_half_opens_after_cooldown_and_closes_on_success():
+    with StubServer(latency=0, failing_offices=["OKX"], fault_status=500) as server:
+        client = make_client(max_attempts=1, failure_threshold=2, reset_timeout=0.2)
+        for _ in range(2):
+            client.get(server.base_url + URL_PATH, conditional=False)
+        with pytest.raises(CircuitOpenError):
+            client.get(server.base_url + URL_PATH, conditional=False)
+
+        server.failing_offices = set()
+        time.sleep(0.25)
+        response = client.get(server.base_url + URL_PATH, conditional=False)
+        assert response.status_code == 200
+        assert client.breaker.open_keys() == []
+        assert client.get(server.base_url + URL_PATH, conditional=False).status_code == 200
+    assert server.request_count == 4
+
+def test_half_open_breaker_admits_one_probe_and_reopens_on_failure():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    breaker.record_failure("OKX")
+    assert breaker.allow("OKX")
+    breaker.record_failure("OKX")
+    assert not breaker.allow("OKX")
+
+    time.sleep(0.15)
+    assert breaker.allow("OKX")
+    # Only one probe goes out while it is pending
+    assert not breaker.allow("OKX")
+    breaker.record_failure("OKX")
+    assert not breaker.allow("OKX")
+    assert breaker.open_keys() == ["OKX"]
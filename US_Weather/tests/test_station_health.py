@@ -0,0 +1,93 @@
+from LatestObservationbyUSStationALL import select_stations
+from StationHealth import BASE_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS, StationHealth
+
+# Back-off schedule for stations that keep returning 404, on an injected clock
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def fail(health, clock, station_id, times, status=404):
+    """Record `times` consecutive failures, each attempted when the previous back-off ran out."""
+    for _ in range(times):
+        if station_id in health.entries:
+            clock.now += health.backoff_seconds(health.entries[station_id]['consecutiveFailures'])
+        health.record_failure(station_id, status)
+
+def test_backoff_doubles_from_six_hours_up_to_thirty_days():
+    health = StationHealth(path=None)
+    assert BASE_BACKOFF_SECONDS == 6 * HOUR
+    assert [health.backoff_seconds(n) / HOUR for n in range(1, 6)] == [6, 12, 24, 48, 96]
+    assert health.backoff_seconds(8) == 30 * DAY
+    assert health.backoff_seconds(20) == MAX_BACKOFF_SECONDS == 30 * DAY
+
+def test_station_is_due_again_when_its_backoff_runs_out():
+    clock = Clock()
+    health = StationHealth(path=None, clock=clock)
+    fail(health, clock, "KDEAD", 3)
+    failed_at = clock.now
+
+    # Third failure in a row: 24 hours
+    clock.now = failed_at + 24 * HOUR - 1
+    assert health.should_skip("KDEAD")
+    assert health.filter_stations(["KDEAD", "KNYC"]) == ["KNYC"]
+    assert health.stats["skipped"] == 1
+    clock.now = failed_at + 24 * HOUR
+    assert not health.should_skip("KDEAD")
+    assert health.filter_stations(["KDEAD", "KNYC"]) == ["KDEAD", "KNYC"]
+
+def test_backoff_is_capped():
+    clock = Clock()
+    health = StationHealth(path=None, clock=clock)
+    fail(health, clock, "KDEAD", 12)
+    failed_at = clock.now
+    clock.now = failed_at + 30 * DAY - 1
+    assert health.should_skip("KDEAD")
+    clock.now = failed_at + 30 * DAY
+    assert not health.should_skip("KDEAD")
+
+def test_success_resets_the_schedule():
+    clock = Clock()
+    health = StationHealth(path=None, clock=clock)
+    fail(health, clock, "KBACK", 4)
+    clock.now += health.backoff_seconds(4)
+    health.record_success("KBACK")
+    assert "KBACK" not in health.entries
+    assert health.stats["recovered"] == 1
+
+    # The next failure starts over at six hours
+    health.record_failure("KBACK", 404)
+    assert health.entries["KBACK"]['consecutiveFailures'] == 1
+    clock.now += 6 * HOUR
+    assert not health.should_skip("KBACK")
+
+def test_transient_failures_are_not_skipped():
+    clock = Clock()
+    health = StationHealth(path=None, clock=clock)
+    fail(health, clock, "KSLOW", 3, status=503)
+    fail(health, clock, "KTIME", 3, status="ReadTimeout")
+    assert health.filter_stations(["KSLOW", "KTIME"]) == ["KSLOW", "KTIME"]
+
+def test_history_survives_a_restart(tmp_path):
+    clock = Clock()
+    path = str(tmp_path / "Cache" / "station_health.json")
+    health = StationHealth(path=path, clock=clock)
+    fail(health, clock, "KDEAD", 2)
+    health.save()
+    assert StationHealth(path=path, clock=clock).should_skip("KDEAD")
+
+def test_retry_dead_requests_stations_in_backoff():
+    clock = Clock()
+    health = StationHealth(path=None, clock=clock)
+    fail(health, clock, "KDEAD", 1)
+    stations = ["KDONE", "KDEAD", "KNYC"]
+    assert select_stations(stations, {"KDONE"}, health) == ["KNYC"]
+    assert select_stations(stations, {"KDONE"}, health, retry_dead=True) == ["KDEAD", "KNYC"]